@@ -0,0 +1,249 @@
+import os
+import json
+import socket
+import struct
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+
+DIRECTORY_TOPIC = "SHM_DIRECTORY"   # topic where the clients announce their ring buffer
+RING_SLOTS = 256
+SLOT_SIZE = 16384                   # bigger messages only go through UDP
+
+RING_HEADER = struct.Struct("IIIIQ")  # magic, number of slots, slot size, unused, last written sequence number
+SLOT_HEADER = struct.Struct("QI")     # sequence number of the message in the slot, length of the message
+RING_MAGIC = 0x41434131
+
+
+def _attach_shared_memory(name):
+    shm = shared_memory.SharedMemory(name=name)
+    # The segment belongs to the writer: the resource tracker of the reader must not unlink it at exit
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+class ShmRing:
+    """Ring buffer in shared memory with one writer and any number of readers.
+    Each reader keeps its own position (sequence number of the next message), a reader
+    too slow to follow the writer loses the overwritten messages and counts them.
+    """
+    def __init__(self, name=None, slots=RING_SLOTS, slot_size=SLOT_SIZE):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=RING_HEADER.size + slots * slot_size)
+            self.owner = True
+            self.slots, self.slot_size = slots, slot_size
+            self.shm.buf[:RING_HEADER.size + slots * slot_size] = bytes(RING_HEADER.size + slots * slot_size)
+            RING_HEADER.pack_into(self.shm.buf, 0, RING_MAGIC, slots, slot_size, 0, 0)
+        else:
+            self.shm = _attach_shared_memory(name)
+            self.owner = False
+            magic, self.slots, self.slot_size, _, _ = RING_HEADER.unpack_from(self.shm.buf, 0)
+            if magic != RING_MAGIC:
+                self.shm.close()
+                raise ValueError(f"{name} is not a ring buffer")
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.max_length = self.slot_size - SLOT_HEADER.size
+        self.write_lock = threading.Lock()
+
+    def write_sequence(self):
+        return struct.unpack_from("Q", self.buf, 16)[0]
+
+    def write(self, data):
+        """Writes a message, returns its sequence number or None if it is too big for a slot"""
+        if len(data) > self.max_length:
+            return None
+        with self.write_lock:
+            sequence = self.write_sequence() + 1
+            offset = RING_HEADER.size + (sequence % self.slots) * self.slot_size
+            # the slot is invalidated while it is written, then its sequence number is published
+            SLOT_HEADER.pack_into(self.buf, offset, 0, len(data))
+            start = offset + SLOT_HEADER.size
+            self.buf[start:start + len(data)] = data
+            struct.pack_into("Q", self.buf, offset, sequence)
+            struct.pack_into("Q", self.buf, 16, sequence)
+        return sequence
+
+    def read(self, next_sequence):
+        """Returns the messages from "next_sequence", the following position and the number of lost messages"""
+        messages = []
+        lost = 0
+        last_sequence = self.write_sequence()
+        if last_sequence - next_sequence >= self.slots:
+            # the writer went around the ring: the oldest messages are overwritten
+            lost += last_sequence - self.slots + 1 - next_sequence
+            next_sequence = last_sequence - self.slots + 1
+        while next_sequence <= last_sequence:
+            offset = RING_HEADER.size + (next_sequence % self.slots) * self.slot_size
+            sequence, length = SLOT_HEADER.unpack_from(self.buf, offset)
+            if sequence == next_sequence:
+                start = offset + SLOT_HEADER.size
+                data = bytes(self.buf[start:start + length])
+                if struct.unpack_from("Q", self.buf, offset)[0] == sequence:
+                    messages.append(data)
+                else:
+                    lost += 1  # overwritten during the copy
+            elif sequence > next_sequence or sequence == 0:
+                lost += 1
+            next_sequence += 1
+        return messages, next_sequence, lost
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedMemoryTransport:
+    """Delivers the messages of the framed topics of a UDPClient directly to the clients
+    of the same host.
+
+    Each client owns a ring buffer where it writes the messages that local clients
+    subscribed to, and a doorbell (UDP socket on 127.0.0.1) rung by the local writers.
+    The clients announce their ring, doorbell, sender id and subscriptions on DIRECTORY_TOPIC.
+    The messages are still sent to the WhiteBoard for the remote subscribers, as frames
+    flagged FLAG_SHM carrying the sequence number of the message in the ring: a client
+    reading that ring from an older sequence number drops the frame, so each message
+    reaches each client by one way only.
+    """
+    def __init__(self, udp_client):
+        self.udp_client = udp_client
+        self.host = socket.gethostname()
+        self.id = f"{os.getpid()}-{udp_client.sender_id:08x}"
+        self.ring = ShmRing()
+        self.doorbell = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.doorbell.bind(("127.0.0.1", 0))
+        self.doorbell_port = self.doorbell.getsockname()[1]
+
+        self.lock = threading.Lock()
+        self.peers = dict()           # id -> topics, doorbell, ring and reading positions of a local client
+        self.senders = dict()         # sender id of the UDPClient of a local client -> its peer entry
+        self.subscriptions = set()
+        self.lost = 0
+        self.closed = False
+
+        udp_client.add_topic_callback(DIRECTORY_TOPIC, self.on_directory_message)
+        udp_client.s.send(f"Subscribe:{DIRECTORY_TOPIC}".encode("utf-8"))
+        self.read_thread = threading.Thread(target=self.read_rings)
+        self.read_thread.daemon = True
+        self.read_thread.start()
+        self.announce()
+
+    def announce(self, bye=False):
+        announce = {"id": self.id, "host": self.host, "sender": self.udp_client.sender_id}
+        if bye:
+            announce["bye"] = True
+        else:
+            announce.update(ring=self.ring.name, doorbell=self.doorbell_port, topics=sorted(self.subscriptions))
+        self.udp_client.s.send(f"{DIRECTORY_TOPIC}:{json.dumps(announce)}".encode("utf-8"))
+
+    def subscribe(self, topic):
+        if topic != DIRECTORY_TOPIC and topic not in self.subscriptions:
+            self.subscriptions.add(topic)
+            self.announce()
+
+    def on_directory_message(self, content):
+        try:
+            announce = json.loads(content)
+        except json.JSONDecodeError:
+            return
+        peer_id = announce.get("id")
+        if announce.get("host") != self.host or peer_id == self.id:
+            return
+
+        with self.lock:
+            peer = self.peers.get(peer_id)
+            if announce.get("bye"):
+                if peer and peer["ring"]:
+                    peer["ring"].close()
+                self.peers.pop(peer_id, None)
+                self.senders.pop(announce.get("sender"), None)
+                return
+            new_peer = peer is None
+            if new_peer:
+                try:
+                    ring = ShmRing(announce["ring"])
+                except (FileNotFoundError, ValueError, OSError):
+                    ring = None  # e.g. the client closed in the meantime
+                first_sequence = ring.write_sequence() + 1 if ring else 0
+                peer = self.peers[peer_id] = {
+                    "ring": ring,
+                    "first_sequence": first_sequence,  # the older messages come through UDP
+                    "next_sequence": first_sequence,
+                }
+                self.senders[announce.get("sender")] = peer
+            peer["topics"] = set(announce.get("topics", []))
+            peer["doorbell"] = ("127.0.0.1", announce["doorbell"])
+
+        if new_peer:
+            self.announce()  # so that the new client knows this one
+
+    def publish(self, data):
+        """Writes a "TOPIC:payload" message in the ring if a local client subscribed to the topic,
+        returns its sequence number in the ring or None if it was not written
+        """
+        topic = data[:data.find(":")]
+        if topic == DIRECTORY_TOPIC:
+            return None
+        with self.lock:
+            doorbells = [peer["doorbell"] for peer in self.peers.values() if topic in peer["topics"]]
+        if not doorbells:
+            return None
+        sequence = self.ring.write(data.encode("utf-8"))
+        if sequence is not None:
+            for doorbell in doorbells:
+                self.doorbell.sendto(b"\x01", doorbell)
+        return sequence
+
+    def read_rings(self):
+        while True:
+            try:
+                self.doorbell.recv(16)
+            except OSError:
+                break
+            if self.closed:
+                break
+            with self.lock:
+                peers = [peer for peer in self.peers.values() if peer["ring"]]
+            for peer in peers:
+                messages, peer["next_sequence"], lost = peer["ring"].read(peer["next_sequence"])
+                self.lost += lost
+                for data in messages:
+                    message = data.decode("utf-8")
+                    sep_idx = message.find(":")
+                    topic, content = message[:sep_idx], message[sep_idx+1:]
+                    if topic in self.subscriptions:
+                        self.udp_client.store_message(topic, content)
+
+    def delivered_by_ring(self, sender, sequence):
+        """True if the message "sequence" of the ring of "sender", received as a frame through
+        the WhiteBoard, is read from the ring by this client (the frame is then dropped)
+        """
+        with self.lock:
+            peer = self.senders.get(sender)
+            if peer is None or peer["ring"] is None or sequence < peer["first_sequence"]:
+                return False
+        # the writer may not know this client yet and not ring its doorbell
+        self.doorbell.sendto(b"\x01", ("127.0.0.1", self.doorbell_port))
+        return True
+
+    def close(self):
+        self.closed = True
+        try:
+            self.announce(bye=True)
+        except OSError:
+            pass
+        self.doorbell.sendto(b"\x00", ("127.0.0.1", self.doorbell_port))
+        self.read_thread.join(1)
+        self.doorbell.close()
+        with self.lock:
+            for peer in self.peers.values():
+                if peer["ring"]:
+                    peer["ring"].close()
+            self.peers.clear()
+        self.ring.close()
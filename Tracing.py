@@ -0,0 +1,106 @@
+import json
+import time
+import uuid
+import threading
+
+# Latency tracing of a conversation turn, from the end of the user's speech to the
+# moment Audrey starts speaking.
+# The trace id travels in the messages of the turn as a prefix of their content:
+#     USER_FULL_SENTENCE_PERCEPTION:@trace=1a2b3c4d;Hello Audrey
+# and every module publishes the time of its stages on TRACE_TOPIC:
+#     LATENCY_TRACE:{"trace": "1a2b3c4d", "stage": "stt_done", "module": "...", "t": 1718000000.123}
+
+TRACE_TOPIC = "LATENCY_TRACE"
+REPORT_TOPIC = "LATENCY_REPORT"
+TRACE_PREFIX = "@trace="
+
+# Stages of a turn, in order
+STAGES = [
+    "vad_stop",             # speech: end of the user's speech detected
+    "stt_done",             # speech: transcription finished
+    "sentence_sent",        # speech: USER_FULL_SENTENCE_PERCEPTION sent
+    "sentence_received",    # decider
+    "llm_query_sent",       # decider
+    "llm_query_received",   # llm
+    "llm_first_sentence",   # llm (streaming)
+    "llm_response_sent",    # llm
+    "llm_response_received",# decider
+    "bml_generated",        # decider: pipeline() done
+    "bml_sent",             # decider
+    "speech_on",            # decider: AGENT_PLAYER_STATUS speech on
+]
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:8]
+
+
+def attach_trace(content, trace_id):
+    """Adds the trace id in front of the content of a message"""
+    if not trace_id:
+        return content
+    return f"{TRACE_PREFIX}{trace_id};{content}"
+
+
+def split_trace(content):
+    """Returns (trace id or None, content without the trace id)"""
+    if content.startswith(TRACE_PREFIX):
+        sep_idx = content.find(";")
+        if sep_idx > 0:
+            return content[len(TRACE_PREFIX):sep_idx], content[sep_idx+1:]
+    return None, content
+
+
+class LatencyTracer:
+    """Publishes the time of the stages of the traced turns"""
+    def __init__(self, udp_client, module_name):
+        self.udp_client = udp_client
+        self.module_name = module_name
+
+    def stage(self, trace_id, stage, t=None):
+        if not trace_id:
+            return
+        event = {"trace": trace_id, "stage": stage, "module": self.module_name,
+                 "t": time.time() if t is None else t}
+        self.udp_client.send(f"{TRACE_TOPIC}:{json.dumps(event)}")
+
+
+class TraceCollector:
+    """Gathers the stages published on TRACE_TOPIC and computes the breakdown of a turn"""
+    def __init__(self, max_traces=50):
+        self.traces = dict()  # trace id -> {stage: time}
+        self.max_traces = max_traces
+        self.lock = threading.Lock()  # add() can be a topic callback of the UDPClient
+
+    def add(self, message):
+        try:
+            event = json.loads(message)
+        except json.JSONDecodeError:
+            return
+        with self.lock:
+            stages = self.traces.setdefault(event["trace"], dict())
+            stages.setdefault(event["stage"], event["t"])
+            while len(self.traces) > self.max_traces:
+                del self.traces[next(iter(self.traces))]
+
+    def breakdown(self, trace_id):
+        """Returns [(stage, ms since the previous stage, ms since the first stage)]"""
+        with self.lock:
+            stages = dict(self.traces.get(trace_id, dict()))
+        ordered = sorted(stages.items(), key=lambda kv: (kv[1], STAGES.index(kv[0]) if kv[0] in STAGES else 0))
+        rows = []
+        for i, (stage, t) in enumerate(ordered):
+            previous = ordered[i-1][1] if i else t
+            rows.append((stage, (t - previous) * 1000, (t - ordered[0][1]) * 1000))
+        return rows
+
+    def report(self, trace_id):
+        """Breakdown of a turn as a printable string"""
+        lines = [f"[LATENCY] turn {trace_id}"]
+        for stage, delta, total in self.breakdown(trace_id):
+            lines.append(f"[LATENCY]   {stage:<22} +{delta:8.1f} ms  {total:9.1f} ms")
+        return "\n".join(lines)
+
+    def pop(self, trace_id):
+        with self.lock:
+            return self.traces.pop(trace_id, None)
@@ -1,49 +1,376 @@
+import os
+import time
+import zlib
+import random
 import socket
+import struct
+import asyncio
+import logging
 import threading
-from collections import deque
+from collections import deque, Counter
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+logger = logging.getLogger("UDPClient")
+
+# Buffering policies of the per-topic mailboxes
+POLICY_LATEST = "latest"  # only the most recent message of the topic is kept
+POLICY_FIFO = "fifo"      # every message is kept (up to the bound) and delivered in order
+
+DEFAULT_FIFO_SIZE = 64
+
+# Topics carrying a state that is continuously refreshed: an old value is useless
+DEFAULT_TOPIC_POLICIES = {
+    "USER_PARTIAL": POLICY_LATEST,
+    "USER_CONTEXT_PERCEPTION": POLICY_LATEST,
+    "AUDIO_FEATURES_PERCEPTION": POLICY_LATEST,
+}
+
+# Framed protocol: "TOPIC:" + FRAME_MAGIC + header + fragment of the payload.
+# The topic stays in clear text so that the WhiteBoard can route the frame, and
+# 0xFF never appears in UTF-8 so a frame can't be mistaken for a text message.
+FRAME_MAGIC = b"\xff\x01"
+FRAME_HEADER = struct.Struct("!BIIHH")  # flags, sender id, sequence number, fragment index, fragment count
+FLAG_ZLIB = 0x01
+FLAG_LZ4 = 0x02
+FLAG_SHM = 0x04  # also written in the shared memory ring of the sender, the sequence number is the one of the ring
+
+MAX_DATAGRAM = 8192          # stays below the BUFF_LEN (10000) of the C++ WhiteBoard
+RECEIVE_BUFFER = 65535
+COMPRESS_THRESHOLD = 512     # payloads smaller than this are sent uncompressed
+REASSEMBLY_TIMEOUT = 2.0     # an incomplete message is discarded after this delay (s)
+
+# Topics sent with the framed protocol, e.g. ACA_FRAMED_TOPICS=LLM_QUERY,LLM_RESPONSE
+# Only for topics whose subscribers all use this UDPClient (not the Unity agent player)
+FRAMED_TOPICS_ENV = "ACA_FRAMED_TOPICS"
+
+# Shared memory transport of the framed topics between the modules of the same host
+# (SharedMemoryTransport.py), enabled with ACA_SHARED_MEMORY=1
+SHARED_MEMORY_ENV = "ACA_SHARED_MEMORY"
 
 class UDPClient:
-    def __init__(self, ip_whiteboard):
+    def __init__(self, ip_whiteboard, topic_policies=None, default_policy=POLICY_FIFO,
+                 fifo_size=DEFAULT_FIFO_SIZE, framed_topics=None, compression="zlib",
+                 shared_memory=None):
         self.ip_whiteboard = ip_whiteboard
         self.port = 11000
         self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.message_queue = deque(maxlen=10)
+
+        # Framed protocol (fragmentation and compression of the large payloads)
+        if framed_topics is None:
+            framed_topics = [t for t in os.environ.get(FRAMED_TOPICS_ENV, "").split(",") if t]
+        self.framed_topics = set(framed_topics)
+        if compression == "lz4" and lz4 is None:
+            logger.warning("lz4 is not installed, zlib is used instead")
+            compression = "zlib"
+        self.compression = compression
+        self.sender_id = random.getrandbits(32)
+        self.sequence = 0
+        self.send_lock = threading.Lock()
+        self.partial_frames = dict()  # (sender id, sequence number) -> message being reassembled
+        self.incomplete = Counter()   # framed messages discarded (fragment lost, lz4 unavailable)
+
+        # One bounded mailbox per topic, created at the first message of the topic
+        self.topic_policies = dict(DEFAULT_TOPIC_POLICIES)
+        if topic_policies:
+            self.topic_policies.update(topic_policies)
+        self.default_policy = default_policy
+        self.fifo_size = fifo_size
+        self.mailboxes = dict()
+        self.dropped = Counter()   # messages overwritten before being read, per topic
+        self.received = Counter()  # messages received, per topic
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)  # notified at each new message
+        self.callbacks = dict()  # topic -> callbacks called instead of filling the mailbox
+        self.closed = False
+
+        # Doorbell: a byte is written in this socket pair when a message arrives,
+        # so that the client can be watched by select/selectors/asyncio via fileno()
+        self.doorbell_r, self.doorbell_w = socket.socketpair()
+        self.doorbell_r.setblocking(False)
+        self.doorbell_w.setblocking(False)
+        self.doorbell_rung = False
+
         self.remote_ep = (self.ip_whiteboard, self.port)
         self.s.connect(self.remote_ep)
         self.receive_thread = threading.Thread(target=self.receive_packets)
         self.receive_thread.daemon = True  # Daemonize the thread
         self.receive_thread.start()
-    
+
+        if shared_memory is None:
+            shared_memory = os.environ.get(SHARED_MEMORY_ENV, "0") == "1"
+        self.shm = None
+        if shared_memory:
+            from SharedMemoryTransport import SharedMemoryTransport
+            self.shm = SharedMemoryTransport(self)
+
+    def set_topic_policy(self, topic, policy):
+        """Sets the buffering policy (POLICY_LATEST or POLICY_FIFO) of a topic"""
+        if policy not in (POLICY_LATEST, POLICY_FIFO):
+            raise ValueError(f"Unknown buffering policy: {policy}")
+        with self.lock:
+            self.topic_policies[topic] = policy
+            mailbox = self.mailboxes.pop(topic, None)
+            if mailbox:
+                self.mailboxes[topic] = self._new_mailbox(topic, mailbox)
+
+    def _new_mailbox(self, topic, content=()):
+        policy = self.topic_policies.get(topic, self.default_policy)
+        maxlen = 1 if policy == POLICY_LATEST else self.fifo_size
+        return deque(content, maxlen=maxlen)
+
     def receive_packets(self):
-        """Receive continuously the messages and puts them in a message queue"""
+        """Receive continuously the messages and puts them in the mailbox of their topic"""
         while True:
             try:
-                data, addr = self.s.recvfrom(10000)
-                if data:
-                    message = data.decode("utf-8")
-                    self.message_queue.appendleft(message)
-            except Exception as e:
+                data, addr = self.s.recvfrom(RECEIVE_BUFFER)
+                sep_idx = data.find(b":")
+                if sep_idx >= 0:
+                    if data[sep_idx+1:sep_idx+1+len(FRAME_MAGIC)] == FRAME_MAGIC:
+                        self.receive_frame(data[:sep_idx].decode("utf-8"),
+                                           memoryview(data)[sep_idx+1+len(FRAME_MAGIC):])
+                    else:
+                        self.store_message(data[:sep_idx].decode("utf-8"), data[sep_idx+1:].decode("utf-8"))
+            except Exception:
+                if self.closed:
+                    break
+                # e.g. a malformed frame or a failing topic callback: the message is lost, not the thread
+                logger.exception("Message dropped by the receive thread")
+
+    def receive_frame(self, topic, frame):
+        """Reassembles the fragments of a framed message, the message is stored when complete"""
+        flags, sender, sequence, index, count = FRAME_HEADER.unpack_from(frame)
+        if flags & FLAG_SHM and self.shm is not None and self.shm.delivered_by_ring(sender, sequence):
+            return
+        chunk = bytes(frame[FRAME_HEADER.size:])
+        if count == 1:
+            payload = chunk
+        else:
+            now = time.monotonic()
+            self._expire_partial_frames(now)
+            key = (sender, sequence, flags & FLAG_SHM)
+            entry = self.partial_frames.setdefault(key, {"time": now, "chunks": dict()})
+            entry["chunks"][index] = chunk
+            if len(entry["chunks"]) < count:
+                return
+            del self.partial_frames[key]
+            payload = b"".join(entry["chunks"][i] for i in range(count))
+
+        if flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        elif flags & FLAG_LZ4:
+            if lz4 is None:
+                # the sender has lz4 and this module not: the message can't be read
+                logger.error(f"{topic} message compressed with lz4 dropped: lz4 is not installed")
+                with self.lock:
+                    self.incomplete["LZ4"] += 1
+                return
+            payload = lz4.frame.decompress(payload)
+        self.store_message(topic, payload.decode("utf-8"))
+
+    def _expire_partial_frames(self, now):
+        for key, entry in list(self.partial_frames.items()):
+            if now - entry["time"] > REASSEMBLY_TIMEOUT:
+                del self.partial_frames[key]
+                with self.lock:
+                    self.incomplete["FRAMED"] += 1
+
+    def put_message(self, message):
+        """Stores a "TOPIC:content" message in the mailbox of its topic"""
+        sep_idx = message.find(":")
+        if sep_idx < 0:
+            return
+        self.store_message(message[:sep_idx], message[sep_idx+1:])
+
+    def store_message(self, topic, content):
+        """Stores the content of a message in the mailbox of its topic"""
+        with self.lock:
+            self.received[topic] += 1
+            callbacks = self.callbacks.get(topic)
+            if not callbacks:
+                mailbox = self.mailboxes.get(topic)
+                if mailbox is None:
+                    mailbox = self.mailboxes[topic] = self._new_mailbox(topic)
+                if len(mailbox) == mailbox.maxlen:
+                    self.dropped[topic] += 1
+                mailbox.append(content)
+                self.condition.notify_all()
+                self._ring_doorbell()
+
+        if callbacks:
+            for callback in callbacks:
+                callback(content)
+
+    def _ring_doorbell(self):
+        # called with the lock held, one byte is enough until the doorbell is drained
+        if not self.doorbell_rung:
+            try:
+                self.doorbell_w.send(b"\0")
+                self.doorbell_rung = True
+            except OSError:
+                pass
+
+    def _drain_doorbell(self):
+        # called with the lock held
+        if self.doorbell_rung:
+            try:
+                while self.doorbell_r.recv(64):
+                    pass
+            except OSError:
                 pass
-    
-    def get_received_messages(self):
-        """Returns the content of the message queue as a dict
-        only the most recent message of a topic is in this dict
+            self.doorbell_rung = False
+
+    def _has_pending(self, topics=None):
+        # called with the lock held
+        if self.closed:
+            return True
+        if topics is None:
+            return any(self.mailboxes.values())
+        return any(self.mailboxes.get(topic) for topic in topics)
+
+    def add_topic_callback(self, topic, callback):
+        """Calls "callback(content)" from the receive thread for every message of the topic.
+        The messages of a topic with callbacks do not go through the mailbox.
+        """
+        with self.lock:
+            self.callbacks.setdefault(topic, []).append(callback)
+
+    def remove_topic_callback(self, topic, callback):
+        with self.lock:
+            callbacks = self.callbacks.get(topic, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self.callbacks.pop(topic, None)
+
+    def get_received_messages(self, topics=None):
+        """Returns the pending messages as a dict with one entry per topic.
+        For a "latest" topic the entry is its most recent message, for a "fifo"
+        topic it is the oldest pending one: the following ones stay in the mailbox
+        and are returned by the next calls, so no message is lost.
+        If "topics" is given, only the messages of these topics are returned.
         """
         received_messages = dict()
-        while len(self.message_queue) > 0:
-            message = self.message_queue.pop()
-            sep_idx = message.index(":")
-            topic = message[:sep_idx]
-            content = message[sep_idx+1:]
-            received_messages[topic] = content
-        
+        with self.lock:
+            self._drain_doorbell()
+            for topic, mailbox in self.mailboxes.items():
+                if mailbox and (topics is None or topic in topics):
+                    received_messages[topic] = mailbox.popleft()
+            if any(self.mailboxes.values()):
+                self._ring_doorbell()  # fifo messages are still pending
+
         return received_messages
 
-    
+    def wait_for_messages(self, timeout=None, topics=None):
+        """Blocks until a message (of one of "topics" if given) is pending or until
+        "timeout" seconds have passed, then returns like get_received_messages.
+        The waiting thread sleeps on a condition variable and is woken up by the
+        receive thread as soon as a message arrives.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self._has_pending(topics), timeout)
+        return self.get_received_messages(topics)
+
+    def fileno(self):
+        """File descriptor readable when messages are pending, for select/selectors"""
+        return self.doorbell_r.fileno()
+
+    async def wait_for_messages_async(self, topics=None):
+        """asyncio version of wait_for_messages, the event loop watches the doorbell"""
+        loop = asyncio.get_running_loop()
+        while True:
+            received_messages = self.get_received_messages(topics)
+            if received_messages or self.closed:
+                return received_messages
+            with self.lock:
+                # only messages of other topics are pending: wait for the next one
+                self._drain_doorbell()
+                if self._has_pending(topics):
+                    continue
+            ready = loop.create_future()
+            loop.add_reader(self.fileno(), lambda: ready.done() or ready.set_result(None))
+            try:
+                await ready
+            finally:
+                loop.remove_reader(self.fileno())
+
+    def get_topic_messages(self, topic):
+        """Returns (and removes) all the pending messages of a topic, oldest first"""
+        with self.lock:
+            mailbox = self.mailboxes.get(topic)
+            if not mailbox:
+                return []
+            messages = list(mailbox)
+            mailbox.clear()
+        return messages
+
+    def get_drop_counters(self):
+        """Returns the number of received and dropped messages per topic"""
+        with self.lock:
+            counters = {topic: {"received": self.received[topic], "dropped": self.dropped[topic]}
+                        for topic in self.received}
+            if self.incomplete:
+                counters["FRAMED"] = {"incomplete": self.incomplete["FRAMED"],
+                                      "lz4_unavailable": self.incomplete["LZ4"]}
+            if self.shm is not None:
+                counters["SHARED_MEMORY"] = {"lost": self.shm.lost}
+            return counters
+
+
     def send(self, data):
         """Sends the string "data" to the WhiteBoard"""
+        if data.startswith("Subscribe:"):
+            if self.shm is not None:
+                self.shm.subscribe(data[len("Subscribe:"):])
+        elif self.framed_topics:
+            sep_idx = data.find(":")
+            if data[:sep_idx] in self.framed_topics:
+                # the local subscribers read the message in shared memory, the others get the frame
+                shm_sequence = self.shm.publish(data) if self.shm is not None else None
+                self.send_framed(data[:sep_idx], data[sep_idx+1:], shm_sequence)
+                return
         self.s.send(bytes(data, "utf-8"))
 
+    def send_framed(self, topic, content, shm_sequence=None):
+        """Sends a message with the framed protocol: the payload is compressed if it is
+        large enough and split in as many datagrams as needed. "shm_sequence" is the
+        sequence number of the message in the shared memory ring, if it was written there.
+        """
+        payload = content.encode("utf-8")
+        flags = 0
+        if self.compression and len(payload) >= COMPRESS_THRESHOLD:
+            if self.compression == "lz4":
+                compressed, flag = lz4.frame.compress(payload), FLAG_LZ4
+            else:
+                compressed, flag = zlib.compress(payload, 1), FLAG_ZLIB
+            if len(compressed) < len(payload):
+                payload, flags = compressed, flag
+
+        prefix = topic.encode("utf-8") + b":" + FRAME_MAGIC
+        chunk_size = MAX_DATAGRAM - len(prefix) - FRAME_HEADER.size
+        count = max(1, -(-len(payload) // chunk_size))
+        if count > 0xFFFF:
+            raise ValueError(f"Message too large for the framed protocol: {len(payload)} bytes")
+        with self.send_lock:
+            if shm_sequence is None:
+                self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+                sequence = self.sequence
+            else:
+                flags |= FLAG_SHM
+                sequence = shm_sequence & 0xFFFFFFFF
+            for index in range(count):
+                header = FRAME_HEADER.pack(flags, self.sender_id, sequence, index, count)
+                self.s.send(prefix + header + payload[index*chunk_size:(index+1)*chunk_size])
+
 
     def close(self):
-        self.s.close()
\ No newline at end of file
+        if self.shm is not None:
+            self.shm.close()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            self._ring_doorbell()
+        self.s.close()
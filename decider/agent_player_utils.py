@@ -5,66 +5,29 @@ Created on Thu Apr 25 16:59:17 2024
 @author: Maxime
 """
 
-import re
+import itertools
+
+from bml_builder import BmlDocument, Gaze, GazeDirectionShift, Head, Pointing, Speech
 
 class VirtualAgentControl():
     def __init__(self, udp_client):
         self.udp_client = udp_client
-        self.bml_id = 0
+        self.bml_ids = itertools.count()  # ids of the documents and behaviors, unique over the session
         self.bml_topic = 'BML_COMMAND'
-        self.start_BML = """<bml xmlns="http://www.bml-initiative.org/bml/bml-1.0" xmlns:ext="http://www.bml-initiative.org/bml/coreextensions-1.0" id="14" characterId="Audrey" composition="MERGE">
-                    """     
-        self.end_BML = """</bml>"""
         
-    def add_bml_wrap(self, msg):
-        """Adds the bml tags : <bml...> msg </bml>"""
-        return self.start_BML + msg + self.end_BML
+    def new_bml(self, composition="MERGE"):
+        """Empty BML document, the ids of its behaviors are given when they are added"""
+        return BmlDocument(str(next(self.bml_ids)), composition=composition, id_source=self.bml_ids)
     
-    def send_bml_item(self, bml_item):
-        bml = self.add_bml_wrap(bml_item)
-        fixed_bml = self.fix_bml_ids(bml)
-        self.udp_client.send(f'{self.bml_topic}:{fixed_bml}')
-        self.bml_id+=1
-        
-    def send_bml_items(self, bml_items):
-        bml = self.add_bml_wrap("\n".join(bml_items))
-        fixed_bml = self.fix_bml_ids(bml)
-        self.udp_client.send(f'{self.bml_topic}:{fixed_bml}')
+    def send_behaviors(self, *behaviors, composition="MERGE"):
+        """Sends the behaviors (bml_builder) in one BML document"""
+        bml = self.new_bml(composition)
+        bml.extend(behaviors)
+        self.send_bml(bml.to_xml())
     
     def send_bml(self, bml):
         self.udp_client.send(f'{self.bml_topic}:{bml}')
-        self.bml_id+=1
-        
-        
-    def fix_bml_ids(self, text):
-        # Define the regex pattern to find id=""
-        pattern = r'id=".*?"'
-        
-        # Function to replace the matched pattern with the current id and increment the id
-        def replacement(match):
-            result = f'id="{self.bml_id}"'
-            self.bml_id += 1
-            return result
-        
-        # Use re.sub with a function to perform the replacement
-        modified_text = re.sub(pattern, replacement, text)
         
-        return modified_text
-        
-    def speak_BML(self, text, priority):
-        ret = ""
-        ret += f"""<speech id="{self.bml_id}" start="0">
-                	  <description priority="{priority}" type="application/ssml+xml">
-            			  <speak>
-               """
-        ret += text
-        ret += """
-                         </speak>
-                      </description>
-                  </speech>
-               """
-        return ret
-    
     # <speak>
     #     <prosody volume="x-soft" rate="x-slow" range="x-low">
     #       je parle doucement !
@@ -75,68 +38,28 @@ class VirtualAgentControl():
     # </speak>
     
     def speak(self, text, priority=0):
-        bml = self.add_bml_wrap(self.speak_BML(text, priority))
-        self.send_bml(bml)
-        
-    
-    def gaze_object_BML(self, target, duration):
-        ret = ""
-        ret += f"""<gaze id = "{self.bml_id}" start = "0" stroke="{duration}" target = "{target}" />
-               """
-        return ret
+        self.send_behaviors(Speech(text, priority=priority))
     
     def gaze_object(self, target, duration=2):
-        bml = self.add_bml_wrap(self.gaze_object_BML(target, duration))
-        self.send_bml(bml)
-        
-    
-    def gaze_shift_object_BML(self, target):
-        ret = ""
-        ret += f"""<gazedirectionshift id = "{self.bml_id}" start = "0" target = "{target}" />
-               """
-        return ret
+        self.send_behaviors(Gaze(target, stroke=str(duration)))
     
     def gaze_shift_object(self, target):
-        bml = self.add_bml_wrap(self.gaze_shift_object_BML(target))
-        self.send_bml(bml)
-        
+        self.send_behaviors(GazeDirectionShift(target))
         
-    def head_roll_BML(self, roll_angle_deg):
+    def head_roll(self, roll_angle_deg):
         amount = abs(roll_angle_deg/15) #the amount is not exact
         lexeme = 'tilt_right' if roll_angle_deg > 0 else 'tilt_left'
-        ret = ""
-        ret += f"""<head id = "{self.bml_id}" lexeme = "{lexeme}" amount = "{amount}" />
-                """
-        return ret
-    
-    def head_roll(self, roll_angle_deg):
-        bml = self.add_bml_wrap(self.head_roll_BML(roll_angle_deg))
-        self.send_bml(bml)
-        
+        self.send_behaviors(Head(lexeme, amount=str(amount)))
     
-    def head_pitch_BML(self, pitch_angle_deg):
+    def head_pitch(self, pitch_angle_deg):
         pitch_angle_deg = max(-20, min(30, pitch_angle_deg)) #doesn't work if angle too low
         amount = abs(pitch_angle_deg/20)
         print(f"{pitch_angle_deg=} {amount=}")
         lexeme = 'down' if pitch_angle_deg > 0 else 'up'
-        ret = ""
-        ret += f"""<head id = "{self.bml_id}" lexeme = "{lexeme}" amount = "{amount}" />
-                """
-        return ret
-    
-    def head_pitch(self, pitch_angle_deg):
-        bml = self.add_bml_wrap(self.head_pitch_BML(pitch_angle_deg))
-        self.send_bml(bml)
-    
-    def point_object_BML(self, target, duration):
-        ret = ""
-        ret += f"""<pointing id = "{self.bml_id}" start = "0" stroke="{duration}" target = "{target}"/>
-               """
-        return ret
+        self.send_behaviors(Head(lexeme, amount=str(amount)))
     
     def point_object(self, target, duration=2):
-        bml = self.add_bml_wrap(self.point_object_BML(target, duration))
-        self.send_bml(bml)
+        self.send_behaviors(Pointing(target, stroke=str(duration)))
     
 
 class AgentPlayerControl():
@@ -0,0 +1,240 @@
+"""
+Costruzione dei documenti BML da comportamenti tipizzati.
+
+    doc = BmlDocument("bml1", composition="APPEND")
+    speech = doc.add(Speech('<mark name="tm0"/> Hello <mark name="tm1"/>', priority=2))
+    doc.add(Gesture("hello", start=speech.sync("tm0"), end="start+1"))
+    bml = doc.to_xml()
+
+Gli id dei comportamenti sono assegnati quando vengono aggiunti al documento (prefisso del
+tipo e contatore, oppure un contatore condiviso tra documenti) e il documento è serializzato
+in un solo passaggio, senza riscrivere gli id con regex dopo.
+Un validatore (es. check_references) può essere dato al documento o impostato per tutti
+con set_default_validator().
+"""
+
+import re
+import itertools
+from dataclasses import dataclass, field, fields
+from typing import Callable, Iterator, List, Optional
+from xml.sax.saxutils import escape
+
+BML_NAMESPACE = "http://www.bml-initiative.org/bml/bml-1.0"
+EXT_NAMESPACE = "http://www.bml-initiative.org/bml/coreextensions-1.0"
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8" ?>\n'
+SYNC_REFERENCE = re.compile(r"^([A-Za-z_][\w-]*):(\w+)")
+SYNC_ATTRIBUTES = ("start", "end", "stroke")
+ATTRIBUTE_ESCAPES = {'"': "&quot;"}
+
+
+class BmlValidationError(ValueError):
+    pass
+
+
+@dataclass
+class Behavior:
+    """Comportamento BML: i campi diversi da None diventano attributi, nell'ordine dei campi"""
+    TAG = ""
+    PREFIX = "b"
+
+    def attributes(self):
+        yield "id", self.id  # l'id per primo
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if value is not None and f.name != "id" and f.metadata.get("attribute", True):
+                yield f.name, value
+
+    def write(self, parts: List[str]):
+        parts.append(f"  <{self.TAG}")
+        self.write_attributes(parts)
+        parts.append("/>\n")
+
+    def write_attributes(self, parts: List[str]):
+        for name, value in self.attributes():
+            parts.append(f' {name}="{escape(str(value), ATTRIBUTE_ESCAPES)}"')
+
+    def sync(self, sync_point: str) -> str:
+        """Riferimento a un punto di sincronizzazione, es. speech.sync("tm2") -> "s1:tm2" """
+        return f"{self.id}:{sync_point}"
+
+
+@dataclass
+class Speech(Behavior):
+    """Parlato: "text" è il contenuto SSML (con i <mark name="tmN"/>), non viene escapato"""
+    TAG = "speech"
+    PREFIX = "s"
+    text: str = field(default="", metadata={"attribute": False})
+    priority: int = field(default=2, metadata={"attribute": False})
+    id: Optional[str] = None
+    start: Optional[str] = "0"
+
+    def write(self, parts: List[str]):
+        parts.append("  <speech")
+        self.write_attributes(parts)
+        parts.append(f'>\n    <description priority="{self.priority}" type="application/ssml+xml">\n'
+                     f"      <speak>\n        {self.text}\n      </speak>\n    </description>\n  </speech>\n")
+
+
+@dataclass
+class Gesture(Behavior):
+    TAG = "gesture"
+    PREFIX = "g"
+    lexeme: str = ""
+    id: Optional[str] = None
+    mode: Optional[str] = "RIGHT_HAND"
+    amount: Optional[str] = "1"
+    start: Optional[str] = "0"
+    end: Optional[str] = None
+    stroke: Optional[str] = None
+
+
+@dataclass
+class FaceLexeme(Behavior):
+    TAG = "faceLexeme"
+    PREFIX = "f"
+    lexeme: str = ""
+    id: Optional[str] = None
+    amount: Optional[str] = "1"
+    start: Optional[str] = "0"
+    end: Optional[str] = None
+
+
+@dataclass
+class Head(Behavior):
+    TAG = "head"
+    PREFIX = "h"
+    lexeme: str = ""
+    id: Optional[str] = None
+    amount: Optional[str] = None
+    start: Optional[str] = None
+    end: Optional[str] = None
+    repetition: Optional[str] = None
+
+
+@dataclass
+class Gaze(Behavior):
+    TAG = "gaze"
+    PREFIX = "gz"
+    target: str = ""
+    id: Optional[str] = None
+    start: Optional[str] = "0"
+    end: Optional[str] = None
+    stroke: Optional[str] = None
+
+
+@dataclass
+class GazeDirectionShift(Behavior):
+    TAG = "gazedirectionshift"
+    PREFIX = "gs"
+    target: str = ""
+    id: Optional[str] = None
+    start: Optional[str] = "0"
+
+
+@dataclass
+class Pointing(Behavior):
+    TAG = "pointing"
+    PREFIX = "p"
+    target: str = ""
+    id: Optional[str] = None
+    start: Optional[str] = "0"
+    end: Optional[str] = None
+    stroke: Optional[str] = None
+
+
+@dataclass
+class Posture(Behavior):
+    TAG = "posture"
+    PREFIX = "pos"
+    stance: str = field(default="", metadata={"attribute": False})
+    target: str = field(default="User", metadata={"attribute": False})
+    facing: str = field(default="FRONT", metadata={"attribute": False})
+    id: Optional[str] = None
+    start: Optional[str] = "0"
+    end: Optional[str] = None
+
+    def write(self, parts: List[str]):
+        parts.append("  <posture")
+        self.write_attributes(parts)
+        parts.append(f'><stance type="{self.stance}"/><target name="{self.target}" facing="{self.facing}"/></posture>\n')
+
+
+_default_validator: Optional[Callable[["BmlDocument"], None]] = None
+
+
+def set_default_validator(validator: Optional[Callable[["BmlDocument"], None]]):
+    """Validatore dei documenti che non ne hanno uno proprio (None per nessuno)"""
+    global _default_validator
+    _default_validator = validator
+
+
+class BmlDocument:
+    """Documento BML di un personaggio.
+
+    id_source: iteratore di id condiviso tra documenti (es. itertools.count()), altrimenti
+    gli id sono il prefisso del tipo seguito da un contatore proprio del documento (s1, g1, g2...)
+    """
+    def __init__(self, bml_id: str, character: str = "Audrey", composition: str = "APPEND",
+                 xml_declaration: bool = False, id_source: Optional[Iterator] = None,
+                 validator: Optional[Callable[["BmlDocument"], None]] = None):
+        self.id = bml_id
+        self.character = character
+        self.composition = composition
+        self.xml_declaration = xml_declaration
+        self.id_source = id_source
+        self.validator = validator
+        self.behaviors: List[Behavior] = []
+        self.counters = dict()  # prefisso -> contatore
+        self.parts: List[str] = []  # buffer riusato da to_xml()
+
+    def add(self, behavior: Behavior) -> Behavior:
+        if behavior.id is None:
+            if self.id_source is not None:
+                behavior.id = str(next(self.id_source))
+            else:
+                counter = self.counters.setdefault(behavior.PREFIX, itertools.count(1))
+                behavior.id = f"{behavior.PREFIX}{next(counter)}"
+        self.behaviors.append(behavior)
+        return behavior
+
+    def extend(self, behaviors):
+        for behavior in behaviors:
+            self.add(behavior)
+
+    def to_xml(self) -> str:
+        validator = self.validator or _default_validator
+        if validator is not None:
+            validator(self)
+        parts = self.parts
+        parts.clear()
+        if self.xml_declaration:
+            parts.append(XML_DECLARATION)
+        parts.append(f'<bml xmlns="{BML_NAMESPACE}" xmlns:ext="{EXT_NAMESPACE}"\n'
+                     f'  id="{self.id}" characterId="{self.character}" composition="{self.composition}">\n')
+        for behavior in self.behaviors:
+            behavior.write(parts)
+        parts.append("</bml>")
+        return "".join(parts)
+
+
+def check_references(document: BmlDocument):
+    """Validatore: id unici e riferimenti di sincronizzazione verso comportamenti
+    (e marker del parlato) esistenti
+    """
+    by_id = dict()
+    for behavior in document.behaviors:
+        if behavior.id in by_id:
+            raise BmlValidationError(f"duplicate id {behavior.id!r} in BML {document.id!r}")
+        by_id[behavior.id] = behavior
+    for behavior in document.behaviors:
+        for name in SYNC_ATTRIBUTES:
+            value = getattr(behavior, name, None)
+            match = SYNC_REFERENCE.match(str(value)) if value is not None else None
+            if not match:
+                continue
+            target = by_id.get(match.group(1))
+            if target is None:
+                raise BmlValidationError(f"{behavior.id}.{name} references unknown behavior {match.group(1)!r}")
+            if isinstance(target, Speech) and match.group(2).startswith("tm") \
+                    and f'name="{match.group(2)}"' not in target.text:
+                raise BmlValidationError(f"{behavior.id}.{name} references unknown marker {value!r}")
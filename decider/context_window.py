@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Finestra di contesto della conversazione con un budget di token.
+
+Al posto di un taglio fisso della cronologia (gli ultimi 15 messaggi), si tengono i turni
+più recenti finché la loro somma di token resta nel budget. I turni esclusi possono essere
+riassunti in un riassunto estrattivo incrementale (prima frase di ogni turno), anch'esso
+limitato in token, inviato all'LLM come messaggio di sistema.
+
+Il conteggio dei token è approssimato (parole e punteggiatura, le parole lunghe contano di più):
+non serve il tokenizer del modello per restare sotto il suo limite con un margine.
+Ogni messaggio viene contato una sola volta, quando viene aggiunto.
+"""
+
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+FIRST_SENTENCE = re.compile(r"^(.+?[.!?…])(\s|$)", re.S)
+MESSAGE_OVERHEAD = 4  # token del ruolo e dei separatori di un messaggio nel prompt
+SUMMARY_PREFIX = "Riassunto della conversazione precedente:\n"
+
+
+@lru_cache(maxsize=1024)
+def approx_tokens(text: str) -> int:
+    """Numero approssimato di token di un testo (~4 caratteri per token per le parole lunghe)"""
+    return sum(1 + (len(t) - 1) // 4 for t in TOKEN_PATTERN.findall(text))
+
+
+def first_sentence(text: str, max_chars: int = 200) -> str:
+    match = FIRST_SENTENCE.match(text.strip())
+    sentence = match.group(1) if match else text.strip()
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + "…"
+
+
+class ContextWindow:
+    """Cronologia della conversazione limitata a "token_budget" token.
+
+    summary_tokens: budget del riassunto dei turni esclusi, 0 per non fare riassunti
+    """
+    def __init__(self, token_budget: int = 2000, summary_tokens: int = 300,
+                 speaker_names: Optional[Dict[str, str]] = None):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.speaker_names = speaker_names or {"user": "Utente", "assistant": "Audrey"}
+        self.entries = deque()        # (messaggio, token)
+        self.total_tokens = 0
+        self.summary_lines = deque()  # (riga, token)
+        self.summary_total = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, role: str, content: str) -> List[dict]:
+        """Aggiunge un messaggio, restituisce i messaggi esclusi dalla finestra"""
+        message = {"role": role, "content": content}
+        tokens = approx_tokens(content) + MESSAGE_OVERHEAD
+        self.entries.append((message, tokens))
+        self.total_tokens += tokens
+
+        evicted = []
+        # l'ultimo messaggio resta sempre, anche se da solo supera il budget
+        while self.total_tokens > self.token_budget and len(self.entries) > 1:
+            old_message, old_tokens = self.entries.popleft()
+            self.total_tokens -= old_tokens
+            evicted.append(old_message)
+        if evicted and self.summary_tokens > 0:
+            self.fold_into_summary(evicted)
+        return evicted
+
+    def fold_into_summary(self, messages: List[dict]):
+        """Aggiunge al riassunto la prima frase dei messaggi esclusi, i più vecchi escono per primi"""
+        for message in messages:
+            speaker = self.speaker_names.get(message["role"], message["role"])
+            line = f"- {speaker}: {first_sentence(message['content'])}"
+            tokens = approx_tokens(line)
+            self.summary_lines.append((line, tokens))
+            self.summary_total += tokens
+        while self.summary_total > self.summary_tokens and self.summary_lines:
+            _, tokens = self.summary_lines.popleft()
+            self.summary_total -= tokens
+
+    @property
+    def summary(self) -> str:
+        if not self.summary_lines:
+            return ""
+        return SUMMARY_PREFIX + "\n".join(line for line, _ in self.summary_lines)
+
+    def messages(self) -> List[dict]:
+        """Messaggi della finestra, dal più vecchio"""
+        return [message for message, _ in self.entries]
@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
 
-import os
 import random
 import time
 import io
 import json
+import uuid
+from dataclasses import dataclass, field
+from enum import Enum
 from setup_udp_client import udp_client
+from Tracing import LatencyTracer, TraceCollector, split_trace, attach_trace, TRACE_TOPIC, REPORT_TOPIC
+from large_language_model.llm_protocol import session_message, SESSION_STATUS_TOPIC
+from context_window import ContextWindow
 from agent_player_utils import AgentPlayerControl
 from conversation_utils import maybe_update_agent_interaction, check_goodbye
-from pipeline_debug import pipeline
-import xml.etree.ElementTree as ET
+from pipeline_debug import pipeline, warmup as warmup_pipeline
+from nlp_resources import start_warmup
+from bml_builder import Gaze, Speech
+from icebreaker_store import IcebreakerStore
+from scheduler import DeadlineScheduler
 from dynamic_prompt import build_prompt_from_excel
 
 # === CONFIGURAZIONE ===
@@ -19,8 +27,15 @@ ICEBREAKER_FOLDER = "icebreakers"
 STARTUP_BML_FILE = "startup.xml"
 PROMPT_FILE = "prompt_bml_plain.txt"
 INACTIVITY_TIMEOUT = 30
-GAZE_SHIFT_INTERVAL = random.randint(5, 10)
+GAZE_SHIFT_INTERVAL = (7, 12)   # intervallo casuale tra due gaze shift (s)
 POST_SPEAK_DELAY = 5
+STARTUP_DELAY = 3               # tra l'attivazione di tutti i moduli e il BML di avvio
+GAZE_START_DELAY = 10           # primo gaze shift dopo il BML di avvio
+ICEBREAKER_START_DELAY = 20     # nessun icebreaker prima di questo tempo dopo l'avvio
+GOODBYE_TIMEOUT = 60            # chiusura anche senza "speech off" dopo l'addio
+# Cronologia inviata all'LLM (oltre al system prompt): budget in token e riassunto dei turni esclusi
+CONTEXT_TOKEN_BUDGET = 1500
+CONTEXT_SUMMARY_TOKENS = 250  # 0 per non riassumere
 
 user_id = int(input("Inserisci l'ID (0 per prompt statico): ").strip())
 
@@ -39,14 +54,9 @@ else:
 system_prompt_message = {'role': 'system', 'content': system_prompt_content}
 system_prompt_reminder_message = {'role': 'system', 'content': system_prompt_reminder_content}
 
-# Stato globale
-used_icebreakers: set[str] = set()
-last_user_interaction_time: float = time.time()
-last_gaze_shift_time = time.time()
-last_speech_end_time = 0.0
-
+# Un nome che finisce con "/" accetta qualsiasi modulo del tipo (es. Groq o il modulo LLM offline)
 REQUIRED_MODULES = {
-    "LARGE_LANGUAGE_MODEL/LLAMA3_ONLINE_GROQ",
+    "LARGE_LANGUAGE_MODEL/",
     "SPEECH/REALTIME_WHISPER",
     "DECIDER/CONVERSATION_GESTURE",
     "WEBCAM/GAZE_DETECTION"
@@ -57,289 +67,415 @@ SUBSCRIPTIONS = [
     'USER_CONTEXT_PERCEPTION',
     'AUDIO_FEATURES_PERCEPTION',
     'LLM_RESPONSE',
+    'LLM_RESPONSE_SENTENCE',
+    SESSION_STATUS_TOPIC,
     'COMMON',
     'AGENT_PLAYER_STATUS',
-    'USER_STATUS'
+    'USER_STATUS',
+    TRACE_TOPIC
 ]
 
 for subscribe in SUBSCRIPTIONS:
     udp_client.send(f"Subscribe:{subscribe}")
 
+# Le risorse NLP della pipeline si caricano mentre si aspettano gli altri moduli
+start_warmup(warmup_pipeline)
+
 with open(STARTUP_BML_FILE, "r", encoding="utf-8") as f:
     startup_bml = f.read()
 
 agent_player = AgentPlayerControl(udp_client)
 
-# === VARIABILI DI STATO ===
-
-activated_modules = set()
-conversation_history = []
-user_context = {"activity": "other", "gaze": "front"}
-agent_interaction = True
-startup_message_sent = False
-startup_sent_time = None
-used_icebreakers = set()
-last_user_interaction_time = time.time()
-goodbye_triggered = False
-speaking = False
-close_all = True
-icebreaker_pending = False
-user_speaking = False
+# Tracce di latenza dei turni (Tracing.py): le tappe degli altri moduli arrivano su TRACE_TOPIC
+tracer = LatencyTracer(udp_client, MODULE_FULL_NAME)
+trace_collector = TraceCollector()
+udp_client.add_topic_callback(TRACE_TOPIC, trace_collector.add)
 
-# === FUNZIONI ===
 
-current_icebreaker = None  # (group_name, variant_index)
-
-def discard_current_icebreaker_group():
-    """Scarta l'intero gruppo corrente di icebreaker dopo risposta utente."""
-    global current_icebreaker
-    if current_icebreaker:
-        group_name, _ = current_icebreaker
-        used_icebreakers.add(group_name)
-        print(f"[ICE] Gruppo icebreaker '{group_name}' scartato dopo risposta utente.")
-        current_icebreaker = None
-
-def get_next_icebreaker_variant():
-    global current_icebreaker
-
-    if current_icebreaker is None:
-        available_groups = [d for d in os.listdir(ICEBREAKER_FOLDER) if os.path.isdir(os.path.join(ICEBREAKER_FOLDER, d))]
-        unused_groups = list(set(available_groups) - used_icebreakers)
-        if not unused_groups:
-            print("[ICE] Nessun gruppo icebreaker disponibile.")
-            return None
-
-        chosen_group = random.choice(unused_groups)
-        used_icebreakers.add(chosen_group)
-        current_icebreaker = (chosen_group, 0)
-
-    group_name, index = current_icebreaker
-    group_path = os.path.join(ICEBREAKER_FOLDER, group_name)
-    next_file = os.path.join(group_path, f"{index + 1}.xml")
-
-    if os.path.exists(next_file):
-        current_icebreaker = (group_name, index + 1)
-        with open(next_file, "r", encoding="utf-8") as f:
-            return next_file, f.read()
-    else:
-        print(f"[ICE] Fine varianti per il gruppo {group_name}")
-        current_icebreaker = None
-        return None
+# === STATO ===
 
-def handle_goodbye_sequence():
-    print("[GOODBYE] Frase di addio rilevata. Attendo fine del parlato di Audrey...")
-    while True:
-        received_messages = udp_client.get_received_messages()
-        if (agent_status := received_messages.get('AGENT_PLAYER_STATUS')):
-            if "Audrey:speech off" in agent_status:
-                print("[GOODBYE] Audrey ha terminato di parlare. Interazione conclusa.")
-                if close_all:
-                    udp_client.send("COMMON:BROADCAST_REQUEST_SHUTDOWN") # per terminare tutto
-                break
-        time.sleep(0.1)
+class Phase(Enum):
+    WAITING_MODULES = "waiting_modules"  # attesa dei moduli richiesti
+    STARTING = "starting"                # BML di avvio programmato
+    LISTENING = "listening"              # Audrey non parla, frasi dell'utente accettate
+    SPEAKING = "speaking"                # BML con parlato inviati e non ancora terminati
+    GOODBYE = "goodbye"                  # addio: si aspetta la fine del parlato per chiudere
+    CLOSED = "closed"
+
+# Topic letti in ogni fase (None: tutti), gli altri restano in coda
+PHASE_TOPICS = {
+    Phase.WAITING_MODULES: ['COMMON'],
+    Phase.STARTING: ['COMMON'],
+    Phase.GOODBYE: ['COMMON', 'AGENT_PLAYER_STATUS'],
+}
+
+@dataclass
+class ConversationState:
+    phase: Phase = Phase.WAITING_MODULES
+    activated_modules: set = field(default_factory=set)
+    user_context: dict = field(default_factory=lambda: {"activity": "other", "gaze": "front"})
+    agent_interaction: bool = True
+    goodbye_triggered: bool = False
+    user_speaking: bool = False
+    icebreaker_pending: bool = False  # inattività scaduta mentre l'utente guarda in basso
+    startup_time: float = 0.0         # time.monotonic() del BML di avvio
+    last_speech_end_time: float = 0.0
+    pending_speeches: int = 0         # BML con parlato inviati e non ancora terminati ("speech off")
+    streamed_sentences: int = 0       # frasi della risposta LLM in corso già inviate come BML
+    response_count: int = 0           # domande inviate all'LLM, dà gli id dei BML della risposta
+    speech_trace_id: str = None       # traccia di latenza del BML inviato, chiusa da "speech on"
+    llm_session_open: bool = False
+
+state = ConversationState()
+scheduler = DeadlineScheduler()
+conversation_history = ContextWindow(CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARY_TOKENS)
+icebreakers = IcebreakerStore(ICEBREAKER_FOLDER)
+close_all = True
+# Sessione del modulo LLM (llm_protocol.py): il modulo tiene il system prompt e la cronologia,
+# il decider invia solo i nuovi messaggi
+llm_session_id = uuid.uuid4().hex[:8]
+
+def set_phase(phase: Phase):
+    if phase is not state.phase:
+        print(f"[STATE] {state.phase.value} -> {phase.value}")
+        read_topics = PHASE_TOPICS.get(state.phase)
+        state.phase = phase
+        if read_topics is not None:
+            discard_unread_messages(read_topics)
+
+def discard_unread_messages(read_topics):
+    """Messaggi rimasti in coda in una fase che non li leggeva (es. frasi dell'utente prima
+    dell'avvio): sono superati e non vanno trattati nella fase successiva
+    """
+    for topic in SUBSCRIPTIONS:
+        if topic not in read_topics:
+            discarded = udp_client.get_topic_messages(topic)
+            if discarded:
+                print(f"[INFO] {len(discarded)} messaggi {topic} scartati")
+
+# === FUNZIONI ===
 
 def check_all_modules_activated(message: str) -> bool:
     if 'MODULE_SUCCESSFULLY_ACTIVATED' in message:
         module_name = message.split(':')[-1]
-        activated_modules.add(module_name)
+        state.activated_modules.add(module_name)
         print(f"[INFO] Module activated: {module_name}")
-    return REQUIRED_MODULES.issubset(activated_modules)
-
-def process_user_sentence(sentence: str):
-    global last_user_interaction_time, agent_interaction, goodbye_triggered, speaking
+    return all(
+        any(name.startswith(required) for name in state.activated_modules) if required.endswith("/")
+        else required in state.activated_modules
+        for required in REQUIRED_MODULES
+    )
 
+def process_user_sentence(sentence: str, trace_id=None):
     reset_inactivity_timer()
     print("[USER]", sentence)
 
-    if current_icebreaker:
-        discard_current_icebreaker_group()
+    icebreakers.discard_current()
 
-    goodbye_triggered = check_goodbye(sentence)
+    state.goodbye_triggered = check_goodbye(sentence)
 
-    agent_interaction, agent_response = maybe_update_agent_interaction(sentence, agent_interaction)
+    state.agent_interaction, agent_response = maybe_update_agent_interaction(sentence, state.agent_interaction)
     if agent_response:
-        speaking = True
         print("[DEBUG] Risposta automatica: speaking=True")
-        agent_player.agent.speak(agent_response)
+        bml = agent_player.agent.new_bml()
+        bml.add(Speech(agent_response, priority=0))
+        send_agent_bml(bml.to_xml())
         return
 
-    if agent_interaction:
-        conversation_history.append({'role': 'user', 'content': sentence})
-        llm_query_prompt = json.dumps(
-            [system_prompt_message] + conversation_history[-15:]
-        )
-        udp_client.send(f'LLM_QUERY:{llm_query_prompt}')
-
-def process_llm_response(response: str):
-    global speaking
-    print("[LLAMA]:", response)
-    bml = pipeline(response)
-    # print("[DEBUG] BML generato:", bml)
+    if state.agent_interaction:
+        evicted = conversation_history.append('user', sentence)
+        start_llm_response()
+        if state.llm_session_open:
+            send_llm_session("user", trace_id, content=sentence, **window_update(evicted))
+        else:
+            open_llm_session(respond=True, trace_id=trace_id)
+        tracer.stage(trace_id, "llm_query_sent")
+
+def window_update(evicted) -> dict:
+    """Campi che riportano sulla sessione LLM i turni usciti dalla finestra di contesto"""
+    if not evicted:
+        return {}
+    return {"keep": len(conversation_history), "summary": conversation_history.summary}
+
+def start_llm_response():
+    """Nuova domanda all'LLM: la risposta precedente, anche se superata e mai conclusa
+    da LLM_RESPONSE, non conta più (né i suoi id BML né le sue frasi già inviate)
+    """
+    state.response_count += 1
+    state.streamed_sentences = 0
+
+def send_llm_session(op: str, trace_id=None, **fields):
+    udp_client.send(f'LLM_QUERY:{attach_trace(session_message(llm_session_id, op, **fields), trace_id)}')
+
+def open_llm_session(respond=False, trace_id=None):
+    """Invia al modulo LLM il system prompt e la cronologia (anche dopo un suo riavvio),
+    con respond=True il modulo risponde all'ultimo messaggio dell'utente
+    """
+    send_llm_session("init", trace_id, system=system_prompt_content, history=conversation_history.messages(),
+                     summary=conversation_history.summary, max_history=None, respond=respond)
+    state.llm_session_open = True
+
+def add_assistant_turn(text: str):
+    """Frase di Audrey che non viene dall'LLM (es. icebreaker), aggiunta anche alla sessione"""
+    evicted = conversation_history.append('assistant', text)
+    if state.llm_session_open:
+        send_llm_session("assistant", content=text, **window_update(evicted))
+
+def send_agent_bml(bml: str):
+    """Unico punto di invio dei BML ad Audrey: ogni BML con parlato è contato fino al suo "speech off" """
+    if "<speak" in bml or "<speech" in bml:
+        speech_sent()
+    agent_player.agent.send_bml(bml)
 
-    speaking = "<speak" in bml or "<speech" in bml
-    # print(f"[DEBUG] speaking impostato a {speaking} in base al contenuto del BML")
+def speech_sent():
+    """BML con parlato inviato (send_agent_bml): Audrey parla fino al suo "speech off" """
+    state.pending_speeches += 1
+    if state.phase is Phase.LISTENING:
+        set_phase(Phase.SPEAKING)
+        scheduler.cancel("gaze_shift")
+
+def speech_ended():
+    """Ultimo "speech off": Audrey ha finito di parlare"""
+    state.last_speech_end_time = time.monotonic()
+    state.icebreaker_pending = False
+    if state.phase is Phase.GOODBYE:
+        finish_goodbye()
+        return
+    set_phase(Phase.LISTENING)
+    reset_inactivity_timer()
+    schedule_gaze_shift()
+
+def send_response_bml(text: str, bml_id: str, trace_id=None):
+    """Genera il BML di un testo dell'LLM e lo invia ad Audrey"""
+    bml = pipeline(text, bml_id=bml_id)
+    tracer.stage(trace_id, "bml_generated")
+    # print("[DEBUG] BML generato:", bml)
 
     with open("output_bml.xml", "w", encoding="utf-8") as f:
         f.write(bml)
 
-    agent_player.agent.send_bml(bml)
-    conversation_history.append({'role': 'assistant', 'content': response})
+    send_agent_bml(bml)
+    tracer.stage(trace_id, "bml_sent")
+    if state.streamed_sentences == 0:
+        # primo BML della risposta: la traccia di un turno precedente mai chiusa non vale più
+        state.speech_trace_id = trace_id
+
+def process_llm_sentence(sentence_message: str, trace_id=None):
+    """Frase completa di una risposta in streaming: inviata subito come BML in APPEND,
+    così Audrey inizia a parlare dopo la prima frase
+    """
+    sentence = json.loads(sentence_message)
+    print(f"[LLAMA {sentence['index']}]:", sentence["text"])
+    send_response_bml(sentence["text"], f"bml{state.response_count}_{sentence['index']}", trace_id)
+    state.streamed_sentences += 1
+
+def process_llm_response(response: str, trace_id=None):
+    # le frasi ancora in coda appartengono a questa risposta: vanno inviate prima
+    for sentence_message in udp_client.get_topic_messages('LLM_RESPONSE_SENTENCE'):
+        sentence_trace_id, sentence_message = split_trace(sentence_message)
+        process_llm_sentence(sentence_message, sentence_trace_id)
+
+    if state.streamed_sentences == 0:
+        print("[LLAMA]:", response)
+        send_response_bml(response, f"bml{state.response_count}", trace_id)
+    # la risposta è già nella sessione del modulo LLM, ma può far uscire turni dalla finestra
+    evicted = conversation_history.append('assistant', response)
+    if state.llm_session_open and evicted:
+        send_llm_session("trim", **window_update(evicted))
+    state.streamed_sentences = 0
+
+def report_turn_latency():
+    """Chiude la traccia del turno quando Audrey inizia a parlare e pubblica il dettaglio"""
+    trace_id = state.speech_trace_id
+    tracer.stage(trace_id, "speech_on")
+    trace_collector.add(json.dumps({"trace": trace_id, "stage": "speech_on", "t": time.time()}))
+    print(trace_collector.report(trace_id))
+    breakdown = {stage: round(delta, 1) for stage, delta, _ in trace_collector.breakdown(trace_id)}
+    udp_client.send(f'{REPORT_TOPIC}:{json.dumps({"trace": trace_id, "stages_ms": breakdown})}')
+    trace_collector.pop(trace_id)
+    state.speech_trace_id = None
 
 def send_startup_message():
-    global startup_message_sent, startup_sent_time
-    print("[INFO] All modules activated -> send start up message")
-    time.sleep(3)
-    agent_player.agent.send_bml(startup_bml)
-    startup_message_sent = True
-    startup_sent_time = time.time()
+    print("[INFO] Send start up message")
+    state.startup_time = time.monotonic()
+    set_phase(Phase.LISTENING)
+    send_agent_bml(startup_bml)
+    reset_inactivity_timer()
+    scheduler.schedule("gaze_shift", GAZE_START_DELAY, send_random_gaze_bml)
+    scheduler.schedule("icebreaker_reload", icebreakers.check_interval, reload_icebreakers)
 
 def reset_inactivity_timer():
-    global last_user_interaction_time
-    last_user_interaction_time = time.time()
-    print(f"[ICE] Reset timer: 25 sec")
-
-def estrai_frase_da_bml(xml_path: str) -> str:
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-
-    speak_elem = next((el for el in root.iter() if el.tag.endswith('speak')), None)
-    if speak_elem is None:
-        return ""
-
-    frase = "".join(speak_elem.itertext()).strip()
-    return frase
+    """Icebreaker dopo INACTIVITY_TIMEOUT senza interazioni (mai prima di ICEBREAKER_START_DELAY dall'avvio)"""
+    deadline = max(time.monotonic() + INACTIVITY_TIMEOUT, state.startup_time + ICEBREAKER_START_DELAY)
+    scheduler.schedule_at("inactivity", deadline, handle_inactivity)
+    print(f"[ICE] Reset timer: {INACTIVITY_TIMEOUT} sec")
 
 def handle_inactivity():
-    global last_user_interaction_time, speaking, icebreaker_pending, user_speaking, current_icebreaker
-    if startup_sent_time is None:
+    if state.phase is not Phase.LISTENING or state.user_speaking:
+        return  # "speech off" o STOP_SPEAKING riprogrammano il timer
+    if state.user_context.get("gaze", "").lower() == "down":
+        if not state.icebreaker_pending:
+            print("[GAZE x ICE] User looking down -> no icebreaker")
+        state.icebreaker_pending = True
         return
-
-    if time.time() - startup_sent_time < 20:
+    send_icebreaker()
+
+def send_icebreaker():
+    icebreaker = icebreakers.next_variant()
+    if icebreaker is None and icebreakers.unused:
+        icebreaker = icebreakers.next_variant()  # gruppo finito: si passa a un altro
+    if icebreaker is None:
+        reset_inactivity_timer()
         return
+    print(f"[ICE] Detected inactivity -> {icebreaker.group} {icebreaker.index}/{len(icebreakers.groups[icebreaker.group])}")
+    send_agent_bml(icebreaker.bml)
 
-    if time.time() - last_user_interaction_time > INACTIVITY_TIMEOUT and not speaking:
-        if user_context.get("gaze", "").lower() == "down":
-            if not icebreaker_pending:
-                print("[GAZE x ICE] User looking down -> no icebreaker")
-            icebreaker_pending = True
-            return
-        
-        if not user_speaking: # se l'utente sta parlando non gli parlo sopra
-
-            result = get_next_icebreaker_variant()
-            if result:
-                xml_path, icebreaker_bml = result
-                print(f"[ICE] Detected inactivity -> {current_icebreaker[0]} {current_icebreaker[1]}/3")
-                agent_player.agent.send_bml(icebreaker_bml)
-                speaking = True
-
-                speak_text = estrai_frase_da_bml(xml_path)
-                conversation_history.append({
-                    'role': 'assistant',
-                    'content': speak_text
-                })
-                icebreaker_pending = False
+    add_assistant_turn(icebreaker.text)
+    state.icebreaker_pending = False
+
+def reload_icebreakers():
+    icebreakers.maybe_reload()
+    scheduler.schedule("icebreaker_reload", icebreakers.check_interval, reload_icebreakers)
+
+def schedule_gaze_shift():
+    """Prossimo gaze shift, non prima di POST_SPEAK_DELAY dalla fine del parlato"""
+    deadline = max(time.monotonic() + random.randint(*GAZE_SHIFT_INTERVAL),
+                   state.last_speech_end_time + POST_SPEAK_DELAY)
+    scheduler.schedule_at("gaze_shift", deadline, send_random_gaze_bml)
 
 def send_random_gaze_bml():
+    if state.phase is not Phase.LISTENING:
+        return  # riprogrammato alla fine del parlato
     directions = ["left", "right", "up", "down", "upright", "upleft"]
     chosen_target = random.choice(directions)
     duration = round(random.uniform(1,2), 2)
 
-    bml = f"""
-    <bml xmlns="http://www.bml-initiative.org/bml/bml-1.0" id="gazeShift" characterId="Audrey" composition="MERGE">
-        <gaze id="g0" start="0" end="start+{duration}" target="{chosen_target}"/>
-    </bml>
-    """
-
-    agent_player.agent.send_bml(bml)
+    agent_player.agent.send_behaviors(Gaze(chosen_target, end=f"start+{duration}"))
     print(f"[GAZE SHIFT] Audrey looks {chosen_target} for {duration} seconds")
+    schedule_gaze_shift()
 
-# === AVVIO ===
-
-udp_client.send(f'COMMON:MODULE_SUCCESSFULLY_ACTIVATED:{MODULE_FULL_NAME}')
-
-while not startup_message_sent:
-    received_messages = udp_client.get_received_messages()
-    if (message := received_messages.get('COMMON')):
-        if 'REQUEST_MODULE_DEACTIVATION' in message:
-            request_module_full_name = message.split(':')[1]
-            if MODULE_FULL_NAME == request_module_full_name:
-                udp_client.send(f'COMMON:MODULE_SUCCESSFULLY_DEACTIVATED:{MODULE_FULL_NAME}')
-                udp_client.close()
-                exit()
-
-        if check_all_modules_activated(message) and not startup_message_sent:
-            send_startup_message()
+def start_goodbye_sequence():
+    print("[GOODBYE] Frase di addio rilevata. Attendo fine del parlato di Audrey...")
+    set_phase(Phase.GOODBYE)
+    for timer in ("inactivity", "gaze_shift", "icebreaker_reload"):
+        scheduler.cancel(timer)
+    if state.pending_speeches == 0:
+        finish_goodbye()
+    else:
+        scheduler.schedule("goodbye", GOODBYE_TIMEOUT, finish_goodbye)
+
+def finish_goodbye():
+    scheduler.cancel("goodbye")
+    print("[GOODBYE] Audrey ha terminato di parlare. Interazione conclusa.")
+    if close_all:
+        udp_client.send("COMMON:BROADCAST_REQUEST_SHUTDOWN") # per terminare tutto
+    set_phase(Phase.CLOSED)
+
+# === EVENTI ===
+
+def on_common(message: str):
+    if 'REQUEST_MODULE_DEACTIVATION' in message:
+        request_module_full_name = message.split(':')[1]
+        if MODULE_FULL_NAME == request_module_full_name:
+            set_phase(Phase.CLOSED)
+            return
+    if state.phase is Phase.WAITING_MODULES and check_all_modules_activated(message):
+        print("[INFO] All modules activated -> start up message scheduled")
+        set_phase(Phase.STARTING)
+        scheduler.schedule("startup", STARTUP_DELAY, send_startup_message)
+
+def on_user_status(user_status: str):
+    print("[USER_STATUS]:", user_status)
+    if "START_SPEAKING" in user_status:
+        print("[USER_STATUS]: TRUE")
+        state.icebreaker_pending = False
+        state.user_speaking = True
+        reset_inactivity_timer()
+    elif "STOP_SPEAKING" in user_status:
+        reset_inactivity_timer()
+        print("[USER_STATUS]: false")
+        state.user_speaking = False
+
+def on_agent_status(agent_status: str):
+    print("[SPEECH]:", agent_status)
+    if "speech on" in agent_status and state.speech_trace_id:
+        report_turn_latency()
+    if "Audrey:speech off" in agent_status:
+        state.pending_speeches = max(0, state.pending_speeches - 1)
+        if state.pending_speeches == 0:
+            speech_ended()
+
+def on_user_context(context_data: str):
+    try:
+        state.user_context.update(json.loads(context_data))
+        print("[USER GAZE]", state.user_context)
+
+        if state.icebreaker_pending and state.user_context.get("gaze", "").lower() != "down":
+            print("[ICE] Icebreaker ritardato ora inviato: utente non guarda più in basso")
+            handle_inactivity()
+
+    except json.JSONDecodeError:
+        print("[ERROR] Malformed USER_CONTEXT_PERCEPTION data.")
+
+def on_session_status(session_status: str):
+    session_status = json.loads(session_status)
+    if session_status.get("session") == llm_session_id and session_status.get("status") == "unknown":
+        print("[LLM] Sessione sconosciuta dal modulo LLM: reinvio del contesto")
+        respond = session_status.get("op") == "user"
+        if respond:
+            start_llm_response()
+        open_llm_session(respond=respond)
+
+def on_user_sentence(user_full_sentence: str):
+    trace_id, user_full_sentence = split_trace(user_full_sentence)
+    tracer.stage(trace_id, "sentence_received")
+    if state.phase is Phase.LISTENING:
+        process_user_sentence(user_full_sentence, trace_id)
+    else:
+        print("[INFO] Ignorando nuova frase utente perché l'avatar sta ancora parlando.")
+
+def on_llm_sentence(llm_sentence: str):
+    trace_id, llm_sentence = split_trace(llm_sentence)
+    if state.streamed_sentences == 0:
+        tracer.stage(trace_id, "llm_response_received")
+    process_llm_sentence(llm_sentence, trace_id)
+
+def on_llm_response(llm_response: str):
+    trace_id, llm_response = split_trace(llm_response)
+    if state.streamed_sentences == 0:
+        tracer.stage(trace_id, "llm_response_received")
+    process_llm_response(llm_response, trace_id)
+
+    if state.goodbye_triggered:
+        start_goodbye_sequence()
+
+# Gestori dei messaggi, nell'ordine in cui sono trattati (le frasi LLM prima della risposta completa)
+EVENT_HANDLERS = [
+    ('COMMON', on_common),
+    ('USER_STATUS', on_user_status),
+    ('AGENT_PLAYER_STATUS', on_agent_status),
+    ('USER_CONTEXT_PERCEPTION', on_user_context),
+    (SESSION_STATUS_TOPIC, on_session_status),
+    ('USER_FULL_SENTENCE_PERCEPTION', on_user_sentence),
+    ('LLM_RESPONSE_SENTENCE', on_llm_sentence),
+    ('LLM_RESPONSE', on_llm_response),
+]
 
 # === LOOP PRINCIPALE ===
 
-while True:
-    received_messages = udp_client.get_received_messages()
-    now = time.time()
+udp_client.send(f'COMMON:MODULE_SUCCESSFULLY_ACTIVATED:{MODULE_FULL_NAME}')
 
-    if (message := received_messages.get('COMMON')):
-        if 'REQUEST_MODULE_DEACTIVATION' in message:
-            request_module_full_name = message.split(':')[1]
-            if MODULE_FULL_NAME == request_module_full_name:
+# Il loop dorme fino al prossimo messaggio o alla prossima scadenza dello scheduler
+while state.phase is not Phase.CLOSED:
+    received_messages = udp_client.wait_for_messages(timeout=scheduler.timeout(),
+                                                     topics=PHASE_TOPICS.get(state.phase))
+    for topic, handler in EVENT_HANDLERS:
+        if (message := received_messages.get(topic)):
+            handler(message)
+            if state.phase is Phase.CLOSED:
                 break
-
-    if startup_sent_time and now - startup_sent_time >= 10:
-        handle_inactivity()
-
-        if (
-            now - last_gaze_shift_time > GAZE_SHIFT_INTERVAL
-            and not speaking
-            and now - last_speech_end_time > POST_SPEAK_DELAY
-        ):
-            send_random_gaze_bml()
-            last_gaze_shift_time = now
-            GAZE_SHIFT_INTERVAL = random.randint(7, 12)
-
-    if (user_status := received_messages.get('USER_STATUS')):
-        print("[USER_STATUS]:", user_status)
-        if "START_SPEAKING" in user_status:
-            print("[USER_STATUS]: TRUE")
-            icebreaker_pending = False
-            user_speaking = True
-            reset_inactivity_timer()
-        elif "STOP_SPEAKING" in user_status:
-            reset_inactivity_timer()
-            print("[USER_STATUS]: false")
-            user_speaking = False
-
-    if (agent_status := received_messages.get('AGENT_PLAYER_STATUS')):
-        print("[SPEECH]:", agent_status)
-        if "Audrey:speech off" in agent_status:
-            icebreaker_pending = False
-            reset_inactivity_timer()
-            speaking = False
-            last_speech_end_time = time.time()
-
-    if (context_data := received_messages.get('USER_CONTEXT_PERCEPTION')):
-        try:
-            old_gaze = user_context.get("gaze")
-            user_context.update(json.loads(context_data))
-            print("[USER GAZE]", user_context)
-
-            if icebreaker_pending and user_context.get("gaze", "").lower() != "down":
-                print("[ICE] Icebreaker ritardato ora inviato: utente non guarda più in basso")
-                handle_inactivity()
-
-        except json.JSONDecodeError:
-            print("[ERROR] Malformed USER_CONTEXT_PERCEPTION data.")
-
-    if (user_full_sentence := received_messages.get('USER_FULL_SENTENCE_PERCEPTION')):
-        if not speaking:
-            process_user_sentence(user_full_sentence)
-        else:
-            print("[INFO] Ignorando nuova frase utente perché l'avatar sta ancora parlando.")
-
-    if (llm_response := received_messages.get('LLM_RESPONSE')):
-        process_llm_response(llm_response)
-
-        if goodbye_triggered:
-            handle_goodbye_sequence()
-            break
+    else:
+        scheduler.run_due()
 
 # === CHIUSURA ===
 
@@ -0,0 +1,196 @@
+"""
+Lessico precompilato della pipeline dei gesti (pipeline3.py, pipeline_debug.py).
+
+Per ogni parola contiene ciò che la pipeline chiedeva a NLTK, WordNet, VADER e TextBlob:
+  - POS "a priori" (pos_tag della parola isolata)
+  - lexname WordNet del primo synset
+  - valenza VADER (valore del lessico, da -4 a 4) e polarità TextBlob
+Così la generazione del BML fa una sola ricerca per token invece di tagger e sentiment.
+
+Il file è una tabella hash (indirizzamento aperto) letta direttamente con mmap, senza
+caricarla in memoria. Costruzione (una volta, con nltk, vaderSentiment e textblob installati):
+    python gesture_lexicon.py build [--out gesture_lexicon.bin]
+"""
+
+import os
+import re
+import math
+import mmap
+import zlib
+import struct
+import argparse
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+LEXICON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gesture_lexicon.bin")
+
+MAGIC = b"GLEX"
+VERSION = 1
+# magic, versione, n. parole, n. slot della tabella, offset tabella stringhe, offset parole, offset record
+HEADER = struct.Struct("<4sHIIIII")
+# offset della parola, lunghezza, indice POS, indice lexname, valenza VADER x1000, polarità TextBlob x10000
+RECORD = struct.Struct("<IBBBhh")
+SLOT = struct.Struct("<I")  # indice del record + 1, 0 = slot vuoto
+
+# Tokenizzazione veloce, vicina a word_tokenize: "I'm" -> "I", "'m"
+TOKEN_PATTERN = re.compile(r"\w+|'\w+|[^\w\s]")
+VADER_ALPHA = 15  # normalizzazione del compound VADER
+PRONOUN_I = ("PRP", "", 0.0, 0.0)
+
+
+def vader_compound(valence: float) -> float:
+    """Compound VADER di una somma di valenze del lessico (come SentimentIntensityAnalyzer)"""
+    return valence / math.sqrt(valence * valence + VADER_ALPHA) if valence else 0.0
+
+
+def guess_pos(token: str) -> str:
+    """POS di una parola assente dal lessico, dal suffisso"""
+    if token.endswith("ing") or token.endswith("ed"):
+        return "VBG" if token.endswith("ing") else "VBD"
+    if token.endswith("ly"):
+        return "RB"
+    if token.isalpha():
+        return "NN"
+    return "CD" if token.isdigit() else token
+
+
+def write_lexicon(entries: Iterable[Tuple[str, str, str, float, float]], path: str = LEXICON_FILE):
+    """Scrive il lessico: entries = (parola, POS, lexname, valenza VADER, polarità TextBlob)"""
+    entries = sorted({e[0]: e for e in entries}.values())
+    strings: List[str] = [""]
+    string_ids = {"": 0}
+
+    def string_id(s: str) -> int:
+        if s not in string_ids:
+            string_ids[s] = len(strings)
+            strings.append(s)
+        return string_ids[s]
+
+    words = bytearray()
+    records = bytearray()
+    for word, pos, lexname, vader, textblob in entries:
+        encoded = word.encode("utf-8")[:255]
+        records += RECORD.pack(len(words), len(encoded), string_id(pos), string_id(lexname),
+                               round(vader * 1000), round(textblob * 10000))
+        words += encoded
+    if len(strings) > 256:
+        raise ValueError("too many POS tags and lexnames for the record format")
+
+    n_slots = 1 << max(4, (2 * len(entries) - 1).bit_length())  # riempimento <= 50 %
+    slots = [0] * n_slots
+    for i, (word, *_) in enumerate(entries):
+        slot = zlib.crc32(word.encode("utf-8")[:255]) & (n_slots - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (n_slots - 1)
+        slots[slot] = i + 1
+
+    string_table = "\n".join(strings).encode("utf-8")
+    table_offset = HEADER.size
+    strings_offset = table_offset + n_slots * SLOT.size
+    words_offset = strings_offset + 4 + len(string_table)
+    records_offset = words_offset + len(words)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries), n_slots, strings_offset, words_offset, records_offset))
+        f.write(struct.pack(f"<{n_slots}I", *slots))
+        f.write(struct.pack("<I", len(string_table)) + string_table)
+        f.write(words)
+        f.write(records)
+
+
+class GestureLexicon:
+    """Lessico letto con mmap, lookup() costa un hash e in media meno di due confronti"""
+    def __init__(self, path: str = LEXICON_FILE):
+        with open(path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n_words, self.n_slots, strings_offset, self.words_offset, self.records_offset = \
+            HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.buf.close()
+            raise ValueError(f"{path} is not a gesture lexicon (version {VERSION})")
+        (length,) = struct.unpack_from("<I", self.buf, strings_offset)
+        self.strings = bytes(self.buf[strings_offset + 4:strings_offset + 4 + length]).decode("utf-8").split("\n")
+        self.mask = self.n_slots - 1
+        self.lookup = lru_cache(maxsize=8192)(self._lookup)
+
+    def __len__(self):
+        return self.n_words
+
+    def _lookup(self, token: str) -> Optional[Tuple[str, str, float, float]]:
+        """(POS, lexname, valenza VADER, polarità TextBlob) della parola minuscola, None se assente"""
+        encoded = token.encode("utf-8")[:255]
+        buf = self.buf
+        slot = zlib.crc32(encoded) & self.mask
+        while True:
+            (record_id,) = SLOT.unpack_from(buf, HEADER.size + slot * SLOT.size)
+            if not record_id:
+                return None
+            offset, length, pos, lexname, vader, textblob = RECORD.unpack_from(
+                buf, self.records_offset + (record_id - 1) * RECORD.size)
+            start = self.words_offset + offset
+            if length == len(encoded) and buf[start:start + length] == encoded:
+                return self.strings[pos], self.strings[lexname], vader / 1000, textblob / 10000
+            slot = (slot + 1) & self.mask
+
+    def analyze(self, text: str) -> List[Tuple[str, str, str, float, float]]:
+        """(parola, POS, lexname, valenza VADER, polarità TextBlob) dei token del testo"""
+        analyzed = []
+        for word in TOKEN_PATTERN.findall(text):
+            token = word.lower()
+            if token == "i":
+                entry = PRONOUN_I  # il lessico è in minuscolo, "i" isolato non sarebbe un pronome
+            else:
+                entry = self.lookup(token) or (guess_pos(token), "", 0.0, 0.0)
+            analyzed.append((word, *entry))
+        return analyzed
+
+    def close(self):
+        self.buf.close()
+
+
+def load_lexicon(path: str = LEXICON_FILE) -> Optional[GestureLexicon]:
+    """Lessico se il file esiste (altrimenti la pipeline usa NLTK, VADER e TextBlob)"""
+    if not os.path.exists(path):
+        return None
+    return GestureLexicon(path)
+
+
+def collect_entries() -> Iterable[Tuple[str, str, str, float, float]]:
+    """Parole di WordNet, del lessico VADER e del tagger, analizzate come faceva la pipeline"""
+    from nltk.corpus import wordnet as wn
+    from nltk.tag.perceptron import PerceptronTagger
+    from textblob import TextBlob
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+    analyzer = SentimentIntensityAnalyzer()
+    tagger = PerceptronTagger()  # pos_tag() ricarica il modello a ogni chiamata
+    vocabulary = {w.lower() for w in wn.all_lemma_names() if re.fullmatch(r"[a-z]+(?:'[a-z]+)?", w)}
+    vocabulary |= {w.lower() for w in analyzer.lexicon if re.fullmatch(r"[\w']+", w)}
+    vocabulary |= {w.lower() for w in tagger.tagdict if re.fullmatch(r"[\w']+", w)}
+    for word in sorted(vocabulary):
+        synsets = wn.synsets(word)
+        yield (word, tagger.tag([word])[0][1], synsets[0].lexname().lower() if synsets else "",
+               analyzer.lexicon.get(word, 0.0), TextBlob(word).sentiment.polarity)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gesture lexicon of the BML pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="precompute the lexicon with NLTK, VADER and TextBlob")
+    build.add_argument("--out", default=LEXICON_FILE)
+    lookup = subparsers.add_parser("lookup", help="print the entries of words")
+    lookup.add_argument("words", nargs="+")
+    lookup.add_argument("--lexicon", default=LEXICON_FILE)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        write_lexicon(collect_entries(), args.out)
+        lexicon = GestureLexicon(args.out)
+        print(f"{len(lexicon)} words -> {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+    else:
+        lexicon = GestureLexicon(args.lexicon)
+        for word in args.words:
+            print(word, lexicon.lookup(word.lower()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Icebreaker del decider, caricati una volta in memoria.
+
+La cartella contiene un gruppo per sottocartella, con le varianti 1.xml, 2.xml, ... in ordine.
+All'avvio ogni variante è letta e validata (XML ben formato, frase nel <speak>), il BML è
+tenuto pronto da inviare e la frase già estratta: next_variant() non tocca il disco.
+maybe_reload() ricarica la cartella se è cambiata (controllata al massimo ogni "check_interval" s).
+"""
+
+import os
+import random
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Icebreaker:
+    group: str
+    index: int  # numero della variante, da 1
+    path: str
+    bml: str    # contenuto del file, inviato così com'è
+    text: str   # frase detta da Audrey
+
+
+def extract_sentence(bml: str) -> str:
+    """Testo del primo <speak> del BML (senza i <mark>)"""
+    root = ET.fromstring(bml)
+    speak_elem = next((el for el in root.iter() if el.tag.endswith('speak')), None)
+    if speak_elem is None:
+        return ""
+    return " ".join("".join(speak_elem.itertext()).split())
+
+
+def load_group(group_path: str, group: str) -> List[Icebreaker]:
+    """Varianti 1.xml, 2.xml, ... del gruppo, fino alla prima mancante"""
+    variants = []
+    index = 1
+    while os.path.exists(path := os.path.join(group_path, f"{index}.xml")):
+        with open(path, "r", encoding="utf-8") as f:
+            bml = f.read()
+        text = extract_sentence(bml)
+        if not text:
+            raise ValueError(f"{path}: nessuna frase nel <speak>")
+        variants.append(Icebreaker(group, index, path, bml, text))
+        index += 1
+    return variants
+
+
+class IcebreakerStore:
+    """Gruppi di icebreaker in memoria: un gruppo scelto a caso tra quelli non ancora usati,
+    poi le sue varianti in ordine. Un gruppo usato (o scartato) non viene più proposto.
+    """
+    def __init__(self, folder: str, check_interval: float = 5.0, rng: Optional[random.Random] = None):
+        self.folder = folder
+        self.check_interval = check_interval
+        self.rng = rng or random.Random()
+        self.groups: Dict[str, List[Icebreaker]] = dict()
+        self.used = set()
+        self.unused: List[str] = []  # gruppi disponibili, rimossi con swap-pop
+        self.current: Optional[Tuple[str, int]] = None  # (gruppo, ultima variante inviata)
+        self.signature = None
+        self.last_check = 0.0
+        self.load()
+
+    def folder_signature(self):
+        """mtime della cartella, dei gruppi e dei file: cambia se un file è aggiunto o modificato"""
+        signature = []
+        for entry in os.scandir(self.folder):
+            if entry.is_dir():
+                signature.append((entry.name, "", entry.stat().st_mtime_ns))
+                signature.extend((entry.name, f.name, f.stat().st_mtime_ns) for f in os.scandir(entry.path))
+        return sorted(signature)
+
+    def load(self):
+        groups = dict()
+        signature = self.folder_signature()
+        for entry in os.scandir(self.folder):
+            if not entry.is_dir():
+                continue
+            try:
+                variants = load_group(entry.path, entry.name)
+            except (OSError, ValueError, ET.ParseError) as e:
+                print(f"[ICE] Gruppo '{entry.name}' ignorato: {e}")
+                continue
+            if variants:
+                groups[entry.name] = variants
+        self.groups = groups
+        self.signature = signature
+        self.unused = sorted(set(groups) - self.used)
+        if self.current is not None and self.current[0] not in groups:
+            self.current = None
+        print(f"[ICE] {len(groups)} gruppi di icebreaker caricati ({len(self.unused)} non usati)")
+
+    def maybe_reload(self, now: Optional[float] = None) -> bool:
+        """Ricarica se la cartella è cambiata, True se ricaricata"""
+        now = time.time() if now is None else now
+        if now - self.last_check < self.check_interval:
+            return False
+        self.last_check = now
+        try:
+            if self.folder_signature() == self.signature:
+                return False
+            self.load()
+        except OSError as e:
+            print(f"[ICE] Ricarica degli icebreaker fallita: {e}")
+            return False
+        return True
+
+    def next_variant(self) -> Optional[Icebreaker]:
+        """Variante successiva del gruppo corrente, o prima variante di un nuovo gruppo"""
+        if self.current is None:
+            if not self.unused:
+                print("[ICE] Nessun gruppo icebreaker disponibile.")
+                return None
+            i = self.rng.randrange(len(self.unused))
+            self.unused[i], self.unused[-1] = self.unused[-1], self.unused[i]
+            group = self.unused.pop()
+            self.used.add(group)
+            self.current = (group, 0)
+
+        group, index = self.current
+        variants = self.groups[group]
+        if index >= len(variants):
+            print(f"[ICE] Fine varianti per il gruppo {group}")
+            self.current = None
+            return None
+        self.current = (group, index + 1)
+        return variants[index]
+
+    def discard_current(self):
+        """Scarta l'intero gruppo corrente (es. dopo una risposta dell'utente)"""
+        if self.current:
+            print(f"[ICE] Gruppo icebreaker '{self.current[0]}' scartato dopo risposta utente.")
+            self.current = None
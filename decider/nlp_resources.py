@@ -0,0 +1,99 @@
+"""
+Risorse NLP della pipeline dei gesti (NLTK, WordNet, VADER, TextBlob), caricate al primo uso.
+
+Niente viene importato o scaricato all'import delle pipeline: il decider parte subito e
+può scaldare le risorse in un thread mentre aspetta gli altri moduli (start_warmup).
+I dati NLTK non vengono mai scaricati implicitamente: check_nltk_data() dice cosa manca,
+il download è un passo esplicito (su una macchina connessa, poi copiare la cartella nltk_data):
+    python nlp_resources.py download
+"""
+
+import sys
+import threading
+from functools import lru_cache
+from typing import Callable, List
+
+# Dati NLTK necessari: per ognuno i percorsi accettati (nomi di NLTK >= 3.9, poi quelli precedenti)
+NLTK_DATA = {
+    "punkt_tab": ["tokenizers/punkt_tab", "tokenizers/punkt"],
+    "averaged_perceptron_tagger_eng": ["taggers/averaged_perceptron_tagger_eng", "taggers/averaged_perceptron_tagger"],
+    "wordnet": ["corpora/wordnet"],
+}
+OLD_NLTK_NAMES = ["punkt", "averaged_perceptron_tagger"]
+
+
+def check_nltk_data() -> List[str]:
+    """Restituisce i dati NLTK mancanti, senza accesso alla rete"""
+    import nltk
+    missing = []
+    for name, paths in NLTK_DATA.items():
+        for path in paths:
+            try:
+                nltk.data.find(path)
+                break
+            except LookupError:
+                continue
+        else:
+            missing.append(name)
+    return missing
+
+
+def download_nltk_data():
+    import nltk
+    for name in list(NLTK_DATA) + OLD_NLTK_NAMES:
+        nltk.download(name, quiet=True)
+
+
+@lru_cache(maxsize=None)
+def get_analyzer():
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+
+@lru_cache(maxsize=None)
+def get_tagger():
+    # un solo tagger: nltk.pos_tag() ricarica il modello a ogni chiamata
+    from nltk.tag.perceptron import PerceptronTagger
+    return PerceptronTagger()
+
+
+@lru_cache(maxsize=None)
+def get_wordnet():
+    from nltk.corpus import wordnet
+    wordnet.ensure_loaded()
+    return wordnet
+
+
+def tag_words(text: str):
+    """Equivalente di pos_tag(word_tokenize(text))"""
+    from nltk import word_tokenize
+    return get_tagger().tag(word_tokenize(text))
+
+
+def text_blob(text: str):
+    from textblob import TextBlob
+    return TextBlob(text)
+
+
+def start_warmup(warmup: Callable[[], None]) -> threading.Thread:
+    """Esegue "warmup" (es. pipeline_debug.warmup) in un thread in background"""
+    def run():
+        try:
+            missing = check_nltk_data()
+            if missing:
+                print(f"[NLP] Dati NLTK mancanti: {', '.join(missing)} "
+                      f"(python nlp_resources.py download su una macchina connessa)")
+            warmup()
+        except (LookupError, ImportError) as e:
+            print(f"[NLP] Warmup della pipeline fallito: {e}")
+
+    thread = threading.Thread(target=run, name="nlp-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["download"]:
+        download_nltk_data()
+    missing = check_nltk_data()
+    print(f"Dati NLTK mancanti: {', '.join(missing)}" if missing else "Dati NLTK presenti")
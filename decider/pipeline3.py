@@ -6,18 +6,14 @@ from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 from functools import lru_cache
 
-import nltk
-from nltk.corpus import wordnet as wn
-from nltk import pos_tag, word_tokenize
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from bml_builder import BmlDocument, FaceLexeme, Gaze, Gesture, Head, Pointing, Posture, Speech
+from gesture_lexicon import load_lexicon, vader_compound
+# NLTK, WordNet e VADER sono caricati al primo uso (o da warmup())
+from nlp_resources import get_analyzer, get_wordnet, tag_words
 
-# Scaricare i dati richiesti (se non già fatti)
-nltk.download("punkt", quiet=True)
-nltk.download("averaged_perceptron_tagger", quiet=True)
-nltk.download("wordnet", quiet=True)
-
-# Sentiment analyzer globale
-analyzer = SentimentIntensityAnalyzer()
+# Lessico precompilato (gesture_lexicon.py): se presente, una ricerca per token
+# sostituisce pos_tag, WordNet e VADER
+LEXICON = load_lexicon()
 
 # Logger setup
 gen_logger = logging.getLogger("gesture_pipeline")
@@ -33,13 +29,16 @@ MODES = ["RIGHT_HAND", "LEFT_HAND"]
 @lru_cache(maxsize=5000)
 def get_semantic_tag(word: str) -> str:
     """Restituisce il lexname WordNet del termine, se disponibile."""
-    synsets = wn.synsets(word)
+    if LEXICON is not None:
+        entry = LEXICON.lookup(word)
+        return entry[1] if entry else ""
+    synsets = get_wordnet().synsets(word)
     return synsets[0].lexname().lower() if synsets else ""
 
 
 def get_emotion_context(word: str) -> List[str]:
     """Determina un'emozione in base alla polarità VADER del token."""
-    polarity = analyzer.polarity_scores(word)["compound"]
+    polarity = word_polarity(word)
     if polarity > 0.5:
         return ["HAPPINESS", "SMILE"]
     if polarity > 0.1:
@@ -51,18 +50,35 @@ def get_emotion_context(word: str) -> List[str]:
     return []
 
 
+def word_polarity(word: str) -> float:
+    """Compound VADER di un token"""
+    if LEXICON is not None:
+        entry = LEXICON.lookup(word)
+        return vader_compound(entry[2]) if entry else 0.0
+    return get_analyzer().polarity_scores(word)["compound"]
+
+
+def text_polarity(text: str) -> float:
+    """Compound VADER del testo (col lessico: somma delle valenze, senza le regole di negazione)"""
+    if LEXICON is not None:
+        return vader_compound(sum(valence for _, _, _, valence, _ in LEXICON.analyze(text)))
+    return get_analyzer().polarity_scores(text)["compound"]
+
+
 def find_gesture_candidates(text: str, max_gestures: int = 5) -> List[str]:
-    tokens = word_tokenize(text)
-    tagged = pos_tag(tokens)
+    if LEXICON is not None:
+        tagged = [(word, pos) for word, pos, _, _, _ in LEXICON.analyze(text)]
+    else:
+        tagged = tag_words(text)
     scores: Dict[str, int] = {}
 
-    word_count = len(tokens)
+    word_count = len(tagged)
     scaled_max = min(8, max_gestures + word_count // 10)
 
     for word, tag in tagged:
         token = word.lower().strip(".,!?")
         sem = get_semantic_tag(token)
-        pol = analyzer.polarity_scores(token)["compound"]
+        pol = word_polarity(token)
         score = 0
 
         # regole più aggressive per marcare candidati
@@ -166,26 +182,15 @@ def generate_gestures(words: List[str], last_idx: int) -> List[Dict[str, Any]]:
 
 def render_bml(xml_id: str, markers: List[str], gestures: List[Dict[str, Any]],
                last_idx: int, full_text: str) -> str:
-    polarity = analyzer.polarity_scores(full_text)["compound"]
-    lines: List[str] = [
-        '<?xml version="1.0" encoding="utf-8" ?>',
-        f'<bml xmlns="http://www.bml-initiative.org/bml/bml-1.0" '
-        f'xmlns:ext="http://www.bml-initiative.org/bml/coreextensions-1.0"',
-        f'  id="{xml_id}" characterId="Audrey" composition="APPEND">',
-    ]
-    posture_blocks = []
+    polarity = text_polarity(full_text)
+    doc = BmlDocument(xml_id, composition="APPEND", xml_declaration=True)
     if polarity < -0.1:
-        posture_blocks.append(
-            f'  <posture id="pos1" start="0" end="s1:tm{last_idx}+1">'
-            f'<stance type="armCrossed"/><target name="User" facing="FRONT"/></posture>')
+        doc.add(Posture(stance="armCrossed", end=f"s1:tm{last_idx}+1"))
     else:
         posture_variants = ["akimboLeft", "akimboRight", "akimbo"]
         random.shuffle(posture_variants)
         random_length = random.randint(2, 4)
-        lex = posture_variants[0]
-        posture_blocks.append(
-            f'  <posture id="pos1" start="0" end="start+{random_length}">'
-            f'<stance type="{lex}"/><target name="User" facing="FRONT"/></posture>')
+        doc.add(Posture(stance=posture_variants[0], end=f"start+{random_length}"))
         if len(full_text) >= 300:
             n_additional = 1 if len(full_text) < 500 else 2
             step = max(1, last_idx // (n_additional + 1))
@@ -193,49 +198,31 @@ def render_bml(xml_id: str, markers: List[str], gestures: List[Dict[str, Any]],
                 start_tm = f"s1:tm{min((i + 1) * step, last_idx)}"
                 random_length = random.randint(2, 4)
                 lex = posture_variants[(i + 1) % len(posture_variants)]
-                posture_blocks.append(
-                    f'  <posture id="pos{i+2}" start="{start_tm}" end="start+{random_length}">'
-                    f'<stance type="{lex}"/><target name="User" facing="FRONT"/></posture>')
-    lines += posture_blocks
-    lines.append(f'  <gaze id="g0" start="0" end="s1:tm{last_idx}+1" target="Camera"/>')
-    counts = {"face": 0, "head": 0, "gesture": 0, "pointing": 0}
+                doc.add(Posture(stance=lex, start=start_tm, end=f"start+{random_length}"))
+    doc.add(Gaze("Camera", end=f"s1:tm{last_idx}+1"))
     for g in gestures:
         gtype = g["type"]
-        counts[gtype] += 1
-        gid = f"{gtype[0]}{counts[gtype]}"
-
         if gtype == "face":
-            lines.append(
-                f'  <faceLexeme id="{gid}" lexeme="{g["lexeme"]}" amount="1" '
-                f'start="{g["start"]}" end="{g["end"]}"/>')
+            doc.add(FaceLexeme(g["lexeme"], start=g["start"], end=g["end"]))
         elif gtype == "gesture":
-            lines.append(
-                f'  <gesture id="{gid}" lexeme="{g["lexeme"]}" '
-                f'mode="{g.get("mode", "RIGHT_HAND")}" amount="1" '
-                f'start="{g["start"]}" end="{g["end"]}"/>')
+            doc.add(Gesture(g["lexeme"], mode=g.get("mode", "RIGHT_HAND"), start=g["start"], end=g["end"]))
         elif gtype == "pointing":
-            lines.append(
-                f'  <pointing id="{gid}" target="{g.get("target", "plate")}" '
-                f'start="{g["start"]}" end="{g["end"]}"/>')
+            doc.add(Pointing(g.get("target", "plate"), start=g["start"], end=g["end"]))
         elif gtype == "head":
-            lines.append(
-                f'  <head id="{gid}" lexeme="{g["lexeme"]}" '
-                f'start="{g["start"]}" end="{g["end"]}" repetition="1"/>')
-
-    lines += [
-        '  <speech id="s1" start="0">',
-        '    <description priority="2" type="application/ssml+xml">',
-        '      <speak>',
-        f'        {" ".join(markers)}',
-        '      </speak>',
-        '    </description>',
-        '  </speech>',
-        '</bml>',
-    ]
-    return "\n".join(lines)
+            doc.add(Head(g["lexeme"], start=g["start"], end=g["end"], repetition="1"))
+
+    # primo parlato del documento: id "s1", a cui si riferiscono i marker
+    doc.add(Speech(" ".join(markers), priority=2))
+    return doc.to_xml()
+
+
+def warmup():
+    """Carica le risorse NLP usate da pipeline() (inutile con il lessico precompilato)"""
+    if LEXICON is None:
+        pipeline("Warm up the gesture pipeline, thank you.")
 
 
-def pipeline(text: str, max_gestures: int = 5) -> str:
+def pipeline(text: str, max_gestures: int = 5, bml_id: str = "bml1") -> str:
     candidates = find_gesture_candidates(text, max_gestures)
     gen_logger.info(f"Gesture candidates: {candidates}")
     marked_text = emphasize_words(text, candidates)
@@ -244,7 +231,7 @@ def pipeline(text: str, max_gestures: int = 5) -> str:
     words_to_gesture = [word.strip(".,!?").lower()
                         for word, marked in parsed if marked]
     gestures = generate_gestures(words_to_gesture, last_idx)
-    bml = render_bml("bml1", markers, gestures, last_idx, text)
+    bml = render_bml(bml_id, markers, gestures, last_idx, text)
     return bml
 
 
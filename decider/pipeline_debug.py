@@ -5,8 +5,10 @@ import re
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
-from nltk.corpus import wordnet as wn
-from textblob import TextBlob
+from bml_builder import BmlDocument, FaceLexeme, Gaze, Gesture, Head, Pointing, Posture, Speech
+from gesture_lexicon import load_lexicon
+# WordNet e TextBlob sono caricati al primo uso (o da warmup())
+from nlp_resources import get_wordnet, text_blob
 
 # Logger setup
 gen_logger = logging.getLogger("gesture_pipeline")
@@ -17,12 +19,32 @@ HEAD_LIST = ["nod", "shake", "up", "down", "tilt_left", "tilt_right", "left", "r
 GESTURE_LIST = ["hello", "handDown", "handUp", "me", "you"]
 MODES = ["RIGHT_HAND", "LEFT_HAND"]
 
+# Lessico precompilato (gesture_lexicon.py): se presente, una ricerca per token
+# sostituisce TextBlob e WordNet
+LEXICON = load_lexicon()
+
 def get_semantic_tag(word: str) -> str:
-    synsets = wn.synsets(word)
+    if LEXICON is not None:
+        entry = LEXICON.lookup(word)
+        return entry[1] if entry else ""
+    synsets = get_wordnet().synsets(word)
     return synsets[0].lexname().lower() if synsets else ""
 
+def word_polarity(word: str) -> float:
+    if LEXICON is not None:
+        entry = LEXICON.lookup(word)
+        return entry[3] if entry else 0.0
+    return text_blob(word).sentiment.polarity
+
+def text_polarity(text: str) -> float:
+    # col lessico: media delle polarità delle parole che ne hanno una, come TextBlob senza modificatori
+    if LEXICON is not None:
+        polarities = [p for _, _, _, _, p in LEXICON.analyze(text) if p]
+        return sum(polarities) / len(polarities) if polarities else 0.0
+    return text_blob(text).sentiment.polarity
+
 def get_emotion_context(word: str) -> List[str]:
-    polarity = TextBlob(word).sentiment.polarity
+    polarity = word_polarity(word)
     if polarity > 0.5: return ["HAPPINESS", "SMILE"]
     if polarity > 0.1: return ["SMILE"]
     if polarity < -0.5: return ["ANGER", "DISGUST"]
@@ -30,10 +52,12 @@ def get_emotion_context(word: str) -> List[str]:
     return []
 
 def find_gesture_candidates(text: str, max_gestures: int = 5) -> List[str]:
-    blob = TextBlob(text)
     scores: Dict[str, int] = {}
 
-    tokens = list(blob.tags)
+    if LEXICON is not None:
+        tokens = [(word, pos) for word, pos, _, _, _ in LEXICON.analyze(text) if word[0].isalnum()]
+    else:
+        tokens = list(text_blob(text).tags)
     word_count = len(tokens)
 
     # Scala dinamica più contenuta: +1 ogni 15 parole
@@ -43,7 +67,7 @@ def find_gesture_candidates(text: str, max_gestures: int = 5) -> List[str]:
     for word, tag in tokens:
         token = word.lower().strip(".,!?'" )
         sem = get_semantic_tag(token)
-        polarity = TextBlob(token).sentiment.polarity
+        polarity = word_polarity(token)
         score = 0
 
         # print(f"[TOK] '{token}' POS={tag}, Pol={polarity:.2f}, Sem='{sem}'")
@@ -140,21 +164,15 @@ def generate_gestures(words: List[str], last_idx: int) -> List[Dict[str, Any]]:
     return entries
 
 def render_bml(xml_id: str, markers: List[str], gestures: List[Dict[str, Any]], last_idx: int, full_text: str) -> str:
-    polarity = TextBlob(full_text).sentiment.polarity
-    lines: List[str] = [
-        '<?xml version="1.0" encoding="utf-8" ?>',
-        f'<bml xmlns="http://www.bml-initiative.org/bml/bml-1.0" xmlns:ext="http://www.bml-initiative.org/bml/coreextensions-1.0"',
-        f'  id="{xml_id}" characterId="Audrey" composition="APPEND">',
-    ]
-    posture_blocks = []
+    polarity = text_polarity(full_text)
+    doc = BmlDocument(xml_id, composition="APPEND", xml_declaration=True)
     if polarity < -0.1:
-        posture_blocks.append(f'  <posture id="pos1" start="0" end="s1:tm{last_idx}+1"><stance type="armCrossed"/><target name="User" facing="FRONT"/></posture>')
+        doc.add(Posture(stance="armCrossed", end=f"s1:tm{last_idx}+1"))
     else:
         posture_variants = ["akimboLeft", "akimboRight", "akimbo"]
         random.shuffle(posture_variants)
         random_length = random.randint(2, 4)
-        lex = posture_variants[0]
-        posture_blocks.append(f'  <posture id="pos1" start="0" end="start+{random_length}"><stance type="{lex}"/><target name="User" facing="FRONT"/></posture>')
+        doc.add(Posture(stance=posture_variants[0], end=f"start+{random_length}"))
         if len(full_text) >= 300:
             n_additional = 1 if len(full_text) < 500 else 2
             step = max(1, last_idx // (n_additional + 1))
@@ -162,37 +180,29 @@ def render_bml(xml_id: str, markers: List[str], gestures: List[Dict[str, Any]],
                 start_tm = f"s1:tm{min((i + 1) * step, last_idx)}"
                 random_length = random.randint(2, 4)
                 lex = posture_variants[(i + 1) % len(posture_variants)]
-                posture_blocks.append(f'  <posture id="pos{i+2}" start="{start_tm}" end="start+{random_length}"><stance type="{lex}"/><target name="User" facing="FRONT"/></posture>')
-    lines += posture_blocks
-    lines.append(f'  <gaze id="g0" start="0" end="s1:tm{last_idx}+1" target="Camera"/>')
-    counts = {"face": 0, "head": 0, "gesture": 0, "pointing": 0}
+                doc.add(Posture(stance=lex, start=start_tm, end=f"start+{random_length}"))
+    doc.add(Gaze("Camera", end=f"s1:tm{last_idx}+1"))
     for g in gestures:
         gtype = g["type"]
-        counts[gtype] += 1
-        gid = f"{gtype[0]}{counts[gtype]}"
-        
         if gtype == "face":
-            lines.append(f'  <faceLexeme id="{gid}" lexeme="{g["lexeme"]}" amount="1" start="{g["start"]}" end="{g["end"]}"/>')
+            doc.add(FaceLexeme(g["lexeme"], start=g["start"], end=g["end"]))
         elif gtype == "gesture":
-            lines.append(f'  <gesture id="{gid}" lexeme="{g["lexeme"]}" mode="{g.get("mode", "RIGHT_HAND")}" amount="1" start="{g["start"]}" end="{g["end"]}"/>')
+            doc.add(Gesture(g["lexeme"], mode=g.get("mode", "RIGHT_HAND"), start=g["start"], end=g["end"]))
         elif gtype == "pointing":
-            lines.append(f'  <pointing id="{gid}" target="{g.get("target", "plate")}" start="{g["start"]}" end="{g["end"]}"/>')
+            doc.add(Pointing(g.get("target", "plate"), start=g["start"], end=g["end"]))
         elif gtype == "head":
-            lines.append(f'  <head id="{gid}" lexeme="{g["lexeme"]}" start="{g["start"]}" end="{g["end"]}" repetition="1"/>')
-
-    lines += [
-        '  <speech id="s1" start="0">',
-        '    <description priority="2" type="application/ssml+xml">',
-        '      <speak>',
-        f'        {" ".join(markers)}',
-        '      </speak>',
-        '    </description>',
-        '  </speech>',
-        '</bml>',
-    ]
-    return "\n".join(lines)
+            doc.add(Head(g["lexeme"], start=g["start"], end=g["end"], repetition="1"))
+
+    # primo parlato del documento: id "s1", a cui si riferiscono i marker
+    doc.add(Speech(" ".join(markers), priority=2))
+    return doc.to_xml()
+
+def warmup():
+    """Carica le risorse NLP usate da pipeline() (inutile con il lessico precompilato)"""
+    if LEXICON is None:
+        pipeline("Warm up the gesture pipeline, thank you.")
 
-def pipeline(text: str, max_gestures: int = 5) -> str:
+def pipeline(text: str, max_gestures: int = 5, bml_id: str = "bml1") -> str:
     candidates = find_gesture_candidates(text, max_gestures)
     #print(f"[CANDIDATES] {candidates}")
     gen_logger.info(f"Gesture candidates: {candidates}")
@@ -203,7 +213,7 @@ def pipeline(text: str, max_gestures: int = 5) -> str:
     words_to_gesture = [word.strip(".,!?").lower() for word, marked in parsed if marked]
     #print(f"[GESTURE TOKENS] {words_to_gesture}")
     gestures = generate_gestures(words_to_gesture, last_idx)
-    bml = render_bml("bml1", markers, gestures, last_idx, text)
+    bml = render_bml(bml_id, markers, gestures, last_idx, text)
     #print(f"[BML LEN] {len(bml)} chars, {len(gestures)} gestures\n")
     return bml
 
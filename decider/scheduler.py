@@ -0,0 +1,65 @@
+"""
+Scadenze del decider (icebreaker, gaze shift, avvio, addio) su un heap.
+
+Ogni timer ha un nome: riprogrammarlo sostituisce la scadenza precedente, cancel() lo toglie
+(le voci superate restano nell'heap e vengono scartate quando arrivano in cima).
+Il loop dorme fino al primo messaggio o alla prima scadenza:
+    received_messages = udp_client.wait_for_messages(timeout=scheduler.timeout())
+    ...
+    scheduler.run_due()
+"""
+
+import heapq
+import itertools
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class DeadlineScheduler:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.heap: List[Tuple[float, int, str, Callable[[], None]]] = []
+        self.active: Dict[str, Tuple[float, int]] = dict()  # nome -> (scadenza, numero della voce valida)
+        self.sequence = itertools.count()
+
+    def schedule_at(self, name: str, deadline: float, callback: Callable[[], None]):
+        seq = next(self.sequence)
+        self.active[name] = (deadline, seq)
+        heapq.heappush(self.heap, (deadline, seq, name, callback))
+
+    def schedule(self, name: str, delay: float, callback: Callable[[], None]):
+        self.schedule_at(name, self.clock() + delay, callback)
+
+    def cancel(self, name: str):
+        self.active.pop(name, None)
+
+    def deadline(self, name: str) -> Optional[float]:
+        entry = self.active.get(name)
+        return entry[0] if entry else None
+
+    def _discard_stale(self):
+        heap = self.heap
+        while heap and self.active.get(heap[0][2], (None, None))[1] != heap[0][1]:
+            heapq.heappop(heap)
+
+    def timeout(self) -> Optional[float]:
+        """Secondi fino alla prossima scadenza (0 se già passata), None se non ci sono timer"""
+        self._discard_stale()
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - self.clock())
+
+    def run_due(self) -> int:
+        """Esegue i timer scaduti in ordine di scadenza, restituisce quanti ne ha eseguiti.
+        Un callback può riprogrammare il proprio timer (o altri).
+        """
+        count = 0
+        now = self.clock()
+        while True:
+            self._discard_stale()
+            if not self.heap or self.heap[0][0] > now:
+                return count
+            _, _, name, callback = heapq.heappop(self.heap)
+            del self.active[name]
+            callback()
+            count += 1
@@ -8,7 +8,7 @@ Created on Wed May 15 12:09:23 2024
 import os
 import sys
 import json
-import time
+import logging
 from groq import Groq
 
 MODULE_FULL_NAME = 'LARGE_LANGUAGE_MODEL/LLAMA3_ONLINE_GROQ'
@@ -28,6 +28,12 @@ def get_modules_folder_dir():
 modules_folder_dir = get_modules_folder_dir()
 sys.path.append(modules_folder_dir)
 from UDPClient import UDPClient
+from Tracing import LatencyTracer
+from large_language_model.llm_protocol import QueryHandler
+from large_language_model.response_cache import ResponseCache
+
+# [INFO]/[ERROR] of the query handler on the console, llm_query/llm_response with level=logging.DEBUG
+logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
 
 ### To have the whiteboard ip ###
 ip_witeboard_file = os.path.join(modules_folder_dir, 'IP_whiteboard.txt')
@@ -52,10 +58,11 @@ with open(config_file_path, 'r') as config_file:
 # Setup UDP_Client
 udp_client = UDPClient(ip_whiteboard)
 subscribes = ['LLM_QUERY', 'COMMON']
-results_topic = 'LLM_RESPONSE'
 
 for subscribe in subscribes:
     udp_client.send(f'Subscribe:{subscribe}')
+
+tracer = LatencyTracer(udp_client, MODULE_FULL_NAME)
     
     
 # Setup llm
@@ -64,6 +71,35 @@ groq_client = Groq(
     api_key=os.environ.get("GROQ_API_KEY"),
 )
 
+
+def complete(messages, stream, timeout):
+    """Completion function of the QueryHandler"""
+    chat_completion = groq_client.chat.completions.create(
+        messages=messages,
+        model=llm_model,
+        stream=stream,
+        timeout=timeout
+    )
+    if stream:
+        return (chunk.choices[0].delta.content for chunk in chat_completion)
+    return chat_completion.choices[0].message.content
+
+
+# Queries answered in a pool of workers ("workers"), with the context of the conversations
+# by session ("max_history") and a maximum duration ("request_timeout", s).
+# Streaming ("stream"): each sentence is sent on LLM_RESPONSE_SENTENCE as soon as it is complete
+# Cache of the responses, off by default: e.g. "cache": {"path": "response_cache.sqlite"} in config.json
+cache_config = config.get('cache')
+response_cache = ResponseCache(**cache_config) if cache_config is not None else None
+
+query_handler = QueryHandler(udp_client, tracer, complete,
+                             stream=config.get('stream', True),
+                             workers=config.get('workers', 2),
+                             timeout=config.get('request_timeout', 15),
+                             max_history=config.get('max_history', 15),
+                             cache=response_cache, model=llm_model)
+
+
 # make sure the API works
 test_prompt = [{'role': 'system','content': 'réponds oui'}, {'role': 'user','content': 'oui'}]
 chat_completion = groq_client.chat.completions.create(
@@ -76,7 +112,7 @@ print("Ready to receive queries")
 
 # Main loop
 while True:
-    received_messages = udp_client.get_received_messages()  
+    received_messages = udp_client.wait_for_messages()
     if 'COMMON' in received_messages:
         message = received_messages['COMMON']
         if 'REQUEST_MODULE_DEACTIVATION' in message:
@@ -85,30 +121,17 @@ while True:
                 break #the main loop is exited and the module is closed
     
     if 'LLM_QUERY' in received_messages:
-        llm_query = received_messages['LLM_QUERY']
-        print(f'{llm_query=}')
-        llm_query = json.loads(llm_query)
-        
-        t0 = time.time()
-        chat_completion = groq_client.chat.completions.create(
-            messages=llm_query,
-            model=llm_model
-        )
-        llm_response = chat_completion.choices[0].message.content
-        print(f'{llm_response=}')
-        print(f"Response latency : {time.time()-t0}")
-        
-        udp_client.send(f'{results_topic}:{llm_response}')
+        query_handler.handle_query(received_messages['LLM_QUERY'])
 
     if (message := received_messages.get("COMMON")):
         if "BROADCAST_REQUEST_SHUTDOWN" in message:
             print("[INFO] Ricevuto broadcast di chiusura. Uscita...")
+            query_handler.stop()
             udp_client.send(f"COMMON:MODULE_SUCCESSFULLY_DEACTIVATED:{MODULE_FULL_NAME}")
             udp_client.close()
             exit()
     
-    time.sleep(0.01)
-    
+query_handler.stop()
 udp_client.send(f'COMMON:MODULE_SUCCESSFULLY_DEACTIVATED:{MODULE_FULL_NAME}')
 udp_client.close()  
     
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers of the large language model modules (LLM_QUERY / LLM_RESPONSE contract).
+
+The modules import it with the modules folder in sys.path:
+    from large_language_model.llm_protocol import SentenceSplitter
+
+LLM_QUERY accepts two payloads:
+  - a JSON list of messages (legacy): answered as is, nothing is kept
+  - a JSON session operation: the LLM module keeps the system prompt and the
+    history of the session, so the decider only sends what is new
+        {"session": "a1b2c3d4", "op": "init", "system": "...", "history": [...], "respond": false}
+        {"session": "a1b2c3d4", "op": "user", "content": "..."}        -> answered on LLM_RESPONSE
+        {"session": "a1b2c3d4", "op": "assistant", "content": "..."}   -> e.g. an icebreaker
+        {"session": "a1b2c3d4", "op": "trim", "keep": 6, "summary": "..."}
+    The response of the LLM is added to the session history by the LLM module.
+    "init" may give "max_history": null when the decider bounds the history itself:
+    "keep" (only the last messages are kept) and "summary" (sent after the system prompt)
+    can then be added to any operation, they apply after it.
+    When the session is unknown (e.g. the LLM module was restarted) the module answers
+        LLM_SESSION_STATUS:{"session": "a1b2c3d4", "status": "unknown", "op": "user"}
+    and the decider sends "init" again with its whole history.
+
+QueryHandler answers the queries for a module, which only provides the completion
+function of its model (see large_language_model/llama3_online_groq/module_process.py).
+"""
+
+import re
+import json
+import time
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from Tracing import split_trace, attach_trace
+
+SENTENCE_TOPIC = 'LLM_RESPONSE_SENTENCE'
+SESSION_STATUS_TOPIC = 'LLM_SESSION_STATUS'
+RESPONSE_TOPIC = 'LLM_RESPONSE'
+DEFAULT_MAX_HISTORY = 15  # messages of the history sent to the LLM with the system prompt
+
+logger = logging.getLogger("llm_protocol")
+
+# End of a sentence: punctuation (and closing quotes/brackets) followed by a space
+SENTENCE_END = re.compile(r'[.!?…]+["\')\]»]*\s+')
+
+
+class SentenceSplitter:
+    """Cuts the text streamed by the LLM into complete sentences.
+    Sentences shorter than "min_length" are merged with the following one,
+    so that Audrey doesn't receive a BML for a lone "Oh!".
+    """
+    def __init__(self, min_length=20):
+        self.min_length = min_length
+        self.buffer = ""
+
+    def feed(self, text):
+        """Adds streamed text, returns the sentences completed by it"""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_length:
+                sentences.append(candidate)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Returns the remaining text at the end of the stream"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+
+def sentence_message(index, text):
+    """Content of a LLM_RESPONSE_SENTENCE message"""
+    return json.dumps({"index": index, "text": text})
+
+
+def session_message(session_id, op, **fields):
+    """Content of a LLM_QUERY session operation"""
+    return json.dumps({"session": session_id, "op": op, **fields})
+
+
+def parse_query(content):
+    """Returns the content of a LLM_QUERY as a session operation,
+    a legacy list of messages becomes {"op": "messages", "messages": [...]}
+    """
+    query = json.loads(content)
+    if isinstance(query, list):
+        return {"op": "messages", "messages": query}
+    return query
+
+
+class SessionStore:
+    """Context of the conversations kept by a LLM module, by session id.
+    The least recently used sessions are forgotten beyond "max_sessions".
+    """
+    def __init__(self, max_history=DEFAULT_MAX_HISTORY, max_sessions=8):
+        self.max_history = max_history
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()  # session id -> {"system", "summary", "history", "max_history"}
+
+    def __contains__(self, session_id):
+        return session_id in self.sessions
+
+    def init(self, session_id, system, history=(), max_history=-1, summary=""):
+        """max_history: -1 for the default of the store, None for no limit"""
+        if max_history == -1:
+            max_history = self.max_history
+        history = list(history)
+        self.sessions[session_id] = {
+            "system": {"role": "system", "content": system},
+            "summary": None,
+            "history": history[-max_history:] if max_history else history,
+            "max_history": max_history,
+        }
+        self.set_summary(session_id, summary)
+        self.sessions.move_to_end(session_id)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+
+    def append(self, session_id, role, content):
+        session = self.sessions[session_id]
+        session["history"].append({"role": role, "content": content})
+        if session["max_history"]:
+            del session["history"][:-session["max_history"]]
+        self.sessions.move_to_end(session_id)
+
+    def trim(self, session_id, keep):
+        """Keeps the last "keep" messages of the history"""
+        history = self.sessions[session_id]["history"]
+        del history[:max(0, len(history) - keep)]
+
+    def set_summary(self, session_id, summary):
+        self.sessions[session_id]["summary"] = {"role": "system", "content": summary} if summary else None
+
+    def messages(self, session_id):
+        """Messages to send to the LLM for the next response of the session"""
+        session = self.sessions[session_id]
+        summary = [session["summary"]] if session["summary"] else []
+        return [session["system"]] + summary + session["history"]
+
+    def apply(self, query):
+        """Applies a session operation (see parse_query), returns the messages
+        to send to the LLM if the operation asks for a response, otherwise None.
+        Raises KeyError if the session is unknown.
+        """
+        op = query["op"]
+        if op == "messages":
+            return query["messages"]
+        session_id = query["session"]
+        if op == "init":
+            self.init(session_id, query["system"], query.get("history", ()),
+                      query.get("max_history", -1), query.get("summary", ""))
+            history = self.sessions[session_id]["history"]
+            respond = query.get("respond") and history and history[-1]["role"] == "user"
+        elif session_id not in self.sessions:
+            raise KeyError(session_id)
+        elif op in ("user", "assistant"):
+            self.append(session_id, op, query["content"])
+            respond = op == "user"
+        elif op == "trim":
+            respond = False
+        else:
+            raise ValueError(f"unknown LLM_QUERY operation: {op}")
+
+        if "keep" in query:
+            self.trim(session_id, query["keep"])
+        if "summary" in query:
+            self.set_summary(session_id, query["summary"])
+        return self.messages(session_id) if respond else None
+
+
+class QueryHandler:
+    """Answers the LLM_QUERY messages of a LLM module.
+
+    complete(messages, stream, timeout) calls the model: it returns the response, or an
+    iterable of text deltas when "stream" is True (each complete sentence is then sent on
+    SENTENCE_TOPIC as soon as possible).
+    The queries are answered by a pool of workers so that the main loop of the module
+    stays responsive. A newer query of a session supersedes the one in flight: none of
+    its following sentences nor its response are sent, and the session doesn't keep it.
+    A query is abandoned after "timeout" seconds.
+    With a "cache" (response_cache.ResponseCache), the complete responses are cached by
+    "model" name and prompt, and a cached response is sent without calling the model.
+    """
+    def __init__(self, udp_client, tracer, complete, stream=True, workers=2,
+                 timeout=15, max_history=DEFAULT_MAX_HISTORY, cache=None, model=""):
+        self.udp_client = udp_client
+        self.tracer = tracer
+        self.complete = complete
+        self.stream = stream
+        self.timeout = timeout
+        self.cache = cache
+        self.model = model
+        self.sessions = SessionStore(max_history=max_history)
+        self.sessions_lock = threading.Lock()  # the workers add the responses to the sessions
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.request_ids = itertools.count(1)
+        self.in_flight = dict()  # session id (None for the legacy queries) -> (request id, future)
+        self.in_flight_lock = threading.RLock()  # held while a response of the session is published
+        self.stopped = False
+
+    def handle_query(self, content):
+        """Content of a LLM_QUERY message, called by the main loop of the module"""
+        trace_id, content = split_trace(content)
+        self.tracer.stage(trace_id, "llm_query_received")
+        logger.debug(f'llm_query={content!r}')
+        query = parse_query(content)
+        # a response being published is sent before this query is applied, otherwise
+        # it is superseded by it (nothing more of it is sent nor added to the session)
+        with self.in_flight_lock:
+            try:
+                with self.sessions_lock:
+                    messages = self.sessions.apply(query)
+            except KeyError:
+                # unknown session, e.g. this module was restarted: the decider sends the context again
+                self.udp_client.send(f'{SESSION_STATUS_TOPIC}:' + json.dumps(
+                    {"session": query["session"], "status": "unknown", "op": query["op"]}))
+                return
+            if messages is not None:  # otherwise operation without response
+                self.submit(query.get("session"), messages, trace_id)
+
+    def submit(self, session_id, messages, trace_id):
+        with self.in_flight_lock:
+            previous = self.in_flight.get(session_id)
+            if previous is not None and previous[1].cancel():
+                logger.info(f"Query {previous[0]} superseded before being sent")
+            request_id = next(self.request_ids)
+            future = self.executor.submit(self.answer, session_id, request_id, messages, trace_id)
+            self.in_flight[session_id] = (request_id, future)
+
+    def is_current(self, session_id, request_id):
+        with self.in_flight_lock:
+            current = self.in_flight.get(session_id)
+            return not self.stopped and current is not None and current[0] == request_id
+
+    def answer(self, session_id, request_id, messages, trace_id):
+        t0 = time.time()
+        deadline = t0 + self.timeout
+
+        def still_current():
+            return self.is_current(session_id, request_id) and time.time() < deadline
+
+        cache_key = self.cache.key(self.model, messages) if self.cache is not None else None
+        cached_response = self.cache.get(cache_key) if cache_key else None
+        if cached_response is not None:
+            response = cached_response
+            if self.stream:
+                splitter = SentenceSplitter()
+                for index, sentence in enumerate(splitter.feed(response + " ") + splitter.flush()):
+                    if not self.send_sentence(session_id, request_id, index, sentence, trace_id):
+                        break
+        elif self.stream:
+            response, complete = self.stream_sentences(session_id, request_id, messages, trace_id,
+                                                       still_current)
+            if complete and cache_key:
+                self.cache.put(cache_key, response)
+        else:
+            try:
+                response = self.complete(messages, False, self.timeout)
+                if cache_key and response:
+                    self.cache.put(cache_key, response)
+                if time.time() >= deadline:
+                    response = ""
+            except Exception as e:
+                logger.error(f"Query {request_id} failed: {e!r}")
+                response = ""
+
+        # the latency of the turn is measured by the tracer (llm_query_received -> llm_response_sent)
+        logger.debug(f'llm_response={response!r} in {time.time()-t0:.3f} s'
+                     + (" (cache)" if cached_response is not None else ""))
+        with self.in_flight_lock:
+            if not self.is_current(session_id, request_id):
+                # a newer query of the session is answered: the decider must not receive this
+                # response after its sentences, and the session must not keep it
+                logger.info(f"Query {request_id} superseded, no response sent")
+                return
+            del self.in_flight[session_id]
+            if not response:
+                logger.info(f"Query {request_id} timed out, no response sent")
+                return
+            # a timed out or failed stream still publishes the sentences already sent
+            with self.sessions_lock:
+                if session_id in self.sessions:
+                    self.sessions.append(session_id, "assistant", response)
+            self.udp_client.send(f'{RESPONSE_TOPIC}:{attach_trace(response, trace_id)}')
+        self.tracer.stage(trace_id, "llm_response_sent")
+
+    def stream_sentences(self, session_id, request_id, messages, trace_id, still_current):
+        """Streams the response and sends every complete sentence.
+        Returns (response, True) with the full response, or only the sentences already
+        sent (what Audrey will say) and False if the query was superseded, timed out
+        or failed in the meantime
+        """
+        splitter = SentenceSplitter()
+        sent = []
+        try:
+            for delta in self.complete(messages, True, self.timeout):
+                if not still_current():
+                    return " ".join(sent), False
+                if delta:
+                    for sentence in splitter.feed(delta):
+                        if not self.send_sentence(session_id, request_id, len(sent), sentence, trace_id):
+                            return " ".join(sent), False
+                        sent.append(sentence)
+        except Exception as e:
+            logger.error(f"LLM stream interrupted: {e!r}")
+            return " ".join(sent), False
+        if not still_current():
+            return " ".join(sent), False
+        for sentence in splitter.flush():
+            if not self.send_sentence(session_id, request_id, len(sent), sentence, trace_id):
+                return " ".join(sent), False
+            sent.append(sentence)
+        return " ".join(sent), True
+
+    def send_sentence(self, session_id, request_id, index, sentence, trace_id):
+        """Sends a sentence of the response, unless the query was superseded (returns False)"""
+        with self.in_flight_lock:
+            if not self.is_current(session_id, request_id):
+                return False
+            self.udp_client.send(f'{SENTENCE_TOPIC}:{attach_trace(sentence_message(index, sentence), trace_id)}')
+        if index == 0:
+            self.tracer.stage(trace_id, "llm_first_sentence")
+        return True
+
+    def stop(self):
+        self.stopped = True  # the streams in progress stop at their next delta
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.cache is not None:
+            logger.info(f"Response cache: {self.cache.stats()}")
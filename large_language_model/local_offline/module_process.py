@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Offline large language model module, same LLM_QUERY / LLM_RESPONSE contract as
+llama3_online_groq but without network access:
+  - "scripted" backend: deterministic answers chosen by patterns, with configurable
+    latency distributions, to load-test the decider and the gesture pipeline
+  - "llama_cpp" backend: local CPU model (GGUF file) with llama-cpp-python
+"""
+
+import os
+import re
+import sys
+import json
+import logging
+import time
+import zlib
+import random
+import threading
+
+MODULE_FULL_NAME = 'LARGE_LANGUAGE_MODEL/LOCAL_OFFLINE'
+
+### To import UDPCLient ###
+def get_modules_folder_dir():
+    current_dir = os.path.abspath(os.path.dirname(__file__))
+
+    while not os.path.exists(os.path.join(current_dir, 'Modules')):
+        current_dir = os.path.abspath(os.path.join(current_dir, os.pardir))
+        if current_dir == os.path.abspath(os.sep):
+            print("Le dossier 'Modules' n'a pas été trouvé.")
+            sys.exit(1)
+
+    return os.path.join(current_dir, 'Modules')
+
+modules_folder_dir = get_modules_folder_dir()
+sys.path.append(modules_folder_dir)
+from UDPClient import UDPClient
+from Tracing import LatencyTracer
+from large_language_model.llm_protocol import QueryHandler
+from large_language_model.response_cache import ResponseCache
+
+# [INFO]/[ERROR] of the query handler on the console, llm_query/llm_response with level=logging.DEBUG
+logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+
+### To have the whiteboard ip ###
+ip_witeboard_file = os.path.join(modules_folder_dir, 'IP_whiteboard.txt')
+with open(ip_witeboard_file, 'r') as txt_file:
+    ip_whiteboard = txt_file.read()
+
+
+# Config file
+config_file_path = 'config.json'
+default_config = {
+    "backend": "scripted",
+    "stream": True,
+    "seed": 0,
+    "first_token_latency": {"distribution": "lognormal", "median": 0.3, "sigma": 0.4},
+    "tokens_per_second": 300,
+    "responses": [],
+    "fallback": ["That's interesting, tell me more."],
+    "llama_cpp": {"model_path": "", "n_ctx": 4096, "n_threads": 4, "max_tokens": 200},
+    "cache": None
+}
+
+if not os.path.exists(config_file_path):
+    # Creation of the default configuration file
+    with open(config_file_path, 'w') as config_file:
+        json.dump(default_config, config_file, indent=4)
+
+# Reading of the current configuration
+with open(config_file_path, 'r') as config_file:
+    config = {**default_config, **json.load(config_file)}
+
+
+def make_latency_sampler(spec, rng):
+    """Returns a function giving a latency (s) drawn from the distribution "spec":
+        {"distribution": "constant", "value": 0.3}
+        {"distribution": "uniform", "min": 0.2, "max": 0.6}
+        {"distribution": "normal", "mean": 0.4, "std": 0.1}
+        {"distribution": "lognormal", "median": 0.3, "sigma": 0.4}
+        {"distribution": "empirical", "values": [0.21, 0.35, 0.32, 1.2]}
+    """
+    distribution = spec.get("distribution", "constant")
+    lock = threading.Lock()  # the workers share the generator, the draws stay reproducible
+
+    def draw():
+        if distribution == "constant":
+            return spec.get("value", 0.0)
+        if distribution == "uniform":
+            return rng.uniform(spec["min"], spec["max"])
+        if distribution == "normal":
+            return rng.gauss(spec["mean"], spec["std"])
+        if distribution == "lognormal":
+            return spec["median"] * rng.lognormvariate(0, spec["sigma"])
+        if distribution == "empirical":
+            return rng.choice(spec["values"])
+        raise ValueError(f"unknown latency distribution: {distribution}")
+
+    def sample():
+        with lock:
+            return max(0.0, draw())
+    return sample
+
+
+class ScriptedResponder:
+    """Deterministic answers: the first rule whose pattern matches the last user
+    message gives the answer, otherwise a fallback answer. Among several answers,
+    the choice only depends on the user message.
+    """
+    def __init__(self, config):
+        self.rules = [(re.compile(rule["pattern"], re.IGNORECASE), rule["responses"])
+                      for rule in config["responses"]]
+        self.fallback = config["fallback"]
+        rng = random.Random(config["seed"])
+        self.first_token_latency = make_latency_sampler(config["first_token_latency"], rng)
+        self.token_interval = 1 / config["tokens_per_second"]
+
+    def choose(self, messages):
+        user_text = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        responses = next((responses for pattern, responses in self.rules if pattern.search(user_text)),
+                         self.fallback)
+        return responses[zlib.crc32(user_text.encode("utf-8")) % len(responses)]
+
+    def complete(self, messages, stream, timeout):
+        response = self.choose(messages)
+        tokens = re.findall(r"\S+\s*", response)
+        time.sleep(self.first_token_latency())
+        if not stream:
+            time.sleep(len(tokens) * self.token_interval)
+            return response
+        return self.stream_tokens(tokens)
+
+    def stream_tokens(self, tokens):
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_interval)
+            yield token
+
+
+class LlamaCppResponder:
+    """Local model on CPU with llama-cpp-python (optional dependency)"""
+    def __init__(self, config):
+        from llama_cpp import Llama
+        llama_config = config["llama_cpp"]
+        self.max_tokens = llama_config.get("max_tokens", 200)
+        self.llm = Llama(model_path=llama_config["model_path"], n_ctx=llama_config.get("n_ctx", 4096),
+                         n_threads=llama_config.get("n_threads", 4), verbose=False)
+        self.lock = threading.Lock()  # one generation at a time on the model
+
+    def complete(self, messages, stream, timeout):
+        if not stream:
+            with self.lock:
+                completion = self.llm.create_chat_completion(messages=messages, max_tokens=self.max_tokens)
+            return completion["choices"][0]["message"]["content"]
+        return self.stream_tokens(messages)
+
+    def stream_tokens(self, messages):
+        with self.lock:
+            for chunk in self.llm.create_chat_completion(messages=messages, max_tokens=self.max_tokens, stream=True):
+                yield chunk["choices"][0]["delta"].get("content")
+
+
+# Setup UDP_Client
+udp_client = UDPClient(ip_whiteboard)
+subscribes = ['LLM_QUERY', 'COMMON']
+
+for subscribe in subscribes:
+    udp_client.send(f'Subscribe:{subscribe}')
+
+tracer = LatencyTracer(udp_client, MODULE_FULL_NAME)
+
+
+# Setup llm
+if config["backend"] == "llama_cpp":
+    responder = LlamaCppResponder(config)
+elif config["backend"] == "scripted":
+    responder = ScriptedResponder(config)
+else:
+    print(f"Backend inconnu : {config['backend']}")
+    sys.exit(1)
+
+# Cache of the responses, e.g. "cache": {"path": "response_cache.sqlite"} for llama_cpp
+response_cache = ResponseCache(**config['cache']) if config['cache'] is not None else None
+
+query_handler = QueryHandler(udp_client, tracer, responder.complete,
+                             stream=config['stream'],
+                             workers=config.get('workers', 2),
+                             timeout=config.get('request_timeout', 15),
+                             max_history=config.get('max_history', 15),
+                             cache=response_cache,
+                             model=config['llama_cpp']['model_path'] if config['backend'] == 'llama_cpp' else 'scripted')
+
+udp_client.send(f'COMMON:MODULE_SUCCESSFULLY_ACTIVATED:{MODULE_FULL_NAME}')
+print(f"Ready to receive queries ({config['backend']})")
+
+# Main loop
+while True:
+    received_messages = udp_client.wait_for_messages()
+    if 'COMMON' in received_messages:
+        message = received_messages['COMMON']
+        if 'REQUEST_MODULE_DEACTIVATION' in message:
+            request_module_full_name = message.split(':')[1]
+            if MODULE_FULL_NAME == request_module_full_name:
+                break #the main loop is exited and the module is closed
+        if "BROADCAST_REQUEST_SHUTDOWN" in message:
+            break
+
+    if 'LLM_QUERY' in received_messages:
+        query_handler.handle_query(received_messages['LLM_QUERY'])
+
+query_handler.stop()
+udp_client.send(f'COMMON:MODULE_SUCCESSFULLY_DEACTIVATED:{MODULE_FULL_NAME}')
+udp_client.close()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the responses of a LLM module, for the near-identical openings of the conversations
+(greetings...) and the replay of recorded sessions.
+
+The key is a hash of the model name and of all the messages sent to the model (system prompt,
+summary and history window of the session), normalized (case, punctuation and spaces are
+ignored): the same user turn after a different conversation is a different key. The responses are kept in memory
+(LRU) and optionally in a sqlite file shared by the runs, with a time to live.
+"""
+
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize(text):
+    return NON_WORD.sub(" ", text.lower()).strip()
+
+
+class ResponseCache:
+    """LRU cache of "max_entries" responses in memory, and "max_disk_entries" in the sqlite
+    file "path" (None: memory only). The responses older than "ttl" seconds are not used.
+    """
+    def __init__(self, path=None, max_entries=512, max_disk_entries=5000, ttl=24 * 3600):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (response, creation time)
+        self.lock = threading.Lock()  # used by the workers of the QueryHandler
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, created REAL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+            self.db.execute("DELETE FROM responses WHERE created < ?", (time.time() - ttl,))
+            self.db.commit()
+
+    def key(self, model, messages):
+        """Key of the response to "messages" (the whole context sent to the model) by "model" """
+        normalized = [model, [(m["role"], normalize(m["content"])) for m in messages]]
+        return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached response or None"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[key]
+            if self.db is not None:
+                row = self.db.execute("SELECT response, created FROM responses WHERE key = ? AND created >= ?",
+                                      (key, now - self.ttl)).fetchone()
+                if row is not None:
+                    self.remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        now = time.time()
+        with self.lock:
+            self.remember(key, response, now)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, response, now))
+                self.db.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                                "ORDER BY created DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,))
+                self.db.commit()
+
+    def remember(self, key, response, created):
+        # called with the lock held
+        self.entries[key] = (response, created)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0, "entries": len(self.entries)}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -75,7 +75,7 @@ def launch_all_modules():
 def main():
     # Main loop
     while True:
-        received_messages = udp_client.get_received_messages()
+        received_messages = udp_client.wait_for_messages()
         if 'COMMON' in received_messages:
             message = received_messages['COMMON']
             if 'REQUEST_MODULE_ACTIVATION' in message:
@@ -34,8 +34,8 @@ import torch.multiprocessing as mp
 import torch
 from typing import List, Union
 from ctypes import c_bool
+import concurrent.futures
 from scipy.signal import resample
-from scipy import signal
 import faster_whisper
 import collections
 import numpy as np
@@ -50,13 +50,16 @@ import logging
 import struct
 import halo
 import time
-import copy
 import os
 import re
 import gc
 
+from audio_ring import AudioRingBuffer
+from vad import VadFrontEnd, SileroVad, INIT_ENERGY_THRESHOLD
+
 INIT_MODEL_TRANSCRIPTION = "tiny"
 INIT_MODEL_TRANSCRIPTION_REALTIME = "tiny"
+INIT_TRANSCRIPTION_WORKERS = 1
 INIT_REALTIME_PROCESSING_PAUSE = 0.2
 INIT_SILERO_SENSITIVITY = 0.4
 INIT_WEBRTC_SENSITIVITY = 3
@@ -73,11 +76,55 @@ TIME_SLEEP = 0.02
 SAMPLE_RATE = 16000
 BUFFER_SIZE = 512
 INT16_MAX_ABS_VALUE = 32768.0
+AUDIO_RING_SLOTS = 256  # about 8 s of 512 samples chunks at 16 kHz
 
 INIT_HANDLE_BUFFER_OVERFLOW = False
 if platform.system() != 'Darwin':
     INIT_HANDLE_BUFFER_OVERFLOW = True
 
+INIT_FRAMES_CAPACITY = 10 * SAMPLE_RATE  # samples preallocated for an utterance
+
+
+class AudioFrames:
+    """
+    Recorded audio of the current utterance, converted to float32 once per
+    chunk in a preallocated buffer that doubles when full.
+
+    view() returns the samples recorded so far without copy or conversion.
+    clear() starts a new buffer instead of reusing the memory, so a view
+    taken before (realtime transcription, self.audio) stays valid.
+    """
+
+    def __init__(self, capacity=INIT_FRAMES_CAPACITY):
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.data = np.empty(self.capacity, dtype=np.float32)
+        self.length = 0
+
+    def append(self, chunk):
+        """Appends a chunk of int16 samples (bytes-like)"""
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        end = self.length + len(samples)
+        if end > len(self.data):
+            data = np.empty(max(end, 2 * len(self.data)), dtype=np.float32)
+            data[:self.length] = self.data[:self.length]
+            self.data = data
+        np.multiply(samples, 1 / INT16_MAX_ABS_VALUE,
+                    out=self.data[self.length:end], casting='unsafe')
+        self.length = end
+
+    def extend(self, chunks):
+        for chunk in chunks:
+            self.append(chunk)
+
+    def view(self):
+        return self.data[:self.length]
+
+    def __len__(self):
+        return self.length
+
 
 class AudioToTextRecorder:
     """
@@ -92,6 +139,7 @@ class AudioToTextRecorder:
                  compute_type: str = "int8",
                  input_device_index: int = 0,
                  gpu_device_index: Union[int, List[int]] = 0,
+                 transcription_workers: int = INIT_TRANSCRIPTION_WORKERS,
                  on_recording_start=None,
                  on_recording_stop=None,
                  on_transcription_start=None,
@@ -112,6 +160,7 @@ class AudioToTextRecorder:
                  silero_sensitivity: float = INIT_SILERO_SENSITIVITY,
                  silero_use_onnx: bool = False,
                  webrtc_sensitivity: int = INIT_WEBRTC_SENSITIVITY,
+                 vad_energy_threshold: Optional[float] = INIT_ENERGY_THRESHOLD,
                  post_speech_silence_duration: float = (
                      INIT_POST_SPEECH_SILENCE_DURATION
                  ),
@@ -173,6 +222,11 @@ class AudioToTextRecorder:
             IDs (e.g. [0, 1, 2, 3]). In that case, multiple transcriptions can
             run in parallel when transcribe() is called from multiple Python
             threads
+        - transcription_workers (int, default=1): Number of transcription
+            processes, each with its own warm model. An utterance recorded
+            while the previous one is still decoding goes to an idle worker
+            instead of waiting behind it, so the transcriptions can finish
+            out of order. On CPU, the cores are shared between the workers.
         - on_recording_start (callable, default=None): Callback function to be
             called when recording of audio to be transcripted starts.
         - on_recording_stop (callable, default=None): Callback function to be
@@ -217,11 +271,18 @@ class AudioToTextRecorder:
         - silero_use_onnx (bool, default=False): Enables usage of the
             pre-trained model from Silero in the ONNX (Open Neural Network
             Exchange) format instead of the PyTorch format. This is
-            recommended for faster performance.
+            recommended for faster performance: the ONNX Runtime session is
+            then called directly, without torch tensors.
         - webrtc_sensitivity (int, default=WEBRTC_SENSITIVITY): Sensitivity
             for the WebRTC Voice Activity Detection engine ranging from 0
             (least aggressive / most sensitive) to 3 (most aggressive,
             least sensitive). Default is 3.
+        - vad_energy_threshold (float, default=-50.0): Energy gate in dBFS
+            in front of the VAD models. The 10 ms frames with a lower mean
+            power are counted as silence without running WebRTC, and Silero
+            only runs after WebRTC, so a quiet room costs almost no VAD
+            inference. Lower it for a distant microphone, None disables the
+            gate.
         - post_speech_silence_duration (float, default=0.2): Duration in
             seconds of silence that must follow speech before the recording
             is considered to be completed. This ensures that any brief
@@ -339,14 +400,16 @@ class AudioToTextRecorder:
         self.allowed_latency_limit = ALLOWED_LATENCY_LIMIT
 
         self.level = level
-        self.audio_queue = mp.Queue()
+        # Audio chunks from the microphone process (or feed_audio) to the
+        # recording worker, the slots leave room for the porcupine frames
+        self.audio_ring = AudioRingBuffer(AUDIO_RING_SLOTS, 4 * buffer_size,
+                                          context=mp)
         self.buffer_size = buffer_size
         self.sample_rate = sample_rate
         self.recording_start_time = 0
         self.recording_stop_time = 0
         self.wake_word_detect_time = 0
         self.silero_check_time = 0
-        self.silero_working = False
         self.speech_end_silence_start = 0
         self.silero_sensitivity = silero_sensitivity
         self.listen_start = 0
@@ -406,27 +469,51 @@ class AudioToTextRecorder:
 
         self.interrupt_stop_event = mp.Event()
         self.was_interrupted = mp.Event()
-        self.main_transcription_ready_event = mp.Event()
-        self.parent_transcription_pipe, child_transcription_pipe = mp.Pipe()
-
-        self.transcript_process = mp.Process(
-            target=AudioToTextRecorder._transcription_worker,
-            args=(
-                child_transcription_pipe,
-                model,
-                self.compute_type,
-                self.gpu_device_index,
-                self.main_transcription_ready_event,
-                self.shutdown_event,
-                self.interrupt_stop_event,
-                self.beam_size,
-                self.initial_prompt,
-                self.suppress_tokens
+
+        # Pool of transcription workers: the requests (request id, audio,
+        # language) go to the first idle worker, the results (request id,
+        # status, text) come back in the order they finish
+        self.transcription_request_queue = mp.Queue()
+        self.transcription_result_queue = mp.Queue()
+        self.transcription_ids = itertools.count()
+        self.pending_transcriptions = {}
+        self.pending_transcriptions_lock = threading.Lock()
+        cpu_threads = 0  # CTranslate2 default
+        if transcription_workers > 1:
+            cpu_threads = max(1, (os.cpu_count() or 4)
+                              // transcription_workers)
+        self.transcription_ready_events = []
+        self.transcript_processes = []
+        for worker_index in range(transcription_workers):
+            ready_event = mp.Event()
+            process = mp.Process(
+                target=AudioToTextRecorder._transcription_worker,
+                args=(
+                    self.transcription_request_queue,
+                    self.transcription_result_queue,
+                    worker_index,
+                    model,
+                    self.compute_type,
+                    self.gpu_device_index,
+                    cpu_threads,
+                    ready_event,
+                    self.interrupt_stop_event,
+                    self.beam_size,
+                    self.initial_prompt,
+                    self.suppress_tokens
+                )
             )
-        )
-        self.transcript_process.start()
+            process.start()
+            self.transcription_ready_events.append(ready_event)
+            self.transcript_processes.append(process)
+
+        self.transcription_result_thread = threading.Thread(
+            target=self._transcription_result_worker)
+        self.transcription_result_thread.daemon = True
+        self.transcription_result_thread.start()
 
         # Start audio data reading process
+        self.reader_process = None
         if self.use_microphone.value:
             logging.info("Initializing audio recording"
                          " (creating pyAudio input stream,"
@@ -436,7 +523,7 @@ class AudioToTextRecorder:
             self.reader_process = mp.Process(
                 target=AudioToTextRecorder._audio_data_worker,
                 args=(
-                    self.audio_queue,
+                    self.audio_ring,
                     self.sample_rate,
                     self.buffer_size,
                     self.input_device_index,
@@ -531,15 +618,26 @@ class AudioToTextRecorder:
                               )
             raise
 
+        # Silero runs in its own thread, on the chunks queued by
+        # _check_voice_activity (batched when they pile up)
+        self.silero_vad = SileroVad(self.silero_vad_model, silero_use_onnx,
+                                    on_result=self._on_silero_result)
+
         logging.debug("Silero VAD voice activity detection "
                       "engine initialized successfully"
                       )
 
+        # One resampling and one energy gate per chunk for both VAD models
+        self.vad_front_end = VadFrontEnd(self.webrtc_vad_model,
+                                         self.sample_rate,
+                                         vad_energy_threshold,
+                                         self.debug_mode)
+
         self.audio_buffer = collections.deque(
             maxlen=int((self.sample_rate // self.buffer_size) *
                        self.pre_recording_buffer_duration)
         )
-        self.frames = []
+        self.frames = AudioFrames()
 
         # Recording control flags
         self.is_recording = False
@@ -558,19 +656,22 @@ class AudioToTextRecorder:
         self.realtime_thread.start()
 
         # Wait for transcription models to start
-        logging.debug('Waiting for main transcription model to start')
-        self.main_transcription_ready_event.wait()
-        logging.debug('Main transcription model ready')
+        logging.debug('Waiting for main transcription models to start')
+        for ready_event in self.transcription_ready_events:
+            ready_event.wait()
+        logging.debug('Main transcription models ready')
 
         logging.debug('RealtimeSTT initialization completed successfully')
 
     @staticmethod
-    def _transcription_worker(conn,
+    def _transcription_worker(request_queue,
+                              result_queue,
+                              worker_index,
                               model_path,
                               compute_type,
                               gpu_device_index,
+                              cpu_threads,
                               ready_event,
-                              shutdown_event,
                               interrupt_stop_event,
                               beam_size,
                               initial_prompt,
@@ -580,26 +681,32 @@ class AudioToTextRecorder:
         Worker method that handles the continuous
         process of transcribing audio data.
 
-        This method runs in a separate process and is responsible for:
+        This method runs in a separate process (one per worker of the pool)
+        and is responsible for:
         - Initializing the `faster_whisper` model used for transcription.
-        - Receiving audio data sent through a pipe and using the model
-          to transcribe it.
-        - Sending transcription results back through the pipe.
-        - Continuously checking for a shutdown event to gracefully
-          terminate the transcription process.
+        - Taking the transcription requests from the queue shared by the
+          workers, blocking until one arrives (no polling).
+        - Sending the transcription results, tagged with the id of their
+          request, to the result queue.
+        - Stopping on the None request sent by shutdown().
 
         Args:
-            conn (multiprocessing.Connection): The connection endpoint used
-              for receiving audio data and sending transcription results.
+            request_queue (multiprocessing.Queue): Requests
+              (request id, audio, language) shared by the workers.
+            result_queue (multiprocessing.Queue): Results
+              (request id, status, transcription or error message, timings),
+              timings being the decoding time and the CPU time of the
+              worker process in seconds (None on error).
+            worker_index (int): Index of the worker in the pool, for the logs.
             model_path (str): The path to the pre-trained faster_whisper model
               for transcription.
             compute_type (str): Specifies the type of computation to be used
                 for transcription.
             gpu_device_index (int): Device ID to use.
+            cpu_threads (int): Threads of the model on CPU, 0 for the
+                CTranslate2 default.
             ready_event (threading.Event): An event that is set when the
               transcription model is successfully initialized and ready.
-            shutdown_event (threading.Event): An event that, when set,
-              signals this worker method to terminate.
             interrupt_stop_event (threading.Event): An event that, when set,
                 signals this worker method to stop processing audio data.
             beam_size (int): The beam size to use for beam search decoding.
@@ -613,7 +720,8 @@ class AudioToTextRecorder:
         """
 
         logging.info("Initializing faster_whisper "
-                     f"main transcription model {model_path}"
+                     f"main transcription model {model_path} "
+                     f"(worker {worker_index})"
                      )
 
         try:
@@ -622,6 +730,7 @@ class AudioToTextRecorder:
                 device='cuda' if torch.cuda.is_available() else 'cpu',
                 compute_type=compute_type,
                 device_index=gpu_device_index,
+                cpu_threads=cpu_threads,
             )
 
         except Exception as e:
@@ -633,31 +742,36 @@ class AudioToTextRecorder:
         ready_event.set()
 
         logging.debug("Faster_whisper main speech to text "
-                      "transcription model initialized successfully"
+                      "transcription model initialized successfully "
+                      f"(worker {worker_index})"
                       )
 
-        while not shutdown_event.is_set():
+        while True:
             try:
-                if conn.poll(0.5):
-                    audio, language = conn.recv()
-                    try:
-                        segments = model.transcribe(
-                            audio,
-                            language=language if language else None,
-                            beam_size=beam_size,
-                            initial_prompt=initial_prompt,
-                            suppress_tokens=suppress_tokens
-                        )
-                        segments = segments[0]
-                        transcription = " ".join(seg.text for seg in segments)
-                        transcription = transcription.strip()
-                        conn.send(('success', transcription))
-                    except Exception as e:
-                        logging.error(f"General transcription error: {e}")
-                        conn.send(('error', str(e)))
-                else:
-                    # If there's no data, sleep / prevent busy waiting
-                    time.sleep(0.02)
+                request = request_queue.get()
+                if request is None:
+                    break
+                request_id, audio, language = request
+                start_time = time.perf_counter()
+                start_cpu_time = time.process_time()
+                try:
+                    segments = model.transcribe(
+                        audio,
+                        language=language if language else None,
+                        beam_size=beam_size,
+                        initial_prompt=initial_prompt,
+                        suppress_tokens=suppress_tokens
+                    )
+                    segments = segments[0]
+                    transcription = " ".join(seg.text for seg in segments)
+                    transcription = transcription.strip()
+                    timings = (time.perf_counter() - start_time,
+                               time.process_time() - start_cpu_time)
+                    result_queue.put(
+                        (request_id, 'success', transcription, timings))
+                except Exception as e:
+                    logging.error(f"General transcription error: {e}")
+                    result_queue.put((request_id, 'error', str(e), None))
             except KeyboardInterrupt:
                 interrupt_stop_event.set()
                 logging.debug("Transcription worker process "
@@ -665,8 +779,38 @@ class AudioToTextRecorder:
                               )
                 break
 
+    def _transcription_result_worker(self):
+        """
+        Thread resolving the futures returned by transcribe() with the
+        results of the transcription workers, in the order they finish.
+        Stops on the None result sent by shutdown().
+        """
+        while True:
+            result = self.transcription_result_queue.get()
+            if result is None:
+                break
+            request_id, status, transcription, timings = result
+            with self.pending_transcriptions_lock:
+                future, audio = self.pending_transcriptions.pop(
+                    request_id, (None, None))
+                pending = len(self.pending_transcriptions)
+            if future is None:
+                continue
+
+            if status == 'success':
+                self.last_transcription_bytes = audio
+                future.timings = timings
+                future.set_result(self._preprocess_output(transcription))
+            else:
+                logging.error(transcription)
+                future.set_exception(Exception(transcription))
+
+            # the recorder may already be listening to the next utterance
+            if not pending and self.state == "transcribing":
+                self._set_state("inactive")
+
     @staticmethod
-    def _audio_data_worker(audio_queue,
+    def _audio_data_worker(audio_ring,
                            sample_rate,
                            buffer_size,
                            input_device_index,
@@ -679,15 +823,15 @@ class AudioToTextRecorder:
         This method runs in a separate process and is responsible for:
         - Setting up the audio input stream for recording.
         - Continuously reading audio data from the input stream
-          and placing it in a queue.
+          and writing it in the shared memory ring buffer.
         - Handling errors during the recording process, including
           input overflow.
         - Gracefully terminating the recording process when a shutdown
           event is set.
 
         Args:
-            audio_queue (queue.Queue): A queue where recorded audio
-              data is placed.
+            audio_ring (AudioRingBuffer): The ring buffer where recorded
+              audio data is written.
             sample_rate (int): The sample rate of the audio input stream.
             buffer_size (int): The size of the buffer used in the audio
               input stream.
@@ -743,7 +887,7 @@ class AudioToTextRecorder:
                     continue
 
                 if use_microphone.value:
-                    audio_queue.put(data)
+                    audio_ring.write(data)
 
         except KeyboardInterrupt:
             interrupt_stop_event.set()
@@ -806,9 +950,8 @@ class AudioToTextRecorder:
                 if (self.stop_recording_event.wait(timeout=0.02)):
                     break
 
-        # Convert recorded frames to the appropriate audio format.
-        audio_array = np.frombuffer(b''.join(self.frames), dtype=np.int16)
-        self.audio = audio_array.astype(np.float32) / INT16_MAX_ABS_VALUE
+        # The recorded frames are already in the appropriate audio format.
+        self.audio = self.frames.view()
         self.frames.clear()
 
         # Reset recording-related timestamps
@@ -822,38 +965,40 @@ class AudioToTextRecorder:
         Transcribes audio captured by this class instance using the
         `faster_whisper` model.
 
-        Automatically starts recording upon voice activity if not manually
-          started using `recorder.start()`.
-        Automatically stops recording upon voice deactivity if not manually
-          stopped with `recorder.stop()`.
-        Processes the recorded audio to generate transcription.
+        The audio recorded last (see wait_audio()) is sent to the pool of
+        transcription workers and the method returns at once: the next
+        utterance can be recorded while this one is decoding.
 
-        Args:
-            on_transcription_finished (callable, optional): Callback function
-              to be executed when transcription is ready.
-            If provided, transcription will be performed asynchronously,
-              and the callback will receive the transcription as its argument.
-              If omitted, the transcription will be performed synchronously,
-              and the result will be returned.
-
-        Returns (if no callback is set):
-            str: The transcription of the recorded audio.
-
-        Raises:
-            Exception: If there is an error during the transcription process.
+        Returns:
+            concurrent.futures.Future: Resolved with the transcription of
+              the recorded audio (str), or with the exception raised by
+              the transcription worker. The futures of successive calls can
+              be resolved out of order. Once resolved, future.timings holds
+              the decoding time and the CPU time of the worker (seconds).
         """
         self._set_state("transcribing")
-        audio_copy = copy.deepcopy(self.audio)
-        self.parent_transcription_pipe.send((self.audio, self.language))
-        status, result = self.parent_transcription_pipe.recv()
-
-        self._set_state("inactive")
-        if status == 'success':
-            self.last_transcription_bytes = audio_copy
-            return self._preprocess_output(result)
-        else:
-            logging.error(result)
-            raise Exception(result)
+        future = concurrent.futures.Future()
+        request_id = next(self.transcription_ids)
+        with self.pending_transcriptions_lock:
+            # self.audio is not modified by the next recording (see
+            # AudioFrames), the worker and last_transcription_bytes share it
+            self.pending_transcriptions[request_id] = (future, self.audio)
+        self.transcription_request_queue.put(
+            (request_id, self.audio, self.language))
+        return future
+
+    def _finish_transcription(self, future, on_transcription_finished):
+        """
+        Done callback of a transcription started by text(): calls
+        on_transcription_finished with the transcription in a new thread.
+        """
+        try:
+            transcription = future.result()
+        except Exception as e:
+            logging.error(f"Transcription failed: {e}")
+            return
+        threading.Thread(target=on_transcription_finished,
+                         args=(transcription,)).start()
 
     def text(self,
              on_transcription_finished=None,
@@ -873,6 +1018,8 @@ class AudioToTextRecorder:
               to be executed when transcription is ready.
             If provided, transcription will be performed asynchronously, and
               the callback will receive the transcription as its argument.
+              text() then returns as soon as the recording is done, and the
+              callbacks of successive calls can run out of order.
               If omitted, the transcription will be performed synchronously,
               and the result will be returned.
 
@@ -880,6 +1027,36 @@ class AudioToTextRecorder:
             str: The transcription of the recorded audio
         """
 
+        if not self._wait_recording():
+            return ""
+
+        future = self.transcribe()
+        if on_transcription_finished:
+            future.add_done_callback(
+                lambda future: self._finish_transcription(
+                    future, on_transcription_finished))
+        else:
+            return future.result()
+
+    def transcribe_next(self):
+        """
+        Waits for the next recording, as text(), and sends it to the pool of
+        transcription workers without waiting for the result.
+
+        Returns:
+            concurrent.futures.Future or None: see transcribe(). None if the
+              wait was interrupted (abort(), shutdown) or if no audio was
+              recorded.
+        """
+        if not self._wait_recording():
+            return None
+        return self.transcribe()
+
+    def _wait_recording(self):
+        """
+        Waits for the next recording (wait_audio()). Returns False if the
+        wait was interrupted or if no audio was recorded.
+        """
         self.interrupt_stop_event.clear()
         self.was_interrupted.clear()
 
@@ -888,13 +1065,8 @@ class AudioToTextRecorder:
         if self.is_shut_down or self.interrupt_stop_event.is_set():
             if self.interrupt_stop_event.is_set():
                 self.was_interrupted.set()
-            return ""
-
-        if on_transcription_finished:
-            threading.Thread(target=on_transcription_finished,
-                             args=(self.transcribe(),)).start()
-        else:
-            return self.transcribe()
+            return False
+        return len(self.audio) > 0
 
     def start(self):
         """
@@ -917,7 +1089,7 @@ class AudioToTextRecorder:
         self.realtime_stabilized_safetext = ""
         self.wakeword_detected = False
         self.wake_word_detect_time = 0
-        self.frames = []
+        self.frames.clear()
         self.is_recording = True
         self.recording_start_time = time.time()
         self.is_silero_speech_active = False
@@ -947,22 +1119,26 @@ class AudioToTextRecorder:
         logging.info("recording stopped")
         self.is_recording = False
         self.recording_stop_time = time.time()
+        self.silero_vad.clear()
         self.is_silero_speech_active = False
         self.is_webrtc_speech_active = False
         self.silero_check_time = 0
         self.start_recording_event.clear()
-        self.stop_recording_event.set()
 
+        # Called before wait_audio() returns, so that the callback can tag
+        # the utterance before its transcription starts
         if self.on_recording_stop:
             self.on_recording_stop()
 
+        self.stop_recording_event.set()
+
         return self
 
     def feed_audio(self, chunk, original_sample_rate=16000):
         """
         Feed an audio chunk into the processing pipeline. Chunks are
         accumulated until the buffer size is reached, and then the accumulated
-        data is fed into the audio_queue.
+        data is written in the audio ring buffer.
         """
         # Check if the buffer attribute exists, if not, initialize it
         if not hasattr(self, 'buffer'):
@@ -995,8 +1171,8 @@ class AudioToTextRecorder:
             to_process = self.buffer[:buf_size]
             self.buffer = self.buffer[buf_size:]
 
-            # Feed the extracted data to the audio_queue
-            self.audio_queue.put(to_process)
+            # Feed the extracted data to the audio ring buffer
+            self.audio_ring.write(to_process)
 
     def set_microphone(self, microphone_on=True):
         """
@@ -1034,25 +1210,33 @@ class AudioToTextRecorder:
         logging.debug('Terminating reader process')
 
         # Give it some time to finish the loop and cleanup.
-        if self.use_microphone:
+        if self.reader_process is not None:
             self.reader_process.join(timeout=10)
 
-        if self.reader_process.is_alive():
-            logging.warning("Reader process did not terminate "
-                            "in time. Terminating forcefully."
-                            )
-            self.reader_process.terminate()
+            if self.reader_process.is_alive():
+                logging.warning("Reader process did not terminate "
+                                "in time. Terminating forcefully."
+                                )
+                self.reader_process.terminate()
 
-        logging.debug('Terminating transcription process')
-        self.transcript_process.join(timeout=10)
+        logging.debug('Terminating transcription processes')
+        for _ in self.transcript_processes:
+            self.transcription_request_queue.put(None)
+        for process in self.transcript_processes:
+            process.join(timeout=10)
 
-        if self.transcript_process.is_alive():
-            logging.warning("Transcript process did not terminate "
-                            "in time. Terminating forcefully."
-                            )
-            self.transcript_process.terminate()
+            if process.is_alive():
+                logging.warning("Transcript process did not terminate "
+                                "in time. Terminating forcefully."
+                                )
+                process.terminate()
 
-        self.parent_transcription_pipe.close()
+        self.transcription_result_queue.put(None)
+        self.transcription_result_thread.join()
+        with self.pending_transcriptions_lock:
+            for future, _ in self.pending_transcriptions.values():
+                future.cancel()
+            self.pending_transcriptions.clear()
 
         logging.debug('Finishing realtime thread')
         if self.realtime_thread:
@@ -1062,6 +1246,9 @@ class AudioToTextRecorder:
             if self.realtime_model_type:
                 del self.realtime_model_type
                 self.realtime_model_type = None
+        self.silero_vad.close()
+        logging.debug(f"Silero VAD timings: {self.silero_vad.stats()}")
+        self.audio_ring.close()
         gc.collect()
 
     def _recording_worker(self):
@@ -1079,31 +1266,25 @@ class AudioToTextRecorder:
             # Continuously monitor audio for voice activity
             while self.is_running:
 
-                try:
-
-                    data = self.audio_queue.get()
-                    if self.on_recorded_chunk:
-                        self.on_recorded_chunk(data)
-
-                    if self.handle_buffer_overflow:
-                        # Handle queue overflow
-                        if (self.audio_queue.qsize() >
-                                self.allowed_latency_limit):
-                            logging.warning("Audio queue size exceeds "
-                                            "latency limit. Current size: "
-                                            f"{self.audio_queue.qsize()}. "
-                                            "Discarding old audio chunks."
-                                            )
-
-                        while (self.audio_queue.qsize() >
-                                self.allowed_latency_limit):
-
-                            data = self.audio_queue.get()
+                if not self.audio_ring.wait(timeout=0.1):
+                    continue
 
-                except BrokenPipeError:
-                    print("BrokenPipeError _recording_worker")
-                    self.is_running = False
-                    break
+                if self.handle_buffer_overflow:
+                    # Handle ring overflow: keep the latest chunks only
+                    pending = self.audio_ring.pending()
+                    if pending > self.allowed_latency_limit + 1:
+                        logging.warning("Audio ring size exceeds "
+                                        "latency limit. Current size: "
+                                        f"{pending}. "
+                                        "Discarding old audio chunks."
+                                        )
+                        self.audio_ring.drop(self.allowed_latency_limit + 1)
+
+                # Copied out of the slot: the chunk is kept in the
+                # frames and the pre-recording buffer
+                data = self.audio_ring.read()
+                if self.on_recorded_chunk:
+                    self.on_recorded_chunk(data)
 
                 if not self.is_recording:
                     # Handle not recording state
@@ -1194,10 +1375,10 @@ class AudioToTextRecorder:
 
                                 # Add the buffered audio
                                 # to the recording frames
-                                self.frames.extend(list(self.audio_buffer))
+                                self.frames.extend(self.audio_buffer)
                                 self.audio_buffer.clear()
 
-                            self.silero_vad_model.reset_states()
+                            self.silero_vad.clear()
                         else:
                             data_copy = data[:]
                             self._check_voice_activity(data_copy)
@@ -1285,15 +1466,9 @@ class AudioToTextRecorder:
                     # Sleep for the duration of the transcription resolution
                     time.sleep(self.realtime_processing_pause)
 
-                    # Convert the buffer frames to a NumPy array
-                    audio_array = np.frombuffer(
-                        b''.join(self.frames),
-                        dtype=np.int16
-                        )
-
-                    # Normalize the array to a [-1, 1] range
-                    audio_array = audio_array.astype(np.float32) / \
-                        INT16_MAX_ABS_VALUE
+                    # Samples recorded so far, already normalized to a
+                    # [-1, 1] range by the recording worker
+                    audio_array = self.frames.view()
 
                     # Perform transcription and assemble the text
                     segments = self.realtime_model_type.transcribe(
@@ -1394,73 +1569,33 @@ class AudioToTextRecorder:
             logging.error(f"Unhandled exeption in _realtime_worker: {e}")
             raise
 
-    def _is_silero_speech(self, chunk):
+    def _on_silero_result(self, probabilities):
         """
-        Returns true if speech is detected in the provided audio data
+        Called by the Silero VAD thread with the speech probabilities of
+        the chunks evaluated in one inference call, unless silero_vad.clear()
+        was called since they were submitted (start of a recording).
 
         Args:
-            data (bytes): raw bytes of audio data (1024 raw bytes with
-            16000 sample rate and 16 bits per sample)
+            probabilities (np.ndarray): one probability per chunk queued
+            since the previous call
         """
-        if self.sample_rate != 16000:
-            pcm_data = np.frombuffer(chunk, dtype=np.int16)
-            data_16000 = signal.resample_poly(
-                pcm_data, 16000, self.sample_rate)
-            chunk = data_16000.astype(np.int16).tobytes()
-
-        self.silero_working = True
-        audio_chunk = np.frombuffer(chunk, dtype=np.int16)
-        audio_chunk = audio_chunk.astype(np.float32) / INT16_MAX_ABS_VALUE
-        vad_prob = self.silero_vad_model(
-            torch.from_numpy(audio_chunk),
-            SAMPLE_RATE).item()
-        is_silero_speech_active = vad_prob > (1 - self.silero_sensitivity)
-        if is_silero_speech_active:
+        if probabilities.max() > (1 - self.silero_sensitivity):
             self.is_silero_speech_active = True
-        self.silero_working = False
-        return is_silero_speech_active
 
     def _is_webrtc_speech(self, chunk, all_frames_must_be_true=False):
         """
         Returns true if speech is detected in the provided audio data
 
+        The chunk is resampled to 16000 Hz once and its 10 ms frames below
+        the energy gate are counted as silence without running WebRTC (see
+        VadFrontEnd).
+
         Args:
             data (bytes): raw bytes of audio data (1024 raw bytes with
             16000 sample rate and 16 bits per sample)
         """
-        if self.sample_rate != 16000:
-            pcm_data = np.frombuffer(chunk, dtype=np.int16)
-            data_16000 = signal.resample_poly(
-                pcm_data, 16000, self.sample_rate)
-            chunk = data_16000.astype(np.int16).tobytes()
-
-        # Number of audio frames per millisecond
-        frame_length = int(16000 * 0.01)  # for 10ms frame
-        num_frames = int(len(chunk) / (2 * frame_length))
-        speech_frames = 0
-
-        for i in range(num_frames):
-            start_byte = i * frame_length * 2
-            end_byte = start_byte + frame_length * 2
-            frame = chunk[start_byte:end_byte]
-            if self.webrtc_vad_model.is_speech(frame, 16000):
-                speech_frames += 1
-                if not all_frames_must_be_true:
-                    if self.debug_mode:
-                        print(f"Speech detected in frame {i + 1}"
-                              f" of {num_frames}")
-                    return True
-        if all_frames_must_be_true:
-            if self.debug_mode and speech_frames == num_frames:
-                print(f"Speech detected in {speech_frames} of "
-                      f"{num_frames} frames")
-            elif self.debug_mode:
-                print(f"Speech not detected in all {num_frames} frames")
-            return speech_frames == num_frames
-        else:
-            if self.debug_mode:
-                print(f"Speech not detected in any of {num_frames} frames")
-            return False
+        return self.vad_front_end.is_webrtc_speech(chunk,
+                                                   all_frames_must_be_true)
 
     def _check_voice_activity(self, data):
         """
@@ -1474,13 +1609,9 @@ class AudioToTextRecorder:
         # First quick performing check for voice activity using WebRTC
         if self.is_webrtc_speech_active:
 
-            if not self.silero_working:
-                self.silero_working = True
-
-                # Run the intensive check in a separate thread
-                threading.Thread(
-                    target=self._is_silero_speech,
-                    args=(data,)).start()
+            # Queue the intensive check for the Silero thread (it copies
+            # the samples, the front-end buffer is reused)
+            self.silero_vad.submit(self.vad_front_end.float_audio(data))
 
     def _is_voice_active(self):
         """
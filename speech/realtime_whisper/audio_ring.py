@@ -0,0 +1,127 @@
+"""
+Shared memory ring buffer of audio chunks, between the process reading the
+microphone (or feed_audio) and the recording worker of AudioToTextRecorder.
+
+A chunk is written in a slot of the ring then the write index is published, the
+reader gets a view of the slot without pickling or pipe. The indices are uint64
+counters of chunks since the start, so the number of pending chunks (and an
+overflow) is a difference of indices. The writer never waits for the reader: a
+reader more than "slots" chunks behind loses the overwritten chunks.
+"""
+
+import numpy as np
+from multiprocessing import shared_memory
+import multiprocessing as mp
+
+INDEX_WRITE = 0
+INDEX_READ = 1
+HEADER_SIZE = 16  # write index, read index (uint64, aligned: stored atomically)
+
+
+class AudioRingBuffer:
+    """
+    Single reader ring of "slots" audio chunks of at most "slot_size" bytes.
+    It can be given to a child process (mp.Process args): the child attaches
+    to the same shared memory, the creator unlinks it in close().
+    """
+
+    def __init__(self, slots, slot_size, context=mp):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=HEADER_SIZE + slots * (4 + slot_size))
+        self.owner = True
+        self.data_event = context.Event()  # set after each write
+        self.write_lock = context.Lock()   # microphone process and feed_audio
+        self._map()
+        self.indices[:] = 0
+        self.overwritten = 0  # chunks lost by the reader
+
+    def _map(self):
+        buf = self.shm.buf
+        self.indices = np.ndarray((2,), dtype=np.uint64, buffer=buf)
+        self.lengths = np.ndarray((self.slots,), dtype=np.uint32,
+                                  buffer=buf, offset=HEADER_SIZE)
+        self.data = np.ndarray((self.slots, self.slot_size), dtype=np.uint8,
+                               buffer=buf, offset=HEADER_SIZE + 4 * self.slots)
+
+    def __getstate__(self):
+        return (self.shm.name, self.slots, self.slot_size,
+                self.data_event, self.write_lock)
+
+    def __setstate__(self, state):
+        name, self.slots, self.slot_size, self.data_event, \
+            self.write_lock = state
+        # child process: it shares the resource tracker of the creator,
+        # which unlinks the segment in close()
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.owner = False
+        self.overwritten = 0
+        self._map()
+
+    def write(self, chunk):
+        """Copies a chunk (bytes-like) in the next slot and publishes it"""
+        chunk = np.frombuffer(chunk, dtype=np.uint8)
+        if len(chunk) > self.slot_size:
+            raise ValueError(f"audio chunk of {len(chunk)} bytes, "
+                             f"the slots have {self.slot_size} bytes")
+        with self.write_lock:
+            index = int(self.indices[INDEX_WRITE])
+            slot = index % self.slots
+            self.data[slot, :len(chunk)] = chunk
+            self.lengths[slot] = len(chunk)
+            # published after the data
+            self.indices[INDEX_WRITE] = index + 1
+        self.data_event.set()
+
+    def pending(self):
+        """Number of chunks written and not read yet"""
+        return int(self.indices[INDEX_WRITE]) - int(self.indices[INDEX_READ])
+
+    def wait(self, timeout=None):
+        """Waits until a chunk is pending, returns False after the timeout"""
+        if self.pending():
+            return True
+        self.data_event.clear()
+        if self.pending():  # written between the check and the clear
+            return True
+        self.data_event.wait(timeout)
+        return self.pending() > 0
+
+    def drop(self, keep):
+        """Skips the oldest pending chunks to keep "keep" of them,
+        returns the number of chunks skipped"""
+        skipped = self.pending() - keep
+        if skipped <= 0:
+            return 0
+        self.indices[INDEX_READ] = int(self.indices[INDEX_READ]) + skipped
+        return skipped
+
+    def read_view(self):
+        """
+        Returns a view (numpy uint8) of the next chunk, or None if no chunk
+        is pending. The view stays valid until the writer comes back to the
+        slot, "slots" chunks later: a chunk that is kept must be copied.
+        """
+        write_index = int(self.indices[INDEX_WRITE])
+        read_index = int(self.indices[INDEX_READ])
+        if read_index >= write_index:
+            return None
+        if write_index - read_index > self.slots:
+            # the writer went around the ring
+            self.overwritten += write_index - self.slots - read_index
+            read_index = write_index - self.slots
+        slot = read_index % self.slots
+        self.indices[INDEX_READ] = read_index + 1
+        return self.data[slot, :self.lengths[slot]]
+
+    def read(self):
+        """Returns a copy (bytes) of the next chunk, or None"""
+        view = self.read_view()
+        return None if view is None else view.tobytes()
+
+    def close(self):
+        self.indices = self.lengths = self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,303 @@
+"""
+Batch transcription of the study recordings, faster than real time.
+
+    python batch_transcribe.py recordings/ -o transcripts.jsonl
+    python batch_transcribe.py recordings/ -o transcripts.jsonl --model models/whisper-small-int8 --compute-type int8 --processes 8
+
+Every WAV/FLAC file of the folder (and its sub-folders) is cut in speech
+segments with the VAD of the live module (energy gate, WebRTC then Silero,
+see vad.py), then the segments are transcribed by a pool of processes, each
+with a warm faster_whisper model running batched inference
+(BatchedInferencePipeline) on the segments of a work unit. A file is decoded
+once, by the process that segments it: the work units carry their samples.
+The work units of a file are queued as soon as it is segmented, ahead of the
+files not yet segmented (at most --processes of them are queued).
+
+One JSON line per segment, written as soon as its work unit is done (the
+lines of different files are interleaved):
+    {"file": "day1/session3.wav", "segment": 12, "start": 83.42,
+     "end": 86.1, "text": "..."}
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import webrtcvad
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from vad import VadFrontEnd, SileroVad, INIT_ENERGY_THRESHOLD
+from file_source import load_audio, SAMPLE_RATE, CHUNK_SIZE
+
+AUDIO_EXTENSIONS = (".wav", ".flac")
+INIT_MODEL = "models/whisper_small_en_ct_32"
+# VAD settings of SpeechToText (realtime_whisper.py)
+INIT_SILERO_SENSITIVITY = 0.5
+INIT_WEBRTC_SENSITIVITY = 2
+INIT_MIN_SILENCE_DURATION = 0.5  # s of non speech closing a segment
+INIT_MIN_SEGMENT_DURATION = 0.3  # s, shorter segments are dropped
+SEGMENT_PADDING = 0.2  # s of audio kept around each segment
+MAX_SEGMENT_DURATION = 30.0  # s, the window of Whisper
+UNIT_DURATION = 120.0  # s of speech per work unit of the pool
+MAX_UNIT_SPAN = 300.0  # s of audio (speech and silences) per work unit
+
+# models of the pool process, loaded once by init_worker
+worker = {}
+
+
+def recording_files(folder):
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files)
+                     if name.lower().endswith(AUDIO_EXTENSIONS))
+    return paths
+
+
+def init_worker(model_path, compute_type, cpu_threads, silero_use_onnx,
+                webrtc_sensitivity):
+    import torch
+    import faster_whisper
+    torch.set_num_threads(1)
+    model = faster_whisper.WhisperModel(
+        model_size_or_path=model_path,
+        device='cuda' if torch.cuda.is_available() else 'cpu',
+        compute_type=compute_type,
+        cpu_threads=cpu_threads,
+    )
+    worker["pipeline"] = faster_whisper.BatchedInferencePipeline(model=model)
+    silero_vad_model, _ = torch.hub.load(
+        repo_or_dir="snakers4/silero-vad",
+        model="silero_vad",
+        verbose=False,
+        onnx=silero_use_onnx
+    )
+    worker["silero"] = SileroVad(silero_vad_model, silero_use_onnx)
+    worker["webrtc"] = webrtcvad.Vad(webrtc_sensitivity)
+
+
+def chunk_flags(samples, energy_threshold, silero_sensitivity):
+    """Per CHUNK_SIZE chunk of the file: WebRTC speech in a frame, WebRTC
+    speech in all the frames (both behind the energy gate) and Silero
+    speech, Silero being evaluated on the chunks with WebRTC speech only,
+    as in the live recorder"""
+    front_end = VadFrontEnd(worker["webrtc"], SAMPLE_RATE, energy_threshold)
+    chunks = len(samples) // CHUNK_SIZE
+    audio = samples[:chunks * CHUNK_SIZE].reshape(chunks, CHUNK_SIZE)
+    webrtc_any = np.zeros(chunks, dtype=bool)
+    webrtc_all = np.zeros(chunks, dtype=bool)
+    for index in range(chunks):
+        chunk = audio[index].tobytes()
+        webrtc_any[index] = front_end.is_webrtc_speech(chunk)
+        webrtc_all[index] = webrtc_any[index] and \
+            front_end.is_webrtc_speech(chunk, True)
+
+    silero = np.zeros(chunks, dtype=bool)
+    candidates = np.flatnonzero(webrtc_any)
+    if len(candidates):
+        worker["silero"].reset_states()
+        probabilities = worker["silero"].probabilities(
+            list(audio[candidates].astype(np.float32) / 32768.0))
+        silero[candidates] = probabilities > (1 - silero_sensitivity)
+    return webrtc_any, webrtc_all, silero
+
+
+def segment_file(path, energy_threshold, silero_sensitivity,
+                 min_silence_duration, min_segment_duration):
+    """Speech segments (start, end) of the file in seconds, its duration and
+    its work units (see work_units). A segment starts and ends as a
+    recording of the live recorder: it starts on a chunk with WebRTC speech
+    once Silero confirmed speech, it ends after min_silence_duration of
+    chunks without WebRTC speech in all their frames."""
+    samples = load_audio(path)
+    duration = len(samples) / SAMPLE_RATE
+    webrtc_any, webrtc_all, silero = chunk_flags(
+        samples, energy_threshold, silero_sensitivity)
+    chunk_duration = CHUNK_SIZE / SAMPLE_RATE
+    max_silent_chunks = int(min_silence_duration / chunk_duration)
+
+    segments = []
+    start = None
+    silero_confirmed = False
+    for index in range(len(webrtc_any)):
+        if start is None:
+            silero_confirmed = silero_confirmed or silero[index]
+            if webrtc_any[index] and silero_confirmed:
+                start = last = index
+                silero_confirmed = False
+        elif webrtc_all[index]:
+            last = index
+        elif index - last > max_silent_chunks:
+            segments.append((start, last + 1))
+            start = None
+    if start is not None:
+        segments.append((start, last + 1))
+
+    result = []
+    for start, end in segments:
+        start = max(0.0, start * chunk_duration - SEGMENT_PADDING)
+        end = min(duration, end * chunk_duration + SEGMENT_PADDING)
+        if end - start < min_segment_duration:
+            continue
+        # Whisper sees 30 s at most: long monologues are cut evenly
+        parts = int(np.ceil((end - start) / MAX_SEGMENT_DURATION))
+        bounds = np.linspace(start, end, parts + 1)
+        result.extend(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+    return path, duration, result, list(work_units(samples, result))
+
+
+def transcribe_unit(path, segments, offset, samples, language, beam_size,
+                    batch_size):
+    """Transcribes segments (index, start, end) of a file in one batched
+    call, "samples" being the audio of the file from "offset" (s). Returns
+    (index, start, end, text) and the decoding time"""
+    start_time = time.perf_counter()
+    # clip_timestamps are read in the audio given: the times of the file
+    # less the start of the unit
+    transcription, _ = worker["pipeline"].transcribe(
+        samples.astype(np.float32) / 32768.0,
+        language=language or None,
+        beam_size=beam_size,
+        batch_size=batch_size,
+        vad_filter=False,
+        clip_timestamps=[{"start": start - offset, "end": end - offset}
+                         for _, start, end in segments],
+    )
+    texts = [[] for _ in segments]
+    clip = 0
+    for segment in transcription:
+        # the Whisper segments come clip after clip
+        middle = offset + (segment.start + segment.end) / 2
+        while clip + 1 < len(segments) and middle >= segments[clip + 1][1]:
+            clip += 1
+        texts[clip].append(segment.text.strip())
+    results = [(index, start, end, " ".join(text))
+               for (index, start, end), text in zip(segments, texts)]
+    return path, results, time.perf_counter() - start_time
+
+
+def work_units(samples, segments):
+    """Groups the consecutive segments of a file by UNIT_DURATION of speech
+    (MAX_UNIT_SPAN of audio at most), yields (segments (index, start, end),
+    start of the unit in s, samples of the unit)"""
+    def unit_audio(unit):
+        offset, end = unit[0][1], unit[-1][2]
+        return (unit, offset,
+                samples[int(offset * SAMPLE_RATE):int(end * SAMPLE_RATE)])
+
+    unit, unit_duration = [], 0.0
+    for index, (start, end) in enumerate(segments):
+        if unit and end - unit[0][1] > MAX_UNIT_SPAN:
+            yield unit_audio(unit)
+            unit, unit_duration = [], 0.0
+        unit.append((index, start, end))
+        unit_duration += end - start
+        if unit_duration >= UNIT_DURATION:
+            yield unit_audio(unit)
+            unit, unit_duration = [], 0.0
+    if unit:
+        yield unit_audio(unit)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Timestamped transcription of a folder of recordings")
+    parser.add_argument("folder", help="folder of WAV/FLAC recordings")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file")
+    parser.add_argument("--model", default=INIT_MODEL)
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="segments per batched inference")
+    parser.add_argument("--beam-size", type=int, default=5)
+    parser.add_argument("--silero-onnx", action="store_true",
+                        help="Silero VAD with ONNX Runtime")
+    parser.add_argument("--silero-sensitivity", type=float,
+                        default=INIT_SILERO_SENSITIVITY)
+    parser.add_argument("--webrtc-sensitivity", type=int,
+                        default=INIT_WEBRTC_SENSITIVITY)
+    parser.add_argument("--vad-energy-threshold", type=float,
+                        default=INIT_ENERGY_THRESHOLD, help="dBFS")
+    parser.add_argument("--min-silence-duration", type=float,
+                        default=INIT_MIN_SILENCE_DURATION)
+    parser.add_argument("--min-segment-duration", type=float,
+                        default=INIT_MIN_SEGMENT_DURATION)
+    args = parser.parse_args()
+
+    paths = recording_files(args.folder)
+    if not paths:
+        parser.error(f"no {'/'.join(AUDIO_EXTENSIONS)} file in {args.folder}")
+
+    # the cores are shared between the processes of the pool
+    cpu_threads = max(1, (os.cpu_count() or 1) // args.processes)
+    start_time = time.perf_counter()
+    audio_duration = speech_duration = decode_time = 0.0
+    lines = 0
+    with ProcessPoolExecutor(
+            max_workers=args.processes,
+            mp_context=mp.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(args.model, args.compute_type, cpu_threads,
+                      args.silero_onnx, args.webrtc_sensitivity)) as pool, \
+            open(args.output, "w", encoding="utf-8") as output:
+        remaining_paths = iter(paths)
+        segmentations, transcriptions = set(), set()
+
+        def segment_next_file():
+            path = next(remaining_paths, None)
+            if path is not None:
+                segmentations.add(pool.submit(
+                    segment_file, path, args.vad_energy_threshold,
+                    args.silero_sensitivity, args.min_silence_duration,
+                    args.min_segment_duration))
+
+        # the pool takes the jobs in order: a few files are queued for
+        # segmentation, the work units of a segmented file go before the next
+        for _ in range(args.processes):
+            segment_next_file()
+        while segmentations or transcriptions:
+            done, _ = wait(segmentations | transcriptions,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in segmentations:
+                    segmentations.remove(future)
+                    path, duration, segments, units = future.result()
+                    audio_duration += duration
+                    speech_duration += sum(end - start
+                                           for start, end in segments)
+                    print(f"{os.path.relpath(path, args.folder)}: "
+                          f"{duration:.0f} s, {len(segments)} segments",
+                          file=sys.stderr)
+                    for unit, offset, samples in units:
+                        transcriptions.add(pool.submit(
+                            transcribe_unit, path, unit, offset, samples,
+                            args.language, args.beam_size, args.batch_size))
+                    segment_next_file()
+                    continue
+
+                transcriptions.remove(future)
+                path, results, unit_time = future.result()
+                decode_time += unit_time
+                name = os.path.relpath(path, args.folder).replace(os.sep, "/")
+                for index, start, end, text in results:
+                    output.write(json.dumps({
+                        "file": name, "segment": index,
+                        "start": round(start, 2), "end": round(end, 2),
+                        "text": text}, ensure_ascii=False) + "\n")
+                    lines += 1
+                output.flush()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"{len(paths)} files, {audio_duration / 3600:.2f} h of audio "
+          f"({speech_duration / 60:.1f} min of speech), {lines} segments "
+          f"in {elapsed:.0f} s: {audio_duration / elapsed:.1f}x real time "
+          f"(decoding {decode_time:.0f} s over {args.processes} processes)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
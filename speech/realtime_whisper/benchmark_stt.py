@@ -0,0 +1,271 @@
+"""
+Benchmark of the speech module on a corpus of recorded utterances: every
+model goes through the same AudioToTextRecorder pipeline (VAD, recording,
+transcription workers), fed from the audio files by FileAudioSource.
+
+    python benchmark_stt.py corpus/
+    python benchmark_stt.py corpus/ --models models/whisper-small-int8:int8 models/whisper_small_en_ct_float32:float32
+    python benchmark_stt.py corpus/ --speed max --json results.json
+
+The corpus is a folder of WAV/FLAC files, one utterance (or a few) per file.
+The reference speech boundaries of a file are its first and last 10 ms frames
+less than REFERENCE_DYNAMIC_RANGE dB below its loudest frame.
+
+Per utterance:
+  - VAD start latency: audio processed by the recorder when the recording
+    starts, after the reference onset (s of audio),
+  - VAD stop latency: the same for the end of the recording, after the
+    reference end of speech (includes post_speech_silence_duration),
+  - end of speech to text: time between the moment the reference end of
+    speech was fed and the moment its transcription is available (only with
+    --speed realtime, where the files are fed at the pace of a microphone),
+  - decoding time, real-time factor (decoding time / audio duration) and CPU
+    time of the transcription worker.
+Per model, the CPU time of the recorder process (VAD, recording) per second
+of audio fed is also reported.
+
+With --speed max the files are fed as fast as the recorder takes them (the
+silences between them still at the pace of a microphone, see file_source.py):
+the run is shorter and the decoding figures are the same, but Silero answers
+after more audio, so the VAD latencies are measured with --speed realtime.
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+import numpy as np
+
+from audio_recorder import AudioToTextRecorder
+from file_source import FileAudioSource, load_audio, SAMPLE_RATE
+
+DEFAULT_MODELS = ["models/whisper-small-int8:int8",
+                  "models/whisper_small_en_ct_float32:float32"]
+AUDIO_EXTENSIONS = (".wav", ".flac")
+REFERENCE_DYNAMIC_RANGE = 35.0  # dB below the loudest frame of the file
+FRAME_LENGTH = SAMPLE_RATE // 100
+DRAIN_TIMEOUT = 60.0  # s to wait for the last transcriptions
+
+
+def corpus_files(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith(AUDIO_EXTENSIONS))
+
+
+def speech_bounds(samples):
+    """(first, last) sample of the speech of a file, from the energy of its
+    10 ms frames, None for a silent file"""
+    frames = len(samples) // FRAME_LENGTH
+    if frames == 0:
+        return None
+    audio = samples[:frames * FRAME_LENGTH].astype(np.float32)
+    power = np.square(audio.reshape(frames, FRAME_LENGTH)).mean(axis=1)
+    if power.max() == 0:
+        return None
+    loud = np.flatnonzero(
+        power > power.max() / 10 ** (REFERENCE_DYNAMIC_RANGE / 10))
+    return loud[0] * FRAME_LENGTH, (loud[-1] + 1) * FRAME_LENGTH
+
+
+class RecorderProbe:
+    """Callbacks of the recorder, in stream positions (samples processed by
+    the recording worker) and perf_counter times"""
+
+    def __init__(self):
+        self.processed = 0
+        self.starts = []
+        self.stops = []
+
+    def on_recorded_chunk(self, chunk):
+        self.processed += len(chunk) // 2
+
+    def on_recording_start(self):
+        self.starts.append((self.processed, time.perf_counter()))
+
+    def on_recording_stop(self):
+        self.stops.append((self.processed, time.perf_counter()))
+
+
+def run_model(model_spec, paths, args):
+    model_path, _, compute_type = model_spec.partition(":")
+    compute_type = compute_type or "default"
+    corpus = {path: load_audio(path) for path in paths}
+    bounds = {path: speech_bounds(samples) for path, samples in corpus.items()}
+
+    probe = RecorderProbe()
+    recorder = AudioToTextRecorder(
+        model=model_path,
+        compute_type=compute_type,
+        language=args.language,
+        use_microphone=False,
+        spinner=False,
+        level=logging.WARNING,
+        post_speech_silence_duration=args.post_speech_silence_duration,
+        min_gap_between_recordings=0,
+        transcription_workers=args.workers,
+        silero_use_onnx=args.silero_onnx,
+        on_recording_start=probe.on_recording_start,
+        on_recording_stop=probe.on_recording_stop,
+        on_recorded_chunk=probe.on_recorded_chunk,
+    )
+
+    # first inference out of the measures
+    recorder.audio = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    recorder.transcribe().result()
+
+    transcriptions = []  # (audio duration, future, done time holder)
+
+    def collect():
+        while True:
+            recorder.wait_audio()
+            if recorder.is_shut_down:
+                return
+            done = {}
+            future = recorder.transcribe()
+            future.add_done_callback(
+                lambda future, done=done: done.setdefault(
+                    "time", time.perf_counter()))
+            transcriptions.append((len(recorder.audio) / SAMPLE_RATE,
+                                   future, done))
+
+    collector = threading.Thread(target=collect, daemon=True)
+    collector.start()
+
+    source = FileAudioSource(recorder, realtime=args.speed == "realtime")
+    start_cpu_time = time.process_time()
+    start_time = time.perf_counter()
+    for path in paths:
+        source.feed_file(path, corpus[path])
+    feed_time = time.perf_counter() - start_time
+
+    deadline = time.perf_counter() + DRAIN_TIMEOUT
+    while time.perf_counter() < deadline and (
+            recorder.is_recording
+            or len(transcriptions) < len(probe.stops)
+            or not all(future.done() for _, future, _ in transcriptions)):
+        time.sleep(0.05)
+    recorder_cpu_time = time.process_time() - start_cpu_time
+    recorder.shutdown()
+
+    utterances = []
+    for index, (audio_duration, future, done) in enumerate(transcriptions):
+        if index >= len(probe.starts) or not future.done() \
+                or future.cancelled() or future.exception():
+            continue
+        start_position, _ = probe.starts[index]
+        stop_position, _ = probe.stops[index]
+        path, file_start, _ = source.file_at(start_position)
+        decode_time, cpu_time = future.timings
+        utterance = {
+            "file": os.path.basename(path),
+            "text": future.result(),
+            "audio_s": audio_duration,
+            "decode_s": decode_time,
+            "worker_cpu_s": cpu_time,
+            "rtf": decode_time / audio_duration if audio_duration else None,
+            "vad_start_latency_s": None,
+            "vad_stop_latency_s": None,
+            "end_to_text_s": None,
+        }
+        if bounds[path] is not None:
+            onset, end = (file_start + bound for bound in bounds[path])
+            utterance["vad_start_latency_s"] = \
+                (start_position - onset) / SAMPLE_RATE
+            utterance["vad_stop_latency_s"] = \
+                (stop_position - end) / SAMPLE_RATE
+            end_fed_time = source.fed_time(end)
+            if source.realtime and end_fed_time is not None:
+                utterance["end_to_text_s"] = done["time"] - end_fed_time
+        utterances.append(utterance)
+
+    stream_duration = source.position / SAMPLE_RATE
+    audio_time = sum(u["audio_s"] for u in utterances)
+    summary = {
+        "files": len(paths),
+        "utterances": len(utterances),
+        "files_without_utterance": len(
+            set(os.path.basename(p) for p in paths)
+            - set(u["file"] for u in utterances)),
+        "stream_s": stream_duration,
+        "feed_s": feed_time,
+        "recorder_cpu_per_audio_s": recorder_cpu_time / stream_duration,
+        "worker_cpu_per_audio_s": (
+            sum(u["worker_cpu_s"] for u in utterances) / audio_time
+            if audio_time else None),
+    }
+    for key in ("vad_start_latency_s", "vad_stop_latency_s",
+                "end_to_text_s", "decode_s", "rtf"):
+        values = [u[key] for u in utterances if u[key] is not None]
+        if values:
+            summary[key] = {
+                "mean": float(np.mean(values)),
+                "p50": float(np.percentile(values, 50)),
+                "p90": float(np.percentile(values, 90)),
+            }
+    return {"model": model_path, "compute_type": compute_type,
+            "summary": summary, "utterances": utterances}
+
+
+def print_result(result):
+    summary = result["summary"]
+    print(f"\n{result['model']} ({result['compute_type']}): "
+          f"{summary['utterances']} utterances from {summary['files']} files "
+          f"({summary['files_without_utterance']} files without utterance), "
+          f"{summary['stream_s']:.1f} s of audio fed in "
+          f"{summary['feed_s']:.1f} s")
+    print(f"  {'':<26} {'mean':>8} {'p50':>8} {'p90':>8}")
+    for key, label in (("vad_start_latency_s", "VAD start latency (s)"),
+                       ("vad_stop_latency_s", "VAD stop latency (s)"),
+                       ("end_to_text_s", "end of speech to text (s)"),
+                       ("decode_s", "decoding (s)"),
+                       ("rtf", "real-time factor")):
+        if key in summary:
+            values = summary[key]
+            print(f"  {label:<26} {values['mean']:>8.3f} "
+                  f"{values['p50']:>8.3f} {values['p90']:>8.3f}")
+        else:
+            print(f"  {label:<26} {'-':>8} {'-':>8} {'-':>8}")
+    print(f"  CPU per second of audio: recorder "
+          f"{summary['recorder_cpu_per_audio_s']:.3f} s, transcription worker "
+          f"{summary['worker_cpu_per_audio_s'] or 0:.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Latency, real-time factor and CPU of the speech models")
+    parser.add_argument("corpus", help="folder of WAV/FLAC utterances")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS,
+                        help="model path[:compute type]")
+    parser.add_argument("--speed", choices=("realtime", "max"),
+                        default="realtime",
+                        help="feed at the pace of a microphone, or as fast "
+                             "as the recorder takes the audio")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--post-speech-silence-duration", type=float,
+                        default=0.8, help="as in module_process.py")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="transcription workers")
+    parser.add_argument("--silero-onnx", action="store_true",
+                        help="Silero VAD with ONNX Runtime")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    paths = corpus_files(args.corpus)
+    if not paths:
+        parser.error(f"no {'/'.join(AUDIO_EXTENSIONS)} file in {args.corpus}")
+
+    results = []
+    for model_spec in args.models:
+        result = run_model(model_spec, paths, args)
+        print_result(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
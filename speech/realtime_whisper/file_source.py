@@ -0,0 +1,125 @@
+"""
+Audio files (WAV, FLAC, anything PyAV reads) as the audio source of an
+AudioToTextRecorder created with use_microphone=False.
+
+The files are decoded to 16 kHz mono with faster_whisper.decode_audio and
+pushed through feed_audio in chunks of the microphone size, either at the
+pace of a microphone (realtime=True) or as fast as the recording worker
+takes them. The files follow each other in one continuous stream, separated
+by silence so that the VAD closes each utterance; the source keeps the
+position of each file in the stream and the time each chunk was fed.
+
+The silences are always fed at the pace of a microphone: the recorder
+measures post_speech_silence_duration on the clock, not on the audio.
+
+    recorder = AudioToTextRecorder(model=..., use_microphone=False)
+    source = FileAudioSource(recorder, realtime=True)
+    threading.Thread(target=source.feed_files, args=(paths,)).start()
+    while True:
+        print(recorder.text())
+"""
+
+import bisect
+import time
+import numpy as np
+import faster_whisper
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 512  # samples, as the microphone reader
+INIT_GAP_DURATION = 1.5  # s of silence after each file
+
+
+def load_audio(path):
+    """Samples of the file as 16 kHz mono int16"""
+    audio = faster_whisper.decode_audio(path, sampling_rate=SAMPLE_RATE)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+class FileAudioSource:
+    """
+    Feeds audio files to the recorder through feed_audio.
+
+    Attributes:
+        position (int): samples fed since the start of the stream.
+        files (list): (path, first sample in the stream, number of samples)
+            of the files fed.
+    """
+
+    def __init__(self, recorder, realtime=True, chunk_size=CHUNK_SIZE,
+                 gap_duration=INIT_GAP_DURATION):
+        self.recorder = recorder
+        self.realtime = realtime
+        self.chunk_size = chunk_size
+        self.gap_duration = gap_duration
+        self.position = 0
+        self.files = []
+        self.start_time = None
+        self.paced = False
+        self.feed_positions = []  # stream position after each chunk
+        self.feed_times = []      # perf_counter time of each chunk
+        self.silence = np.zeros(chunk_size, dtype=np.int16)
+
+    def feed_samples(self, samples, realtime=None):
+        """Feeds 16 kHz int16 samples, at the pace of a microphone if
+        realtime (default: the mode of the source)"""
+        if realtime is None:
+            realtime = self.realtime
+        if self.start_time is None or not (realtime and self.paced):
+            # clock of the stream, from the current position
+            self.start_time = time.perf_counter() - \
+                self.position / SAMPLE_RATE
+        self.paced = realtime
+        for start in range(0, len(samples), self.chunk_size):
+            chunk = samples[start:start + self.chunk_size]
+            if realtime:
+                # a microphone delivers a chunk once it is recorded
+                due = self.start_time + \
+                    (self.position + len(chunk)) / SAMPLE_RATE
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                # stay under the latency limit of the recorder, beyond which
+                # it drops the oldest chunks (handle_buffer_overflow)
+                while self.recorder.audio_ring.pending() >= \
+                        self.recorder.allowed_latency_limit:
+                    time.sleep(0.002)
+            self.recorder.feed_audio(chunk.tobytes())
+            self.position += len(chunk)
+            self.feed_positions.append(self.position)
+            self.feed_times.append(time.perf_counter())
+
+    def feed_silence(self, duration):
+        chunks = int(duration * SAMPLE_RATE) // self.chunk_size
+        for _ in range(chunks):
+            self.feed_samples(self.silence, realtime=True)
+
+    def feed_file(self, path, samples=None):
+        """Feeds a file followed by gap_duration of silence, returns its
+        first sample in the stream"""
+        if samples is None:
+            samples = load_audio(path)
+        start = self.position
+        self.files.append((path, start, len(samples)))
+        self.feed_samples(samples)
+        self.feed_silence(self.gap_duration)
+        return start
+
+    def feed_files(self, paths):
+        for path in paths:
+            self.feed_file(path)
+
+    def fed_time(self, position):
+        """perf_counter time at which the sample "position" of the stream
+        was fed, None if not fed yet"""
+        index = bisect.bisect_left(self.feed_positions, position)
+        if index >= len(self.feed_times):
+            return None
+        return self.feed_times[index]
+
+    def file_at(self, position):
+        """(path, first sample, number of samples) of the file containing
+        or preceding the sample "position" of the stream"""
+        starts = [start for _, start, _ in self.files]
+        index = bisect.bisect_right(starts, position) - 1
+        return self.files[index] if index >= 0 else None
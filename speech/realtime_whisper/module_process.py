@@ -7,7 +7,6 @@ Created on Wed May 15 12:09:23 2024
 
 import customtkinter
 import json
-from realtime_whisper import SpeechToText
 
 import os
 import sys
@@ -29,6 +28,7 @@ def get_modules_folder_dir():
 modules_folder_dir = get_modules_folder_dir()
 sys.path.append(modules_folder_dir)
 from UDPClient import UDPClient
+from realtime_whisper import SpeechToText  # imports Tracing from the modules folder
 
 ### To have the whiteboard ip ###
 ip_witeboard_file = os.path.join(modules_folder_dir, 'IP_whiteboard.txt')
@@ -47,7 +47,8 @@ class App(customtkinter.CTk):
         # We no longer read from a config file. The value is now hard-coded.
         self.config = {
             "input_device_name": "Analogue 7 + 8",
-            "post_speech_silence_duration" : 0.8
+            "post_speech_silence_duration" : 0.8,
+            "transcription_workers": 2
         }
             
         self.subscribes = ["AGENT_PLAYER_STATUS", "COMMON"]
@@ -6,10 +6,15 @@ Created on Fri May  3 17:27:25 2024
 """
 
 from audio_recorder import AudioToTextRecorder
+from Tracing import LatencyTracer, new_trace_id, attach_trace
 
+import itertools
+import functools
 import threading
 import pyaudio
 
+MODULE_FULL_NAME = 'SPEECH/REALTIME_WHISPER'
+
 
 def get_index_audio_device(name):
     """ Get the index of an audio device using its name
@@ -32,6 +37,8 @@ class SpeechToText():
         self.model_path = "models/whisper_small_en_ct_32"
         self.results_topic = "USER_FULL_SENTENCE_PERCEPTION"
         self.udp_client = udp_client
+        self.tracer = LatencyTracer(udp_client, MODULE_FULL_NAME)
+        self.trace_id = None
 
         self.input_device_index = get_index_audio_device(config["input_device_name"])
         self.recorder = AudioToTextRecorder(
@@ -43,15 +50,23 @@ class SpeechToText():
             webrtc_sensitivity=2,
             post_speech_silence_duration=config["post_speech_silence_duration"],
             min_gap_between_recordings=0,
+            transcription_workers=config.get("transcription_workers", 1),
 
             # funzionano al contrario, non so perché
             on_vad_detect_start=self.on_user_stop_speaking, 
             on_vad_detect_stop=self.on_user_start_speaking,
+            on_recording_stop=self.on_voice_deactivity,
             enable_realtime_transcription=True,
             on_realtime_transcription_update=self.on_partial_text
         )
 
-        self.user_full_sentence = None
+        # frasi trascritte: indice della registrazione -> (frase, trace_id).
+        # I worker finiscono in qualsiasi ordine, update() le pubblica
+        # nell'ordine delle registrazioni
+        self.user_full_sentences = dict()
+        self.user_full_sentences_lock = threading.Lock()
+        self.sentence_indexes = itertools.count()
+        self.next_sentence_index = 0
         self.receive_text_thread = threading.Thread(target=self.receive_full_sentence)
         self.receive_text_thread.daemon = True
         self.receive_text_thread.start()
@@ -66,6 +81,11 @@ class SpeechToText():
         self.udp_client.send("USER_STATUS:STOP_SPEAKING")
         print("[DEBUG] Utente ha smesso di parlare")
 
+    # 🔹 Fine del parlato rilevata: inizio della traccia di latenza del turno
+    def on_voice_deactivity(self):
+        self.trace_id = new_trace_id()
+        self.tracer.stage(self.trace_id, "vad_stop", self.recorder.recording_stop_time)
+
     # 🔹 Testo parziale in tempo reale
     def on_partial_text(self, text):
         self.udp_client.send(f"USER_PARTIAL:{text}")
@@ -76,27 +96,45 @@ class SpeechToText():
         
     def receive_full_sentence(self):
         while True:
-            self.recorder.text(self.process_full_sentence)
-
-    def process_full_sentence(self, user_full_sentence):
-        user_full_sentence = user_full_sentence.strip()
-        if user_full_sentence:
-            self.user_full_sentence = user_full_sentence
-        else:
-            self.user_full_sentence = None  
-        
+            # la trascrizione continua nel pool di worker mentre si registra
+            # la frase successiva: la traccia del turno è fissata adesso
+            # (on_voice_deactivity) e accompagna il risultato
+            future = self.recorder.transcribe_next()
+            if self.recorder.is_shut_down:
+                return
+            if future is None:
+                continue  # attesa interrotta (abort) o registrazione vuota
+            future.add_done_callback(functools.partial(
+                self.process_full_sentence, next(self.sentence_indexes), self.trace_id))
+
+    def process_full_sentence(self, index, trace_id, future):
+        try:
+            user_full_sentence = future.result().strip()
+            self.tracer.stage(trace_id, "stt_done")
+        except Exception as e:
+            print("[ERRORE] Trascrizione fallita:", e)
+            user_full_sentence = ""  # il suo posto nell'ordine va liberato
+        with self.user_full_sentences_lock:
+            self.user_full_sentences[index] = (user_full_sentence, trace_id)
+
     def update(self):
         """ Is called by the interface update function and sends the new user sentences 
         to others modules
         """
-        if self.user_full_sentence is not None:
-            user_full_sentence = self.user_full_sentence
-            self.udp_client.send(f"{self.results_topic}:{user_full_sentence}")
-            self.user_full_sentence = None
-            
-            return user_full_sentence
-        
-        return None
+        with self.user_full_sentences_lock:
+            # una frase breve finita prima di quella lunga che la precede aspetta
+            while self.next_sentence_index in self.user_full_sentences:
+                user_full_sentence, trace_id = self.user_full_sentences.pop(self.next_sentence_index)
+                self.next_sentence_index += 1
+                if user_full_sentence:
+                    break
+            else:
+                return None
+
+        self.udp_client.send(f"{self.results_topic}:{attach_trace(user_full_sentence, trace_id)}")
+        self.tracer.stage(trace_id, "sentence_sent")
+
+        return user_full_sentence
             
         
     def close(self):
@@ -0,0 +1,341 @@
+"""
+Voice activity detection front-end of AudioToTextRecorder.
+
+Each chunk is prepared once (prepare()), whichever check asks first:
+  - resampled to 16 kHz if needed, with a low-pass filter designed once,
+  - cut in 10 ms frames whose energy is computed in one vectorized pass.
+Only the frames louder than the energy gate go to WebRTC (and Silero after it):
+during a silence no frame passes the gate and no VAD model is called.
+
+SileroVad runs Silero in a thread of its own: the chunks submitted while an
+inference runs are evaluated together in the next call, with the ONNX Runtime
+session of the model called directly (numpy in and out) when it is loaded with
+onnx=True.
+"""
+
+import collections
+import threading
+import logging
+import time
+import numpy as np
+from math import gcd
+from scipy import signal
+
+VAD_SAMPLE_RATE = 16000
+FRAME_LENGTH = VAD_SAMPLE_RATE // 100  # 10 ms frames for WebRTC
+INT16_MAX_ABS_VALUE = 32768.0
+INIT_ENERGY_THRESHOLD = -50.0  # dBFS, None to disable the energy gate
+
+
+class VadFrontEnd:
+    """
+    Prepares the audio chunks for the VAD models and answers the WebRTC
+    checks. The buffers are reused from one chunk to the next: the arrays
+    returned by float_audio() are only valid until the next chunk is prepared.
+    """
+
+    def __init__(self, webrtc_vad_model, sample_rate=VAD_SAMPLE_RATE,
+                 energy_threshold=INIT_ENERGY_THRESHOLD, debug_mode=False):
+        self.webrtc_vad_model = webrtc_vad_model
+        self.sample_rate = sample_rate
+        self.debug_mode = debug_mode
+        self.set_energy_threshold(energy_threshold)
+
+        self.resample_filter = None
+        if sample_rate != VAD_SAMPLE_RATE:
+            divisor = gcd(VAD_SAMPLE_RATE, sample_rate)
+            self.up = VAD_SAMPLE_RATE // divisor
+            self.down = sample_rate // divisor
+            # same filter as signal.resample_poly, designed once
+            max_rate = max(self.up, self.down)
+            self.resample_filter = signal.firwin(
+                2 * 10 * max_rate + 1, 1. / max_rate, window=('kaiser', 5.0))
+
+        self.chunk = None  # chunk prepared last
+        self.pcm_bytes = b""
+        self.samples = np.empty(0, dtype=np.float32)
+        self.gate = np.empty(0, dtype=bool)
+        self.num_frames = 0
+        self.gated_chunks = 0  # chunks without any frame above the gate
+
+    def set_energy_threshold(self, energy_threshold):
+        """Energy gate in dBFS (mean power of a 10 ms frame), None: no gate"""
+        self.energy_threshold = energy_threshold
+        self.power_threshold = (0.0 if energy_threshold is None
+                                else 10 ** (energy_threshold / 10))
+
+    def prepare(self, chunk):
+        """Resamples the chunk and computes the energy gate of its frames,
+        once per chunk"""
+        if chunk is self.chunk:
+            return
+        pcm = np.frombuffer(chunk, dtype=np.int16)
+        if self.resample_filter is not None:
+            pcm = signal.resample_poly(pcm, self.up, self.down,
+                                       window=self.resample_filter)
+            pcm = np.clip(pcm, -INT16_MAX_ABS_VALUE, INT16_MAX_ABS_VALUE - 1)
+            pcm = pcm.astype(np.int16)
+            self.pcm_bytes = pcm.tobytes()
+        else:
+            self.pcm_bytes = chunk
+
+        if len(self.samples) != len(pcm):
+            self.samples = np.empty(len(pcm), dtype=np.float32)
+        np.multiply(pcm, 1 / INT16_MAX_ABS_VALUE, out=self.samples,
+                    casting='unsafe')
+
+        self.num_frames = len(pcm) // FRAME_LENGTH
+        frames = self.samples[:self.num_frames * FRAME_LENGTH].reshape(
+            self.num_frames, FRAME_LENGTH)
+        power = np.einsum('ij,ij->i', frames, frames) / FRAME_LENGTH
+        self.gate = power > self.power_threshold
+        self.chunk = chunk
+
+    def float_audio(self, chunk):
+        """16 kHz float32 samples of the chunk (reused buffer)"""
+        self.prepare(chunk)
+        return self.samples
+
+    def is_loud(self, chunk):
+        """True if a frame of the chunk is above the energy gate"""
+        self.prepare(chunk)
+        return bool(self.gate.any())
+
+    def is_webrtc_speech(self, chunk, all_frames_must_be_true=False):
+        """
+        Returns true if WebRTC detects speech in a frame of the chunk (or in
+        all its frames). The frames below the energy gate count as silence
+        without calling WebRTC.
+        """
+        self.prepare(chunk)
+        num_frames = self.num_frames
+        gate = self.gate
+
+        if all_frames_must_be_true:
+            if not gate.all():
+                if self.debug_mode:
+                    print(f"Speech not detected in all {num_frames} frames"
+                          " (energy gate)")
+                return False
+        elif not gate.any():
+            self.gated_chunks += 1
+            if self.debug_mode:
+                print(f"Speech not detected in any of {num_frames} frames"
+                      " (energy gate)")
+            return False
+
+        frame_bytes = 2 * FRAME_LENGTH
+        speech_frames = 0
+        for i in np.flatnonzero(gate):
+            start_byte = i * frame_bytes
+            frame = self.pcm_bytes[start_byte:start_byte + frame_bytes]
+            if self.webrtc_vad_model.is_speech(frame, VAD_SAMPLE_RATE):
+                speech_frames += 1
+                if not all_frames_must_be_true:
+                    if self.debug_mode:
+                        print(f"Speech detected in frame {i + 1}"
+                              f" of {num_frames}")
+                    return True
+            elif all_frames_must_be_true:
+                break  # one frame without speech is enough
+        if all_frames_must_be_true:
+            if self.debug_mode and speech_frames == num_frames:
+                print(f"Speech detected in {speech_frames} of "
+                      f"{num_frames} frames")
+            elif self.debug_mode:
+                print(f"Speech not detected in all {num_frames} frames")
+            return speech_frames == num_frames
+        if self.debug_mode:
+            print(f"Speech not detected in any of {num_frames} frames")
+        return False
+
+
+SILERO_WINDOW = 512  # samples per inference of Silero VAD v5 at 16 kHz
+SILERO_CONTEXT = 64  # samples of the previous window prepended by v5
+SILERO_MAX_PENDING = 16  # chunks, the oldest are dropped beyond
+
+
+class SileroVad:
+    """
+    Silero VAD service. submit() queues a chunk (float32 at 16 kHz) and
+    returns at once, a worker thread evaluates all the pending chunks in one
+    call and gives their speech probabilities to on_result.
+
+    Silero is recurrent: the chunks of a stream are evaluated in order with
+    the state carried from one window to the next, they cannot share the
+    batch axis of the model. The batch saves the thread wake-up, the tensor
+    conversions and the dispatch per chunk.
+
+    clear() starts a new generation: the results of the chunks submitted
+    before it, even those of a call already running, are dropped.
+    """
+
+    def __init__(self, model, use_onnx=False, on_result=None,
+                 max_pending=SILERO_MAX_PENDING):
+        self.model = model
+        self.on_result = on_result
+        self.max_pending = max_pending
+
+        # ONNX Runtime session of the silero OnnxWrapper, called directly
+        self.session = getattr(model, "session", None) if use_onnx else None
+        if self.session is not None:
+            inputs = {i.name for i in self.session.get_inputs()}
+            self.stateful_v5 = "state" in inputs  # v4 has h and c
+            if not self.stateful_v5 and not {"h", "c"} <= inputs:
+                raise ValueError(f"Unknown Silero ONNX model inputs {inputs}")
+            self.sample_rate = np.array(VAD_SAMPLE_RATE, dtype=np.int64)
+            self.window = np.zeros((1, SILERO_CONTEXT + SILERO_WINDOW),
+                                   dtype=np.float32)
+        self.reset_states()
+
+        self.pending = collections.deque(maxlen=max_pending)
+        self.condition = threading.Condition()
+        self.working = False
+        self.running = True
+        self.reset_requested = False
+        self.generation = 0  # incremented by clear()
+        self.dropped = 0  # chunks pushed out of a full queue
+        self.stale_results = 0  # calls whose result was dropped by clear()
+
+        # (chunks, seconds of audio, seconds of inference) per call
+        self.timings = collections.deque(maxlen=1000)
+        self.last_call_time = 0.0
+
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def reset_states(self):
+        """Forgets the audio seen so far (start of a new utterance)"""
+        if self.session is None:
+            self.model.reset_states()
+        elif self.stateful_v5:
+            self.state = np.zeros((2, 1, 128), dtype=np.float32)
+            self.window[:] = 0
+        else:
+            self.h = np.zeros((2, 1, 64), dtype=np.float32)
+            self.c = np.zeros((2, 1, 64), dtype=np.float32)
+
+    def probabilities(self, chunks):
+        """
+        Speech probability of each chunk (float32 samples at 16 kHz), in
+        one call. A chunk longer than a Silero window gets the highest
+        probability of its windows.
+        """
+        start = time.perf_counter()
+        if self.session is None:
+            import torch
+            with torch.inference_mode():
+                result = [self._torch_probability(torch, chunk)
+                          for chunk in chunks]
+        elif self.stateful_v5:
+            result = [self._v5_probability(chunk) for chunk in chunks]
+        else:
+            result = [self._v4_probability(chunk) for chunk in chunks]
+
+        self.last_call_time = time.perf_counter() - start
+        audio_time = sum(len(chunk) for chunk in chunks) / VAD_SAMPLE_RATE
+        self.timings.append((len(chunks), audio_time, self.last_call_time))
+        return np.array(result, dtype=np.float32)
+
+    def _torch_probability(self, torch, chunk):
+        windows = len(chunk) // SILERO_WINDOW
+        if windows == 0:
+            return self.model(torch.from_numpy(chunk), VAD_SAMPLE_RATE).item()
+        # the jit model takes SILERO_WINDOW samples (v5)
+        windows = torch.from_numpy(
+            chunk[:windows * SILERO_WINDOW].reshape(windows, SILERO_WINDOW))
+        return max(self.model(window, VAD_SAMPLE_RATE).item()
+                   for window in windows)
+
+    def _v5_probability(self, chunk):
+        probability = 0.0
+        for start in range(0, len(chunk) - SILERO_WINDOW + 1, SILERO_WINDOW):
+            self.window[0, SILERO_CONTEXT:] = chunk[start:start + SILERO_WINDOW]
+            out, self.state = self.session.run(
+                None, {"input": self.window, "state": self.state,
+                       "sr": self.sample_rate})
+            # the end of this window is the context of the next one
+            self.window[0, :SILERO_CONTEXT] = self.window[0, -SILERO_CONTEXT:]
+            probability = max(probability, float(out[0, 0]))
+        return probability
+
+    def _v4_probability(self, chunk):
+        out, self.h, self.c = self.session.run(
+            None, {"input": chunk[np.newaxis], "h": self.h, "c": self.c,
+                   "sr": self.sample_rate})
+        return float(out[0, 0])
+
+    def submit(self, samples):
+        """Queues a copy of the samples for the worker, returns at once"""
+        with self.condition:
+            if len(self.pending) == self.max_pending:
+                self.dropped += 1
+            self.pending.append(np.array(samples, dtype=np.float32))
+            self.condition.notify()
+
+    def clear(self):
+        """Drops the pending chunks and the result of the call in progress,
+        and resets the state"""
+        with self.condition:
+            self.pending.clear()
+            self.generation += 1
+            # the worker resets the state between two calls
+            self.reset_requested = True
+            self.condition.notify()
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending \
+                        and not self.reset_requested:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                if self.reset_requested:
+                    self.reset_states()
+                    self.reset_requested = False
+                chunks = list(self.pending)
+                self.pending.clear()
+                generation = self.generation
+                self.working = bool(chunks)
+            if not chunks:
+                continue
+            try:
+                probabilities = self.probabilities(chunks)
+                logging.debug(f"Silero VAD: {len(chunks)} chunks in "
+                              f"{self.last_call_time * 1000:.2f} ms")
+                with self.condition:
+                    # under the lock: clear() can't run between the check
+                    # and the result
+                    if generation != self.generation:
+                        self.stale_results += 1
+                    elif self.on_result:
+                        self.on_result(probabilities)
+            except Exception as e:
+                logging.error(f"Silero VAD inference error: {e}")
+            finally:
+                self.working = False
+
+    def stats(self):
+        """Calls, chunks, audio and inference time of the last calls, and the
+        inference time per second of audio"""
+        calls = len(self.timings)
+        chunks = sum(t[0] for t in self.timings)
+        audio_time = sum(t[1] for t in self.timings)
+        inference_time = sum(t[2] for t in self.timings)
+        return {
+            "calls": calls,
+            "chunks": chunks,
+            "dropped": self.dropped,
+            "stale_results": self.stale_results,
+            "audio_s": audio_time,
+            "inference_s": inference_time,
+            "inference_per_audio_s": (inference_time / audio_time
+                                      if audio_time else 0.0),
+        }
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout=1)
@@ -89,7 +89,9 @@ int main()
         //---- receive and display request and source address/port ----
         n = recvfrom(sock, buff, BUFF_LEN, 0, (struct sockaddr*)&from, &fromlen);
         
-        std::string request = std::string(buff);
+        if (n < 0) continue;
+        // n bytes: the framed protocol of UDPClient.py may contain '\0' bytes
+        std::string request = std::string(buff, n);
         std::cout << request <<"\n";
 
         if (request.substr(0, 10).compare("Subscribe:") == 0) {// check for "Subscribe:" at the start of the request
@@ -146,7 +148,7 @@ int main()
         // Write in the log file
         tmm = time(0);
         tm* ltm = localtime(&tmm);
-        file << "<" << ltm->tm_hour << ":" << ltm->tm_min << ":" << ltm->tm_sec << " n:" << nMessage << " From" << " port:" << from.sin_port << " >\"" << buff << "\"" << std::endl;
+        file << "<" << ltm->tm_hour << ":" << ltm->tm_min << ":" << ltm->tm_sec << " n:" << nMessage << " From" << " port:" << from.sin_port << " >\"" << request << "\"" << std::endl;
         nMessage = nMessage + 1;
     }
 
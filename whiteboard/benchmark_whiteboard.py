@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the Python WhiteBoard (whiteboard.py): messages/s and fan-out latency.
+
+The WhiteBoard runs in its own process, the publisher and the subscribers run in this
+process so that send and receive times come from the same clock.
+The fan-out latency of a message is the time between its sending and its reception
+by the last subscriber.
+
+Usage : python benchmark_whiteboard.py [--subscribers 1 5 10 25 50] [--messages 2000] [--size 200]
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import selectors
+import subprocess
+
+TOPIC = b"BENCHMARK"  # a topic per run, the sockets of the previous runs stay subscribed
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_whiteboard(port):
+    whiteboard_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "whiteboard.py")
+    process = subprocess.Popen([sys.executable, whiteboard_path, "--host", "127.0.0.1", "--port", str(port)],
+                               stdout=subprocess.DEVNULL)
+    # wait until the WhiteBoard answers
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    probe.settimeout(0.1)
+    for _ in range(100):
+        probe.sendto(b"Subscribe:PING", ("127.0.0.1", port))
+        probe.sendto(b"PING:", ("127.0.0.1", port))
+        try:
+            probe.recvfrom(100)
+            break
+        except OSError:
+            time.sleep(0.05)
+    else:
+        process.kill()
+        raise RuntimeError("the WhiteBoard did not start")
+    probe.close()
+    return process
+
+
+def make_subscribers(n, port, topic):
+    subscribers = []
+    for _ in range(n):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        s.bind(("127.0.0.1", 0))
+        s.setblocking(False)
+        s.sendto(b"Subscribe:" + topic, ("127.0.0.1", port))
+        subscribers.append(s)
+    time.sleep(0.1)
+    return subscribers
+
+
+def receive(selector, deliveries, last_reception, timeout):
+    """Reads the pending datagrams, returns False if nothing arrived before the timeout"""
+    events = selector.select(timeout)
+    for key, _ in events:
+        s = key.fileobj
+        while True:
+            try:
+                data = s.recv(65535)
+            except BlockingIOError:
+                break
+            now = time.perf_counter_ns()
+            seq = int(data[data.index(b":")+1:data.index(b";")])
+            deliveries[seq] = deliveries.get(seq, 0) + 1
+            last_reception[seq] = now
+    return bool(events)
+
+
+def run(n_subscribers, n_messages, size, port):
+    publisher = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    publisher.connect(("127.0.0.1", port))
+    topic = TOPIC + b"_" + str(n_subscribers).encode()
+    subscribers = make_subscribers(n_subscribers, port, topic)
+    selector = selectors.DefaultSelector()
+    for s in subscribers:
+        selector.register(s, selectors.EVENT_READ)
+    padding = b"x" * size
+
+    # Latency: one message at a time, the next one is sent when all subscribers got it
+    deliveries, last_reception, send_time = dict(), dict(), dict()
+    for seq in range(n_messages):
+        send_time[seq] = time.perf_counter_ns()
+        publisher.send(topic + b":" + str(seq).encode() + b";" + padding)
+        while deliveries.get(seq, 0) < n_subscribers:
+            if not receive(selector, deliveries, last_reception, 0.5):
+                break
+    latencies = sorted((last_reception[seq] - send_time[seq]) / 1000
+                       for seq in range(n_messages) if deliveries.get(seq, 0) == n_subscribers)
+
+    # Throughput: bursts of messages, the publisher waits for the end of a burst
+    burst = max(1, min(200, 2000 // n_subscribers))
+    deliveries, last_reception = dict(), dict()
+    t0 = time.perf_counter()
+    for start in range(0, n_messages, burst):
+        for seq in range(start, min(start + burst, n_messages)):
+            publisher.send(topic + b":" + str(seq).encode() + b";" + padding)
+        while sum(deliveries.values()) < min(start + burst, n_messages) * n_subscribers:
+            if not receive(selector, deliveries, last_reception, 0.2):
+                break
+    duration = time.perf_counter() - t0
+    n_delivered = sum(deliveries.values())
+
+    for s in subscribers:
+        selector.unregister(s)
+        s.close()
+    publisher.close()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else float("nan")
+
+    return {
+        "subscribers": n_subscribers,
+        "messages_per_s": n_messages / duration,
+        "deliveries_per_s": n_delivered / duration,
+        "lost": n_messages * n_subscribers - n_delivered,
+        "p50_us": percentile(0.50),
+        "p99_us": percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the Python WhiteBoard")
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=200, help="payload size in bytes")
+    args = parser.parse_args()
+
+    port = free_port()
+    whiteboard = start_whiteboard(port)
+    try:
+        print(f"{'subscribers':>11} {'msg/s':>10} {'deliveries/s':>13} {'lost':>6} {'p50 (us)':>9} {'p99 (us)':>9}")
+        for n in args.subscribers:
+            r = run(n, args.messages, args.size, port)
+            print(f"{r['subscribers']:>11} {r['messages_per_s']:>10.0f} {r['deliveries_per_s']:>13.0f} "
+                  f"{r['lost']:>6} {r['p50_us']:>9.0f} {r['p99_us']:>9.0f}")
+    finally:
+        whiteboard.terminate()
+        whiteboard.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+Record and replay of the messages of the WhiteBoard, to reproduce a real session
+(microphone, webcam, LLM, Unity) without the live modules.
+
+    python bus_recorder.py topics
+    python bus_recorder.py record session.acabus [--ip 127.0.0.1] [--topics ...]
+    python bus_recorder.py info session.acabus
+    python bus_recorder.py replay session.acabus [--speed 4] [--topics ...] [--exclude ...] [--whiteboard]
+
+By default the recorder subscribes to every topic of the modules: the subscription lists
+(SUBSCRIPTIONS of the decider, "subscribes" of the other modules) and the topics they send,
+read with ast from the sources so that no module is imported.
+
+The datagrams are recorded as received (framed messages included), in an append-only
+binary log: a header line, then for each datagram its time since the start of the record (ns),
+its length and its bytes. A record interrupted by a crash stays readable up to the last
+complete datagram.
+"""
+
+import os
+import re
+import ast
+import json
+import time
+import socket
+import struct
+import argparse
+from collections import Counter
+
+from whiteboard import SERVER_PORT
+
+MAGIC = b"ACABUS1\n"
+RECORD = struct.Struct("<QI")  # time since the start of the record (ns), datagram length
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+FLUSH_INTERVAL = 0.5  # s, the log is flushed at least this often
+SUBSCRIBE_INTERVAL = 1.0  # s, the subscriptions are sent again until the first message
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUBSCRIPTION_NAMES = {"SUBSCRIPTIONS", "subscribes"}
+TOPIC_PREFIX = re.compile(r"^([A-Z][A-Z0-9_]+):")
+TOPIC_NAME = re.compile(r"^[A-Z][A-Z0-9_]+$")
+
+
+### Topics of the modules ###
+
+def target_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def module_topics(repository_dir=REPOSITORY_DIR):
+    """Topics subscribed or sent by the modules of the repository, found in the sources:
+    lists assigned to SUBSCRIPTIONS / subscribes, *_TOPIC and *_topic string constants,
+    and the "TOPIC:" prefixes of the strings given to send()
+    """
+    trees = []
+    for root, dirs, files in os.walk(repository_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d not in ("__pycache__", "whiteboard")]
+        for name in files:
+            if name.endswith(".py"):
+                try:
+                    with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+                        trees.append(ast.parse(f.read()))
+                except (SyntaxError, UnicodeDecodeError, OSError):
+                    continue
+
+    constants = dict()  # name -> value of the string constants, to resolve e.g. TRACE_TOPIC
+    topics = set()
+    for tree in trees:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) \
+                    and isinstance(node.value.value, str):
+                for target in node.targets:
+                    name = target_name(target)
+                    if name:
+                        constants[name] = node.value.value
+                        if name.lower().endswith("_topic") and TOPIC_NAME.match(node.value.value):
+                            topics.add(node.value.value)
+
+    for tree in trees:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign) and isinstance(node.value, (ast.List, ast.Tuple)) \
+                    and any(target_name(t) in SUBSCRIPTION_NAMES for t in node.targets):
+                for element in node.value.elts:
+                    if isinstance(element, ast.Constant) and isinstance(element.value, str):
+                        topics.add(element.value)
+                    elif isinstance(element, ast.Name) and element.id in constants:
+                        topics.add(constants[element.id])
+            elif isinstance(node, ast.Call) and target_name(node.func) == "send" and node.args:
+                first = node.args[0]
+                if isinstance(first, ast.JoinedStr) and first.values:
+                    first = first.values[0]
+                if isinstance(first, ast.Constant) and isinstance(first.value, str):
+                    match = TOPIC_PREFIX.match(first.value)
+                    if match:
+                        topics.add(match.group(1))
+    topics.discard("Subscribe")
+    return sorted(topics)
+
+
+### Log ###
+
+def write_header(f, metadata):
+    f.write(MAGIC)
+    f.write(json.dumps(metadata).encode("utf-8") + b"\n")
+
+
+def read_log(path):
+    """Returns (metadata, iterator of (time since the start in s, datagram))"""
+    f = open(path, "rb")
+    if f.read(len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError(f"{path} is not a bus record")
+    metadata = json.loads(f.readline())
+
+    def records():
+        with f:
+            while True:
+                header = f.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    return
+                t_ns, length = RECORD.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    return  # record interrupted in the middle of a datagram
+                yield t_ns / 1e9, data
+    return metadata, records()
+
+
+def datagram_topic(data):
+    end = data.find(b":")
+    return data[:end].decode("utf-8", "replace") if end > 0 else ""
+
+
+### Record ###
+
+def subscribe(s, topics):
+    try:
+        for topic in topics:
+            s.send(f"Subscribe:{topic}".encode("utf-8"))
+    except OSError:
+        pass  # ICMP port unreachable of a previous send: the WhiteBoard is not started yet
+
+
+def record(path, ip, port, topics, duration=None):
+    """Records the topics until Ctrl+C or "duration" seconds. The recorder may be started
+    before the WhiteBoard: the subscriptions are sent again until a message arrives.
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+    s.connect((ip, port))
+    subscribe(s, topics)
+    last_subscribe = time.monotonic()
+    subscribed = False  # True once a message arrived
+    s.settimeout(min(FLUSH_INTERVAL, SUBSCRIBE_INTERVAL))
+
+    counts = Counter()
+    start_ns = time.monotonic_ns()
+    with open(path, "xb") as f:  # one record per file, the times are relative to its start
+        write_header(f, {"started": time.time(), "whiteboard": f"{ip}:{port}", "topics": topics})
+        print(f"Recording {len(topics)} topics to {path} (Ctrl+C to stop)")
+        last_flush = time.monotonic()
+        try:
+            while duration is None or time.monotonic_ns() - start_ns < duration * 1e9:
+                try:
+                    data = s.recv(65535)
+                except socket.timeout:
+                    data = None
+                except OSError:
+                    # ICMP port unreachable (ConnectionRefusedError on Linux, ConnectionResetError
+                    # on Windows): the WhiteBoard is not started yet
+                    data = None
+                    time.sleep(0.1)
+                if not subscribed and data is None \
+                        and time.monotonic() - last_subscribe >= SUBSCRIBE_INTERVAL:
+                    subscribe(s, topics)
+                    last_subscribe = time.monotonic()
+                if data is not None:
+                    subscribed = True
+                    f.write(RECORD.pack(time.monotonic_ns() - start_ns, len(data)))
+                    f.write(data)
+                    counts[datagram_topic(data)] += 1
+                if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                    f.flush()
+                    last_flush = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+    s.close()
+    print(f"{sum(counts.values())} messages recorded")
+    for topic, count in counts.most_common():
+        print(f"  {topic:<32} {count}")
+
+
+### Replay ###
+
+def replay(path, ip, port, speed=1.0, topics=None, exclude=()):
+    """Sends the recorded datagrams to the WhiteBoard, "speed" times faster than recorded
+    (0: as fast as possible). Returns the lag of the sends behind their schedule (s).
+    """
+    metadata, records = read_log(path)
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.connect((ip, port))
+    lags = []
+    counts = Counter()
+    start = time.perf_counter()
+    first = last = None
+    for t, data in records:
+        topic = datagram_topic(data)
+        if (topics and topic not in topics) or topic in exclude:
+            continue
+        if first is None:
+            first = t  # the replay starts with the first selected message
+        last = t
+        if speed > 0:
+            due = start + (t - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lags.append(time.perf_counter() - due)
+        try:
+            s.send(data)
+        except ConnectionRefusedError:
+            pass  # ICMP port unreachable of a previous send
+        counts[topic] += 1
+    s.close()
+
+    duration = time.perf_counter() - start
+    recorded = last - first if first is not None else 0.0
+    print(f"{sum(counts.values())} messages replayed in {duration:.1f} s (recorded over {recorded:.1f} s)")
+    for topic, count in counts.most_common():
+        print(f"  {topic:<32} {count}")
+    if lags:
+        lags.sort()
+        print(f"Send lag: p50 {lags[len(lags) // 2] * 1000:.2f} ms, max {lags[-1] * 1000:.2f} ms")
+    return lags
+
+
+def info(path):
+    metadata, records = read_log(path)
+    counts, sizes = Counter(), Counter()
+    last = 0.0
+    for t, data in records:
+        topic = datagram_topic(data)
+        counts[topic] += 1
+        sizes[topic] += len(data)
+        last = t
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(metadata["started"]))
+    print(f"Record of {started}, whiteboard {metadata['whiteboard']}, {last:.1f} s, "
+          f"{sum(counts.values())} messages ({os.path.getsize(path) / 1e6:.2f} MB)")
+    print(f"  {'topic':<32} {'messages':>8} {'msg/s':>7} {'bytes':>10}")
+    for topic, count in counts.most_common():
+        print(f"  {topic:<32} {count:>8} {count / last if last else 0:>7.1f} {sizes[topic]:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay of the WhiteBoard messages")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("topics", help="print the topics of the modules")
+
+    record_parser = subparsers.add_parser("record", help="record the messages of the WhiteBoard")
+    record_parser.add_argument("log")
+    record_parser.add_argument("--topics", nargs="+", help="default: the topics of the modules")
+    record_parser.add_argument("--duration", type=float, help="stop after this duration (s)")
+
+    replay_parser = subparsers.add_parser("replay", help="send a record to the WhiteBoard")
+    replay_parser.add_argument("log")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="acceleration, 0 for no delay")
+    replay_parser.add_argument("--topics", nargs="+", help="replay only these topics")
+    replay_parser.add_argument("--exclude", nargs="+", default=[], help="topics not replayed")
+    replay_parser.add_argument("--whiteboard", action="store_true", help="start a local Python WhiteBoard")
+
+    info_parser = subparsers.add_parser("info", help="summary of a record")
+    info_parser.add_argument("log")
+
+    for subparser in (record_parser, replay_parser):
+        subparser.add_argument("--ip", default="127.0.0.1", help="ip of the WhiteBoard")
+        subparser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    if args.command == "topics":
+        print("\n".join(module_topics()))
+    elif args.command == "record":
+        record(args.log, args.ip, args.port, args.topics or module_topics(), args.duration)
+    elif args.command == "info":
+        info(args.log)
+    else:
+        whiteboard = None
+        if args.whiteboard:
+            from benchmark_whiteboard import start_whiteboard
+            whiteboard = start_whiteboard(args.port)
+        try:
+            replay(args.log, args.ip, args.port, args.speed, set(args.topics or ()), set(args.exclude))
+        finally:
+            if whiteboard is not None:
+                whiteboard.terminate()
+                whiteboard.wait()
+
+
+if __name__ == "__main__":
+    main()
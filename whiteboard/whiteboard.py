@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Python version of the WhiteBoard (whiteboard/WhiteBoard/WhiteBoard.cpp), runs on Linux and Windows.
+
+Same protocol as the C++ WhiteBoard:
+    "Subscribe:TOPIC"  -> the sender receives the following messages of TOPIC
+    "TOPIC:payload"    -> the datagram is forwarded as is to all the subscribers of TOPIC
+
+Usage : python whiteboard.py [--host 0.0.0.0] [--port 11000] [--verbose] [--log log.txt]
+"""
+
+import time
+import socket
+import asyncio
+import argparse
+
+SERVER_PORT = 11000
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024  # absorbs the bursts of messages
+SUBSCRIBE_PREFIX = b"Subscribe:"
+
+
+class WhiteBoardProtocol(asyncio.DatagramProtocol):
+    def __init__(self, verbose=False, log_file=None):
+        # topic -> subscribers, a dict keeps the subscription order with O(1) lookups
+        self.subscribers = dict()
+        self.verbose = verbose
+        self.log_file = log_file
+        self.n_messages = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+
+    def datagram_received(self, data, addr):
+        if data.startswith(SUBSCRIBE_PREFIX):
+            self.subscribe(data[len(SUBSCRIBE_PREFIX):], addr)
+        else:
+            self.publish(data)
+
+        if self.verbose:
+            print(data[:200])
+        if self.log_file:
+            self.log_file.write(f'<{time.strftime("%H:%M:%S")} n:{self.n_messages} From port:{addr[1]} >"{data[:1000]!r}"\n')
+        self.n_messages += 1
+
+    def subscribe(self, topic, addr):
+        subscribers = self.subscribers.setdefault(topic, dict())
+        if addr in subscribers:
+            print("Module deja abonne au topic")
+        else:
+            subscribers[addr] = None
+
+    def publish(self, data):
+        topic = data[:data.find(b":")]
+        subscribers = self.subscribers.get(topic)
+        if subscribers:
+            sendto = self.transport.sendto
+            for addr in subscribers:
+                sendto(data, addr)
+        elif topic and self.verbose:
+            print(f'Le type "{topic.decode("utf-8", "replace")}:" n\'as pas encore ete reclame')
+
+    def error_received(self, exc):
+        # e.g. ICMP port unreachable when a module has been closed, like the C++ version it is ignored
+        pass
+
+
+async def serve(host="0.0.0.0", port=SERVER_PORT, verbose=False, log_file=None, ready=None):
+    """Runs the WhiteBoard until cancelled, "ready" (asyncio.Event) is set once listening"""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: WhiteBoardProtocol(verbose, log_file), local_addr=(host, port))
+    print(f"host waiting for an UDP message on port {port} ...")
+    if ready is not None:
+        ready.set()
+    try:
+        await asyncio.Future()
+    finally:
+        transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WhiteBoard (message broker) of the modules")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--verbose", action="store_true", help="print every message")
+    parser.add_argument("--log", help="log file of the messages")
+    args = parser.parse_args()
+
+    log_file = open(args.log, "w", encoding="utf-8") if args.log else None
+    try:
+        asyncio.run(serve(args.host, args.port, args.verbose, log_file))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if log_file:
+            log_file.close()
+
+
+if __name__ == "__main__":
+    main()